@@ -0,0 +1,176 @@
+"""Measure API throughput under concurrent requests.
+
+The app is driven in-process through httpx's ASGI transport so that every
+request shares a single event loop, the same way requests share a uvicorn
+worker. Any database call that blocks the loop serializes the requests.
+
+A database on localhost answers in a fraction of a millisecond so
+--db-latency can be used to route the database connections through a proxy
+that delays the traffic by the given round trip time to simulate a database
+server on the network.
+
+Usage: ::
+
+    PYTHONPATH=. python benchmarks/concurrency.py --concurrency 100 --db-latency 2
+
+The usual environment variables, e.g. DATABASE_URL, must be set and the
+database must have the tables created.
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import statistics
+import threading
+import time
+from urllib.parse import urlparse
+
+import httpx
+
+USER_ID = f"benchmark-{secrets.token_hex(4)}"
+
+
+def start_latency_proxy(database_url: str, latency: float) -> str:
+    """Start a TCP proxy to the database and return the proxied database url."""
+    url = urlparse(database_url)
+    delay = latency / 1000 / 2  # one way
+
+    async def pipe(reader, writer):
+        loop = asyncio.get_running_loop()
+        while data := await reader.read(65536):
+            loop.call_later(delay, writer.write, data)
+        loop.call_later(delay, writer.close)
+
+    async def handle(client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection(
+            url.hostname, url.port or 5432
+        )
+        await asyncio.gather(
+            pipe(client_reader, server_writer), pipe(server_reader, client_writer)
+        )
+
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(asyncio.start_server(handle, "127.0.0.1", 0))
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    port = server.sockets[0].getsockname()[1]
+    netloc = url.netloc.rsplit("@", 1)[0] + f"@127.0.0.1:{port}"
+    return url._replace(netloc=netloc).geturl()
+
+
+class Benchmark:
+    def __init__(self, num_taxa: int):
+        # import the app lazily so that DATABASE_URL can be changed first
+        import sepal.db as db
+        from sepal.app import app
+        from sepal.auth import get_current_user
+        from sepal.requestvars import request_global
+
+        def override_current_user():
+            request_global().current_user_id = USER_ID
+            return USER_ID
+
+        app.dependency_overrides[get_current_user] = override_current_user
+        self.app = app
+        self.db = db
+        self.num_taxa = num_taxa
+
+    def seed(self) -> int:
+        from sepal.organizations.models import (
+            Organization,
+            OrganizationUser,
+            RoleType,
+        )
+        from sepal.taxa.models import Rank, Taxon
+
+        with self.db.session_factory() as session:
+            org = Organization(name=f"benchmark {secrets.token_hex(4)}")
+            session.add(org)
+            session.flush()
+            session.add(
+                OrganizationUser(
+                    organization_id=org.id, user_id=USER_ID, role=RoleType.Owner
+                )
+            )
+            session.add_all(
+                [
+                    Taxon(org_id=org.id, name=f"taxon-{i:06d}", rank=Rank.Species)
+                    for i in range(self.num_taxa)
+                ]
+            )
+            session.commit()
+            return org.id
+
+    def cleanup(self, org_id: int):
+        from sqlalchemy import delete
+
+        from sepal.organizations.models import Organization, OrganizationUser
+        from sepal.taxa.models import Taxon
+
+        # use core deletes so the activity tracking flush events aren't fired
+        with self.db.session_factory() as session:
+            session.execute(delete(Taxon).where(Taxon.org_id == org_id))
+            session.execute(
+                delete(OrganizationUser).where(
+                    OrganizationUser.organization_id == org_id
+                )
+            )
+            session.execute(delete(Organization).where(Organization.id == org_id))
+            session.commit()
+
+    async def run(self, url: str, concurrency: int, num_requests: int):
+        latencies = []
+        errors = 0
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async with httpx.AsyncClient(app=self.app, base_url="http://bench") as client:
+
+            async def request():
+                nonlocal errors
+                async with semaphore:
+                    start = time.perf_counter()
+                    resp = await client.get(url, headers={"authorization": "Bearer x"})
+                    latencies.append(time.perf_counter() - start)
+                    if resp.status_code != 200:
+                        errors += 1
+
+            # warm up the connection pools
+            await asyncio.gather(*[request() for _ in range(concurrency)])
+            latencies.clear()
+
+            start = time.perf_counter()
+            await asyncio.gather(*[request() for _ in range(num_requests)])
+            elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        print(f"requests:     {num_requests} ({errors} errors)")
+        print(f"concurrency:  {concurrency}")
+        print(f"requests/sec: {num_requests / elapsed:.1f}")
+        print(f"p50 latency:  {statistics.median(latencies) * 1000:.1f}ms")
+        print(f"p99 latency:  {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--taxa", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--db-latency", type=float, default=0, help="milliseconds")
+    args = parser.parse_args()
+
+    if args.db_latency > 0:
+        os.environ["DATABASE_URL"] = start_latency_proxy(
+            os.environ["DATABASE_URL"], args.db_latency
+        )
+
+    benchmark = Benchmark(args.taxa)
+    org_id = benchmark.seed()
+    try:
+        url = f"/v1/orgs/{org_id}/taxa?limit={args.limit}"
+        asyncio.run(benchmark.run(url, args.concurrency, args.requests))
+    finally:
+        benchmark.cleanup(org_id)
+
+
+if __name__ == "__main__":
+    main()
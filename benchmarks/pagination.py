@@ -0,0 +1,97 @@
+"""Compare the latency of deep pages with OFFSET and keyset pagination.
+
+The taxa of a new organization are read a page at a time at increasing
+depths, once by skipping the rows before the page with OFFSET and once by
+seeking to the sort key of the last row of the previous page the way
+sepal.pagination does. Each query is run --repeat times and the median is
+reported. The taxa are inserted in a transaction that is rolled back at the
+end so nothing is left in the database.
+
+Usage: ::
+
+    PYTHONPATH=. python benchmarks/pagination.py --taxa 100000 --limit 50
+
+The usual environment variables, e.g. DATABASE_URL, must be set and the
+database must have the tables created.
+"""
+import argparse
+import secrets
+import statistics
+import time
+from typing import List
+
+from sqlalchemy import insert, select, text
+
+import sepal.db as db
+from sepal.organizations.models import Organization
+from sepal.pagination import get_key, where_after
+from sepal.taxa.models import Rank, Taxon
+
+SORT = (Taxon.name, Taxon.id)
+
+
+def seed(session, num_taxa: int) -> int:
+    org = Organization(name=f"benchmark {secrets.token_hex(4)}")
+    session.add(org)
+    session.flush()
+    # use core inserts so the activity tracking flush events aren't fired
+    batch_size = 10000
+    for start in range(0, num_taxa, batch_size):
+        session.execute(
+            insert(Taxon),
+            [
+                {"org_id": org.id, "name": f"taxon-{i:07d}", "rank": Rank.Species}
+                for i in range(start, min(start + batch_size, num_taxa))
+            ],
+        )
+    session.execute(text("ANALYZE taxon"))
+    return org.id
+
+
+def measure(session, q, repeat: int) -> float:
+    """Return the median time to read the rows of q in milliseconds."""
+    timings: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        session.execute(q).all()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def run(session, org_id: int, depths: List[int], limit: int, repeat: int):
+    base = select(Taxon.id, Taxon.name).where(Taxon.org_id == org_id).order_by(*SORT)
+    print(f"{'depth':>10} {'offset':>10} {'keyset':>10}")
+    for depth in depths:
+        offset_q = base.offset(depth).limit(limit)
+        if depth == 0:
+            keyset_q = base.limit(limit)
+        else:
+            last = session.execute(base.offset(depth - 1).limit(1)).one()
+            keyset_q = where_after(base, SORT, get_key(last, SORT)).limit(limit)
+
+        # check that both queries read the same page
+        assert session.execute(offset_q).all() == session.execute(keyset_q).all()
+        offset_ms = measure(session, offset_q, repeat)
+        keyset_ms = measure(session, keyset_q, repeat)
+        print(f"{depth:>10} {offset_ms:>8.2f}ms {keyset_ms:>8.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--taxa", type=int, default=100000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    depths = [0, 1000, 10000, 50000, args.taxa - args.limit]
+    depths = sorted({depth for depth in depths if 0 <= depth < args.taxa})
+    with db.session_factory() as session:
+        try:
+            org_id = seed(session, args.taxa)
+            run(session, org_id, depths, args.limit, args.repeat)
+        finally:
+            session.rollback()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Measure the latency of searching the accessions of a large organization.
+
+--orgs organizations with --accessions accessions each with codes like
+1955.01234 are generated and the first organization is searched for codes
+that match a single accession, a few accessions, a whole year of accessions
+and no accessions at all. Since every organization has the same codes, an
+index that isn't limited to the organization has to read --orgs times as
+many matches. Each search is timed for the first page of the search results
+ranked by the trigram index and for the unindexed ILIKE search ordered by
+code that it replaced. Each query is run --repeat times and the median is
+reported.
+
+The accessions are inserted in a transaction that is rolled back at the end
+so nothing is left in the database.
+
+Usage: ::
+
+    PYTHONPATH=. python benchmarks/search.py --accessions 200000 --orgs 5
+
+The usual environment variables, e.g. DATABASE_URL, must be set and the
+database must have the tables and the pg_trgm and btree_gin extensions
+created.
+"""
+import argparse
+import secrets
+import statistics
+import time
+from typing import List
+
+from sqlalchemy import insert, select, text
+
+import sepal.db as db
+import sepal.models  # noqa: F401
+from sepal.accessions.models import Accession
+from sepal.organizations.models import Organization
+from sepal.search.trigram import match, rank
+from sepal.taxa.models import Rank, Taxon
+
+# The accessions of each year are numbered from 0
+PER_YEAR = 20000
+
+QUERIES = ["1955.01234", "01234", "1955.", "zzz"]
+
+
+def seed(session, num_accessions: int) -> int:
+    org = Organization(name=f"benchmark {secrets.token_hex(4)}")
+    session.add(org)
+    session.flush()
+    taxon = Taxon(org_id=org.id, name="Quercus alba", rank=Rank.Species)
+    session.add(taxon)
+    session.flush()
+    # use core inserts so the activity tracking flush events aren't fired
+    batch_size = 10000
+    for start in range(0, num_accessions, batch_size):
+        session.execute(
+            insert(Accession),
+            [
+                {
+                    "org_id": org.id,
+                    "taxon_id": taxon.id,
+                    "code": f"{1950 + i // PER_YEAR}.{i % PER_YEAR:05d}",
+                }
+                for i in range(start, min(start + batch_size, num_accessions))
+            ],
+        )
+    return org.id
+
+
+def measure(session, q, repeat: int) -> float:
+    """Return the median time to read the rows of q in milliseconds."""
+    timings: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        session.execute(q).all()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def run(session, org_id: int, limit: int, repeat: int):
+    print(f"{'query':>12} {'matches':>8} {'ilike':>10} {'trigram':>10}")
+    for query in QUERIES:
+        base = select(Accession).where(
+            Accession.org_id == org_id, match(Accession.code, query)
+        )
+        matches = session.execute(
+            base.with_only_columns(text("count(*)")).order_by(None)
+        ).scalar()
+
+        # the search before the trigram indexes, which can only read the rows
+        # in code order and check each of them
+        session.execute(text("SET LOCAL enable_bitmapscan = off"))
+        ilike_ms = measure(session, base.order_by(Accession.code).limit(limit), repeat)
+        session.execute(text("SET LOCAL enable_bitmapscan = on"))
+
+        search_rank = rank(Accession.code, query)
+        ranked_q = (
+            base.add_columns(search_rank)
+            .order_by(search_rank.desc(), Accession.id.desc())
+            .limit(limit)
+        )
+        trigram_ms = measure(session, ranked_q, repeat)
+        print(f"{query:>12} {matches:>8} {ilike_ms:>8.2f}ms {trigram_ms:>8.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accessions", type=int, default=200000)
+    parser.add_argument("--orgs", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with db.session_factory() as session:
+        try:
+            start = time.perf_counter()
+            org_id, *_ = [seed(session, args.accessions) for _ in range(args.orgs)]
+            session.execute(text("ANALYZE accession"))
+            elapsed = time.perf_counter() - start
+            total = args.accessions * args.orgs
+            print(f"seeded {total} accessions in {elapsed:.1f}s")
+            run(session, org_id, args.limit, args.repeat)
+        finally:
+            session.rollback()
+
+
+if __name__ == "__main__":
+    main()
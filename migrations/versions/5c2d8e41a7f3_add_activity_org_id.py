@@ -0,0 +1,55 @@
+"""add activity org_id
+
+Revision ID: 5c2d8e41a7f3
+Revises: 47daceb48cee
+Create Date: 2026-10-18 19:20:41.118302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "5c2d8e41a7f3"
+down_revision = "47daceb48cee"
+branch_labels = None
+depends_on = None
+
+# The number of activity rows to update per statement when backfilling org_id
+BATCH_SIZE = 10000
+
+
+def upgrade():
+    op.add_column("activity", sa.Column("org_id", sa.Integer(), nullable=True))
+
+    # Backfill and index outside of the migration transaction so each batch is
+    # committed on its own and the index can be built without locking writes.
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        max_id = conn.execute(sa.text("SELECT max(id) FROM activity")).scalar() or 0
+        for start in range(0, max_id, BATCH_SIZE):
+            conn.execute(
+                sa.text(
+                    """
+                    UPDATE activity
+                    SET org_id = COALESCE(
+                        (data_after ->> 'org_id')::integer,
+                        (data_before ->> 'org_id')::integer
+                    )
+                    WHERE id > :start AND id <= :end AND org_id IS NULL
+                    """
+                ),
+                start=start,
+                end=start + BATCH_SIZE,
+            )
+
+        op.create_index(
+            "ix_activity_org_id_timestamp_id",
+            "activity",
+            ["org_id", sa.text("timestamp DESC"), sa.text("id DESC")],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    op.drop_index("ix_activity_org_id_timestamp_id", table_name="activity")
+    op.drop_column("activity", "org_id")
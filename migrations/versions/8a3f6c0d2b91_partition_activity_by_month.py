@@ -0,0 +1,88 @@
+"""partition activity by month
+
+Revision ID: 8a3f6c0d2b91
+Revises: 5c2d8e41a7f3
+Create Date: 2026-10-18 20:02:13.507211
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "8a3f6c0d2b91"
+down_revision = "5c2d8e41a7f3"
+branch_labels = None
+depends_on = None
+
+COLUMNS = 'id, user_id, data_before, data_after, timestamp, "table", table_id, org_id'
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1, day=1)
+
+
+def create_table(name, partitioned):
+    primary_key = "id, timestamp" if partitioned else "id"
+    partition_by = "PARTITION BY RANGE (timestamp)" if partitioned else ""
+    op.execute(
+        f"""
+        CREATE TABLE {name} (
+            id integer NOT NULL DEFAULT nextval('activity_id_seq'),
+            user_id varchar NOT NULL,
+            data_before jsonb,
+            data_after jsonb,
+            timestamp timestamp NOT NULL DEFAULT TIMEZONE('utc', CURRENT_TIMESTAMP),
+            "table" varchar NOT NULL,
+            table_id integer NOT NULL,
+            org_id integer,
+            CONSTRAINT {name}_pkey PRIMARY KEY ({primary_key})
+        ) {partition_by}
+        """
+    )
+
+
+def replace_table(partitioned):
+    op.execute("ALTER TABLE activity RENAME TO activity_old")
+    op.execute("ALTER INDEX activity_pkey RENAME TO activity_old_pkey")
+    op.drop_index("ix_activity_org_id_timestamp_id", table_name="activity_old")
+
+    create_table("activity", partitioned)
+    op.execute("ALTER SEQUENCE activity_id_seq OWNED BY activity.id")
+
+    if partitioned:
+        op.execute("CREATE TABLE activity_default PARTITION OF activity DEFAULT")
+        # create a partition for every month with activity and the next three
+        # months, the rest are created by sepal.activity.partitions
+        conn = op.get_bind()
+        first, now = conn.execute(
+            sa.text(
+                "SELECT min(timestamp), TIMEZONE('utc', CURRENT_TIMESTAMP) FROM activity_old"
+            )
+        ).one()
+        month = (first or now).date().replace(day=1)
+        last = add_months(now.date(), 3)
+        while month <= last:
+            end = add_months(month, 1)
+            op.execute(
+                f"CREATE TABLE activity_y{month.year:04d}m{month.month:02d} "
+                f"PARTITION OF activity FOR VALUES FROM ('{month}') TO ('{end}')"
+            )
+            month = end
+
+    op.execute(f"INSERT INTO activity ({COLUMNS}) SELECT {COLUMNS} FROM activity_old")
+    op.execute("DROP TABLE activity_old")
+    op.create_index(
+        "ix_activity_org_id_timestamp_id",
+        "activity",
+        ["org_id", sa.text("timestamp DESC"), sa.text("id DESC")],
+    )
+
+
+def upgrade():
+    replace_table(partitioned=True)
+
+
+def downgrade():
+    # the activity in archived partitions isn't restored
+    replace_table(partitioned=False)
@@ -0,0 +1,42 @@
+"""add activity count
+
+Revision ID: a6c0e4f8b2d3
+Revises: f2b8d6a4c1e9
+Create Date: 2026-10-19 00:22:51.740184
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "a6c0e4f8b2d3"
+down_revision = "f2b8d6a4c1e9"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "activity_count",
+        sa.Column("org_id", sa.Integer(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("user_id", sa.String(), nullable=False),
+        sa.Column("table", sa.String(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("org_id", "day", "user_id", "table"),
+    )
+    # Activity written by the previous version of the app after the backfill
+    # isn't counted so deploy the app straight after the migration.
+    op.execute(
+        """
+        INSERT INTO activity_count (org_id, day, user_id, "table", count)
+        SELECT org_id, timestamp::date, user_id, "table", count(*)
+        FROM activity
+        WHERE org_id IS NOT NULL
+        GROUP BY org_id, timestamp::date, user_id, "table"
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("activity_count")
@@ -0,0 +1,45 @@
+"""add trigram search indexes
+
+Revision ID: a9d3f7b1e5c8
+Revises: e7c1a9f3b6d2
+Create Date: 2026-10-19 06:48:21.930174
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a9d3f7b1e5c8"
+down_revision = "e7c1a9f3b6d2"
+branch_labels = None
+depends_on = None
+
+# The (index name, table, column) of the searched columns. The indexes start
+# with the org_id of the table.
+INDEXES = [
+    ("ix_taxon_org_id_name_trgm", "taxon", "name"),
+    ("ix_location_org_id_code_trgm", "location", "code"),
+    ("ix_accession_org_id_code_trgm", "accession", "code"),
+    ("ix_accession_item_org_id_code_trgm", "accession_item", "code"),
+]
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+    with op.get_context().autocommit_block():
+        for name, table, column in INDEXES:
+            op.create_index(
+                name,
+                table,
+                ["org_id", column],
+                postgresql_using="gin",
+                postgresql_ops={column: "gin_trgm_ops"},
+                postgresql_concurrently=True,
+            )
+
+
+def downgrade():
+    for name, table, _ in INDEXES:
+        op.drop_index(name, table_name=table)
+    op.execute("DROP EXTENSION IF EXISTS btree_gin")
+    op.execute("DROP EXTENSION IF EXISTS pg_trgm")
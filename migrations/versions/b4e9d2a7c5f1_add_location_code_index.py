@@ -0,0 +1,28 @@
+"""add location code index
+
+Revision ID: b4e9d2a7c5f1
+Revises: d8f2b6e0a4c7
+Create Date: 2026-10-19 04:12:08.513902
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b4e9d2a7c5f1"
+down_revision = "d8f2b6e0a4c7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_location_org_id_code_id",
+            "location",
+            ["org_id", "code", "id"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    op.drop_index("ix_location_org_id_code_id", table_name="location")
@@ -0,0 +1,92 @@
+"""add activity summary
+
+Revision ID: b7e14c9a3d05
+Revises: 8a3f6c0d2b91
+Create Date: 2026-10-18 20:41:55.270318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "b7e14c9a3d05"
+down_revision = "8a3f6c0d2b91"
+branch_labels = None
+depends_on = None
+
+# The number of activity rows to update per statement when backfilling
+BATCH_SIZE = 10000
+
+# The data of the record, data_after is a JSON null for deleted records
+DATA = (
+    "CASE WHEN jsonb_typeof(data_after) = 'object' THEN data_after ELSE data_before END"
+)
+
+# Same as sepal.activity.lib.RESOURCE_LABELS
+RESOURCE_LABELS = {
+    "accession": ("Accession", "code"),
+    "accession_item": ("Accession item", "code"),
+    "location": ("Location", "code"),
+    "organization": ("Organization", "name"),
+    "taxon": ("Taxon", "name"),
+}
+
+RESOURCE_LABEL = "CASE activity.table {} ELSE 'Unknown resource' END".format(
+    " ".join(
+        f"WHEN '{table}' THEN '{noun} ' || "
+        f"COALESCE(({DATA}) ->> '{key}', activity.table_id::text)"
+        for table, (noun, key) in RESOURCE_LABELS.items()
+    )
+)
+
+
+def upgrade():
+    for column in ["action", "actor_name", "resource_label"]:
+        op.add_column("activity", sa.Column(column, sa.String(), nullable=True))
+
+    # Backfill outside of the migration transaction so each batch is committed
+    # on its own.
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        max_id = conn.execute(sa.text("SELECT max(id) FROM activity")).scalar() or 0
+        for start in range(0, max_id, BATCH_SIZE):
+            conn.execute(
+                sa.text(
+                    f"""
+                    UPDATE activity
+                    SET
+                        action = CASE
+                            WHEN COALESCE(jsonb_typeof(data_before), 'null') = 'null'
+                                THEN 'created'
+                            WHEN COALESCE(jsonb_typeof(data_after), 'null') = 'null'
+                                THEN 'deleted'
+                            ELSE 'updated'
+                        END,
+                        actor_name = COALESCE(
+                            (
+                                SELECT CASE
+                                    WHEN profile.family_name <> ''
+                                        AND profile.given_name <> ''
+                                        THEN profile.family_name || ' ' || profile.given_name
+                                    ELSE profile.email
+                                END
+                                FROM profile
+                                WHERE profile.user_id = activity.user_id
+                            ),
+                            'Unknown user'
+                        ),
+                        resource_label = {RESOURCE_LABEL}
+                    WHERE id > :start AND id <= :end AND action IS NULL
+                    """
+                ),
+                start=start,
+                end=start + BATCH_SIZE,
+            )
+
+    for column in ["action", "actor_name", "resource_label"]:
+        op.alter_column("activity", column, nullable=False)
+
+
+def downgrade():
+    for column in ["action", "actor_name", "resource_label"]:
+        op.drop_column("activity", column)
@@ -0,0 +1,50 @@
+"""add activity notify trigger
+
+Revision ID: c3e7a1f5d9b8
+Revises: a6c0e4f8b2d3
+Create Date: 2026-10-19 01:37:12.508216
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c3e7a1f5d9b8"
+down_revision = "a6c0e4f8b2d3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The trigger of a partitioned table is cloned to each of its partitions,
+    # including the partitions that are created later.
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION notify_activity() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('activity', json_build_object(
+                'id', NEW.id,
+                'org_id', NEW.org_id,
+                'timestamp', to_char(NEW.timestamp, 'YYYY-MM-DD"T"HH24:MI:SS.US'),
+                'table', NEW."table",
+                'table_id', NEW.table_id,
+                'action', NEW.action,
+                'actor_name', NEW.actor_name,
+                'resource_label', NEW.resource_label
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER activity_notify AFTER INSERT ON activity
+        FOR EACH ROW WHEN (NEW.org_id IS NOT NULL)
+        EXECUTE FUNCTION notify_activity()
+        """
+    )
+
+
+def downgrade():
+    op.execute("DROP TRIGGER activity_notify ON activity")
+    op.execute("DROP FUNCTION notify_activity()")
@@ -0,0 +1,55 @@
+"""add activity history index
+
+Revision ID: d41f0e6b9c27
+Revises: b7e14c9a3d05
+Create Date: 2026-10-18 21:12:40.903511
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "d41f0e6b9c27"
+down_revision = "b7e14c9a3d05"
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = "ix_activity_table_table_id_timestamp_id"
+COLUMNS = '"table", table_id, timestamp DESC, id DESC'
+
+
+def upgrade():
+    # An index can't be created concurrently on a partitioned table so create
+    # the index on the parent table only and then create the index of each
+    # partition concurrently and attach it. The parent index becomes valid
+    # once the indexes of all the partitions are attached.
+    op.execute(f"CREATE INDEX {INDEX_NAME} ON ONLY activity ({COLUMNS})")
+    conn = op.get_bind()
+    partitions = (
+        conn.execute(
+            sa.text(
+                """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+            JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+            WHERE parent.relname = 'activity'
+            """
+            )
+        )
+        .scalars()
+        .all()
+    )
+
+    with op.get_context().autocommit_block():
+        for partition in partitions:
+            index_name = f"{partition}_table_table_id_timestamp_id_idx"
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+                f"ON {partition} ({COLUMNS})"
+            )
+            op.execute(f"ALTER INDEX {INDEX_NAME} ATTACH PARTITION {index_name}")
+
+
+def downgrade():
+    op.drop_index(INDEX_NAME, table_name="activity")
@@ -0,0 +1,28 @@
+"""add taxon name index
+
+Revision ID: d8f2b6e0a4c7
+Revises: c3e7a1f5d9b8
+Create Date: 2026-10-19 02:55:30.164729
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d8f2b6e0a4c7"
+down_revision = "c3e7a1f5d9b8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_taxon_org_id_name_id",
+            "taxon",
+            ["org_id", "name", "id"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    op.drop_index("ix_taxon_org_id_name_id", table_name="taxon")
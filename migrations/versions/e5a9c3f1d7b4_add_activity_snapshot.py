@@ -0,0 +1,44 @@
+"""add activity snapshot
+
+Revision ID: e5a9c3f1d7b4
+Revises: d41f0e6b9c27
+Create Date: 2026-10-18 21:48:03.611927
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "e5a9c3f1d7b4"
+down_revision = "d41f0e6b9c27"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "activity_snapshot",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("table", sa.String(), nullable=False),
+        sa.Column("table_id", sa.Integer(), nullable=False),
+        sa.Column("org_id", sa.Integer(), nullable=True),
+        sa.Column("activity_id", sa.Integer(), nullable=False),
+        sa.Column("timestamp", sa.DateTime(), nullable=False),
+        sa.Column("data", postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("activity_id"),
+    )
+    op.create_index(
+        "ix_activity_snapshot_table_table_id_timestamp_activity_id",
+        "activity_snapshot",
+        ["table", "table_id", sa.text("timestamp DESC"), sa.text("activity_id DESC")],
+    )
+
+
+def downgrade():
+    op.drop_index(
+        "ix_activity_snapshot_table_table_id_timestamp_activity_id",
+        table_name="activity_snapshot",
+    )
+    op.drop_table("activity_snapshot")
@@ -0,0 +1,39 @@
+"""add accession item indexes
+
+Revision ID: e7c1a9f3b6d2
+Revises: b4e9d2a7c5f1
+Create Date: 2026-10-19 05:31:44.207615
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e7c1a9f3b6d2"
+down_revision = "b4e9d2a7c5f1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_accession_item_org_id_accession_id_code",
+            "accession_item",
+            ["org_id", "accession_id", "code"],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_accession_item_org_id_location_id_code",
+            "accession_item",
+            ["org_id", "location_id", "code"],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    op.drop_index(
+        "ix_accession_item_org_id_location_id_code", table_name="accession_item"
+    )
+    op.drop_index(
+        "ix_accession_item_org_id_accession_id_code", table_name="accession_item"
+    )
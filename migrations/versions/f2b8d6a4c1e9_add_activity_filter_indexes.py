@@ -0,0 +1,69 @@
+"""add activity filter indexes
+
+Revision ID: f2b8d6a4c1e9
+Revises: e5a9c3f1d7b4
+Create Date: 2026-10-18 23:41:08.215392
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = "f2b8d6a4c1e9"
+down_revision = "e5a9c3f1d7b4"
+branch_labels = None
+depends_on = None
+
+# The indexes for filtering the activity feed by user, table and action
+INDEXES = {
+    "user_id": "org_id, user_id, timestamp DESC, id DESC",
+    "table": 'org_id, "table", timestamp DESC, id DESC',
+    "action": "org_id, action, timestamp DESC, id DESC",
+}
+
+
+def upgrade():
+    # The indexes are created the same way as the history index, see
+    # d41f0e6b9c27_add_activity_history_index.py
+    for column, columns in INDEXES.items():
+        op.execute(
+            f"CREATE INDEX ix_activity_org_id_{column}_timestamp_id "
+            f"ON ONLY activity ({columns})"
+        )
+
+    conn = op.get_bind()
+    partitions = (
+        conn.execute(
+            sa.text(
+                """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+            JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+            WHERE parent.relname = 'activity'
+            """
+            )
+        )
+        .scalars()
+        .all()
+    )
+
+    with op.get_context().autocommit_block():
+        for partition in partitions:
+            for column, columns in INDEXES.items():
+                index_name = f"{partition}_org_id_{column}_timestamp_id_idx"
+                op.execute(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name} "
+                    f"ON {partition} ({columns})"
+                )
+                op.execute(
+                    f"ALTER INDEX ix_activity_org_id_{column}_timestamp_id "
+                    f"ATTACH PARTITION {index_name}"
+                )
+
+
+def downgrade():
+    for column in INDEXES:
+        op.drop_index(
+            f"ix_activity_org_id_{column}_timestamp_id", table_name="activity"
+        )
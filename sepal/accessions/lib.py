@@ -1,11 +1,12 @@
-from base64 import b64decode
 from enum import Enum
-from typing import List, Optional
+from typing import Any, List, Optional, Tuple
 
 from sqlalchemy import select
 from sqlalchemy.orm import joinedload
 
 import sepal.db as db
+from sepal.pagination import Page, paginate
+from sepal.search.trigram import match, rank
 
 from .models import Accession, AccessionItem
 from .schema import (
@@ -25,10 +26,10 @@ class AccessionsPermission(str, Enum):
 
 async def get_accession_by_id(
     accession_id: int,
-    org_id: Optional[str] = None,
+    org_id: Optional[int] = None,
     include: Optional[List[str]] = None,
 ) -> Accession:
-    with db.Session() as session:
+    async with db.Session() as session:
         q = select(Accession).where(Accession.id == accession_id)
         if org_id:
             q = q.where(Accession.org_id == org_id)
@@ -36,60 +37,64 @@ async def get_accession_by_id(
             for field in include:
                 q = q.options(joinedload(getattr(Accession, field)))
 
-        return session.execute(q).scalars().first()
+        return (await session.execute(q)).scalars().first()
 
 
 async def get_accessions(
-    org_id: str,
+    org_id: int,
     query: Optional[str] = None,
     limit: int = 50,
     cursor: Optional[str] = None,
     include: Optional[List[str]] = None,
-) -> List[Accession]:
-    with db.Session() as session:
-        q = select(Accession).where(Accession.org_id == org_id).order_by(Accession.code)
-
+) -> Page:
+    """Return a page of the accessions of an organization ordered by code.
+
+    The accessions are searched by code if query is given and ordered by how
+    closely they match instead. Raises a ValueError if the cursor is invalid.
+    """
+    async with db.Session() as session:
+        q = select(Accession).where(Accession.org_id == org_id)
+
+        # the codes are unique in an organization
+        sort: Tuple[Any, ...] = (Accession.code,)
+        descending = False
         if query is not None:
-            q = q.where(Accession.code.ilike(f"%{query}%"))
-
-        if cursor is not None:
-            decoded_cursor = b64decode(cursor).decode()
-            q = q.where(Accession.code > decoded_cursor)
+            # the closest matches come first
+            q = q.where(match(Accession.code, query))
+            sort, descending = (rank(Accession.code, query), Accession.id), True
 
         if include is not None:
             for field in include:
                 q = q.options(joinedload(getattr(Accession, field)))
 
-        q = q.limit(limit)
+        return await paginate(session, q, sort, cursor, limit, descending=descending)
 
-        return session.execute(q).scalars().all()
 
-
-async def create_accession(org_id: str, values: AccessionCreate) -> Accession:
-    with db.Session() as session:
+async def create_accession(org_id: int, values: AccessionCreate) -> Accession:
+    async with db.Session() as session:
         accession = Accession(org_id=org_id, **values.dict())
         session.add(accession)
-        session.commit()
-        session.refresh(accession)
+        await session.commit()
+        await session.refresh(accession)
         return accession
 
 
 async def update_accession(accession_id: int, values: AccessionUpdate) -> Accession:
-    with db.Session() as session:
-        accession = session.get(Accession, accession_id)
+    async with db.Session() as session:
+        accession = await session.get(Accession, accession_id)
 
         # use setattr on the instance instead of using the faster query.update()
         # so that the before_flush event gets fired
         for key, value in values.dict().items():
             setattr(accession, key, value)
 
-        session.commit()
-        session.refresh(accession)
+        await session.commit()
+        await session.refresh(accession)
         return accession
 
 
 # async def get_accession_item_by_id(
-#     accession_item_id: int, org_id: Optional[str] = None
+#     accession_item_id: int, org_id: Optional[int] = None
 # ) -> AccessionItem:
 #     with Session() as session:
 #         q = session.query(AccessionItem).filter_by(id=accession_item_id)
@@ -100,59 +105,70 @@ async def update_accession(accession_id: int, values: AccessionUpdate) -> Access
 
 
 async def get_accession_items(
-    org_id: str,
-    accession_id: str,
+    org_id: int,
+    accession_id: Optional[int] = None,
     query: Optional[str] = None,
-    # limit: int = 50,
-    # cursor: Optional[str] = None,
+    limit: int = 50,
+    cursor: Optional[str] = None,
     include: Optional[List[str]] = None,
-) -> List[Accession]:
-    with db.Session() as session:
-        q = (
-            select(AccessionItem)
-            .where(AccessionItem.org_id == org_id)
-            .where(AccessionItem.accession_id == accession_id)
-            .order_by(AccessionItem.code)
-        )
-
+    location_id: Optional[int] = None,
+    item_type: Optional[str] = None,
+) -> Page:
+    """Return a page of the accession items of an organization ordered by code.
+
+    The items can be filtered by their accession, location and type and
+    searched by code. Search results are ordered by how closely they match
+    the query instead. Raises a ValueError if the cursor is invalid.
+    """
+    async with db.Session() as session:
+        q = select(AccessionItem).where(AccessionItem.org_id == org_id)
+
+        if accession_id is not None:
+            q = q.where(AccessionItem.accession_id == accession_id)
+
+        if location_id is not None:
+            q = q.where(AccessionItem.location_id == location_id)
+
+        if item_type is not None:
+            q = q.where(AccessionItem.item_type == item_type)
+
+        # the codes are unique in an organization
+        sort: Tuple[Any, ...] = (AccessionItem.code,)
+        descending = False
         if query is not None:
-            q = q.where(AccessionItem.code.ilike(f"%{query}%"))
-
-        # if cursor is not None:
-        #     decoded_cursor = b64decode(cursor).decode()
-        #     q = q.where(AccessionItem.code > decoded_cursor)
+            # the closest matches come first
+            q = q.where(match(AccessionItem.code, query))
+            sort, descending = (rank(AccessionItem.code, query), AccessionItem.id), True
 
         if include is not None:
             for field in include:
                 q = q.options(joinedload(getattr(AccessionItem, field)))
 
-        # q = q.limit(limit)
-
-        return session.execute(q).scalars().all()
+        return await paginate(session, q, sort, cursor, limit, descending=descending)
 
 
 async def create_accession_item(
-    org_id: str, values: AccessionItemCreate
+    org_id: int, values: AccessionItemCreate
 ) -> AccessionItem:
-    with db.Session() as session:
+    async with db.Session() as session:
         item = AccessionItem(org_id=org_id, **values.dict())
         session.add(item)
-        session.commit()
-        session.refresh(item)
+        await session.commit()
+        await session.refresh(item)
         return item
 
 
 async def update_accession_item(
     accession_item_id: int, values: AccessionItemUpdate
 ) -> AccessionItem:
-    with db.Session() as session:
-        item = session.get(AccessionItem, accession_item_id)
+    async with db.Session() as session:
+        item = await session.get(AccessionItem, accession_item_id)
 
         # use setattr on the instance instead of using the faster query.update()
         # so that the before_flush event gets fired
         for key, value in values.dict().items():
             setattr(item, key, value)
 
-        session.commit()
-        session.refresh(item)
+        await session.commit()
+        await session.refresh(item)
         return item
@@ -1,11 +1,12 @@
 import enum
 from typing import Literal
 
-from sqlalchemy import Column, Enum, ForeignKey, Integer, String
+from sqlalchemy import Column, Enum, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import backref, declared_attr, relationship
 from sqlalchemy.schema import UniqueConstraint
 
 from sepal.db import Model
+from sepal.search.trigram import trigram_index
 
 AccessionPermission = Literal[
     "accessions:read",
@@ -65,3 +66,24 @@ class AccessionItem(Model):
     organization = relationship(
         "Organization", backref=backref("accession_items", cascade="all, delete-orphan")
     )
+
+
+# The indexes for listing the items of an accession or a location by code
+Index(
+    "ix_accession_item_org_id_accession_id_code",
+    AccessionItem.org_id,
+    AccessionItem.accession_id,
+    AccessionItem.code,
+)
+Index(
+    "ix_accession_item_org_id_location_id_code",
+    AccessionItem.org_id,
+    AccessionItem.location_id,
+    AccessionItem.code,
+)
+
+# The indexes for searching the accessions and accession items by code
+trigram_index("ix_accession_org_id_code_trgm", Accession.org_id, Accession.code)
+trigram_index(
+    "ix_accession_item_org_id_code_trgm", AccessionItem.org_id, AccessionItem.code
+)
@@ -5,7 +5,6 @@ from pydantic import BaseModel
 
 class AccessionSchemaBase(BaseModel):
     code: str
-    taxon_id: Optional[str]
 
 
 class AccessionSchema(AccessionSchemaBase):
@@ -17,30 +16,32 @@ class AccessionSchema(AccessionSchemaBase):
 
 
 class AccessionCreate(AccessionSchemaBase):
-    pass
+    taxon_id: Optional[int]
 
 
 class AccessionUpdate(AccessionSchemaBase):
-    pass
+    taxon_id: Optional[int]
 
 
 class AccessionItemSchemaBase(BaseModel):
     code: str
-    accession_id: Optional[str]
-    location_id: Optional[str]
     item_type: Literal["plant", "seed", "vegetative", "tissue", "other"]
 
 
 class AccessionItemSchema(AccessionItemSchemaBase):
     id: str
+    accession_id: Optional[str]
+    location_id: Optional[str]
 
     class Config:
         orm_mode = True
 
 
 class AccessionItemCreate(AccessionItemSchemaBase):
-    pass
+    accession_id: Optional[int]
+    location_id: Optional[int]
 
 
 class AccessionItemUpdate(AccessionItemSchemaBase):
-    pass
+    accession_id: Optional[int]
+    location_id: Optional[int]
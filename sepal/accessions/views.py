@@ -1,11 +1,18 @@
+from datetime import datetime
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Response, Request, status
 
+from sepal.activity.lib import ActivityPermission
+from sepal.activity.schema import ActivityHistorySchema
+from sepal.activity.views import detail_as_of as activity_detail_as_of, list_history
 from sepal.auth import get_current_user
-from sepal.utils import create_schema, make_cursor_link
+from sepal.permissions import check_permission
+from sepal.pagination import PageParams, set_link_header
+from sepal.utils import create_schema
 
 from .lib import (
+    AccessionsPermission,
     create_accession,
     create_accession_item,
     get_accession_by_id,
@@ -26,6 +33,8 @@ from .schema import (
 from sepal.organizations.lib import verify_org_id
 
 router = APIRouter()
+# The accession items of the whole organization
+items_router = APIRouter()
 
 
 @router.get("")
@@ -35,23 +44,28 @@ async def list(
     current_user_id=Depends(get_current_user),
     org_id=Depends(verify_org_id),
     q: Optional[str] = None,
-    cursor: Optional[str] = None,
-    limit: int = 50,
+    page_params: PageParams = Depends(),
     include: Optional[List[str]] = Query(None, regex="^(taxon)$"),
 ) -> List[AccessionSchema]:
     if org_id is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
-    accessions = await get_accessions(
-        org_id, q, limit=limit, cursor=cursor, include=include
-    )
-    if len(accessions) == limit:
-        next_url = make_cursor_link(str(request.url), accessions[-1].code, limit)
-        response.headers["Link"] = f"<{next_url}>; rel=next"
+    try:
+        page = await get_accessions(
+            org_id,
+            q,
+            limit=page_params.limit,
+            cursor=page_params.cursor,
+            include=include,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+    set_link_header(request, response, page, page_params.limit)
 
     # build the schema based on the request parameters
     Schema = create_schema(AccessionSchema, Accession, include=include)
-    return [Schema.from_orm(accession) for accession in accessions]
+    return [Schema.from_orm(accession) for accession in page.items]
 
 
 @router.post("", status_code=status.HTTP_201_CREATED, response_model=AccessionSchema)
@@ -97,22 +111,63 @@ async def update(
     return await update_accession(accession_id, accession)
 
 
+# The types of accession items that the items can be filtered by
+ITEM_TYPE_REGEX = "^(plant|seed|vegetative|tissue|other)$"
+
+
+async def _list_items(
+    request: Request,
+    response: Response,
+    org_id: int,
+    page_params: PageParams,
+    include: Optional[List[str]],
+    **filters,
+) -> List[AccessionItemSchema]:
+    try:
+        page = await get_accession_items(
+            org_id,
+            limit=page_params.limit,
+            cursor=page_params.cursor,
+            include=include,
+            **filters,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+    set_link_header(request, response, page, page_params.limit)
+
+    # build the schema based on the request parameters
+    Schema = create_schema(AccessionItemSchema, AccessionItem, include=include)
+    return [Schema.from_orm(item) for item in page.items]
+
+
 @router.get("/{accession_id}/items")
 async def list_items(
-    accession_id: str,
+    request: Request,
+    response: Response,
+    accession_id: int,
     org_id=Depends(verify_org_id),
     current_user_id=Depends(get_current_user),
     q: Optional[str] = None,
+    page_params: PageParams = Depends(),
     include: Optional[List[str]] = Query(None, regex="^(location)$"),
+    location_id: Optional[int] = None,
+    item_type: Optional[str] = Query(None, regex=ITEM_TYPE_REGEX),
 ) -> List[AccessionItemSchema]:
     if org_id is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
-    items = await get_accession_items(org_id, accession_id, q, include)
-
-    # build the schema based on the request parameters
-    Schema = create_schema(AccessionItemSchema, AccessionItem, include=include)
-    return [Schema.from_orm(item) for item in items]
+    return await _list_items(
+        request,
+        response,
+        org_id,
+        page_params,
+        include,
+        accession_id=accession_id,
+        query=q,
+        location_id=location_id,
+        item_type=item_type,
+    )
 
 
 @router.post(
@@ -122,7 +177,7 @@ async def list_items(
 )
 async def create_item(
     accession_item: AccessionItemCreate,
-    accession_id: str,
+    accession_id: int,
     current_user_id=Depends(get_current_user),
     org_id=Depends(verify_org_id),
 ) -> AccessionItemSchema:
@@ -141,3 +196,79 @@ async def update_item(
     if org_id is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
     return await update_accession_item(org_id, accession_item)
+
+
+@router.get(
+    "/{accession_id}/history",
+    dependencies=[
+        Depends(check_permission(AccessionsPermission.Read)),
+        Depends(check_permission(ActivityPermission.Read)),
+    ],
+)
+async def history(
+    request: Request,
+    response: Response,
+    accession_id: int,
+    current_user_id=Depends(get_current_user),
+    org_id=Depends(verify_org_id),
+    page_params: PageParams = Depends(),
+) -> List[ActivityHistorySchema]:
+    if org_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    return await list_history(
+        request, response, org_id, Accession.__tablename__, accession_id, page_params
+    )
+
+
+@router.get(
+    "/{accession_id}/history/{as_of}",
+    dependencies=[
+        Depends(check_permission(AccessionsPermission.Read)),
+        Depends(check_permission(ActivityPermission.Read)),
+    ],
+)
+async def detail_as_of(
+    accession_id: int,
+    as_of: datetime,
+    current_user_id=Depends(get_current_user),
+    org_id=Depends(verify_org_id),
+) -> AccessionSchema:
+    if org_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    return await activity_detail_as_of(
+        org_id, Accession.__tablename__, accession_id, as_of, AccessionSchema
+    )
+
+
+@items_router.get(
+    "", dependencies=[Depends(check_permission(AccessionsPermission.Read))]
+)
+async def list_org_items(
+    request: Request,
+    response: Response,
+    org_id=Depends(verify_org_id),
+    current_user_id=Depends(get_current_user),
+    q: Optional[str] = None,
+    page_params: PageParams = Depends(),
+    include: Optional[List[str]] = Query(None, regex="^(accession|location)$"),
+    accession_id: Optional[int] = None,
+    location_id: Optional[int] = None,
+    item_type: Optional[str] = Query(None, regex=ITEM_TYPE_REGEX),
+) -> List[AccessionItemSchema]:
+    """Return a page of the accession items of the organization."""
+    if org_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    return await _list_items(
+        request,
+        response,
+        org_id,
+        page_params,
+        include,
+        accession_id=accession_id,
+        query=q,
+        location_id=location_id,
+        item_type=item_type,
+    )
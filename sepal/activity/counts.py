@@ -0,0 +1,56 @@
+from collections import Counter
+from typing import Any, Dict, Iterable
+
+import sqlalchemy.dialects.postgresql as pg
+from sqlalchemy import Date, cast
+
+import sepal.db as db
+
+from .models import ActivityCount
+
+
+def increment_counts(rows: Iterable[Dict[str, Any]]):
+    """Return the statement that adds activity rows to the activity counts.
+
+    Returns None if none of the rows belong to an organization. The statement
+    needs to be executed in the same transaction that inserts the rows so the
+    counts don't drift from the activity table.
+    """
+    counts: Counter = Counter()
+    for row in rows:
+        if row["org_id"] is None:
+            continue
+        # rows without a timestamp get the server default when they're
+        # inserted so they're counted on the current day of the database
+        timestamp = row.get("timestamp")
+        day = timestamp.date() if timestamp is not None else None
+        counts[(row["org_id"], day, row["user_id"], row["table"])] += 1
+
+    if not counts:
+        return None
+
+    # Concurrent transactions lock the count rows in the same order so that
+    # they can't deadlock.
+    values = []
+    for key in sorted(counts, key=lambda key: (key[0], str(key[1]), key[2], key[3])):
+        org_id, day, user_id, table = key
+        values.append(
+            {
+                "org_id": org_id,
+                "day": day if day is not None else cast(db.utcnow(), Date),
+                "user_id": user_id,
+                "table": table,
+                "count": counts[key],
+            }
+        )
+
+    stmt = pg.insert(ActivityCount).values(values)
+    return stmt.on_conflict_do_update(
+        index_elements=[
+            ActivityCount.org_id,
+            ActivityCount.day,
+            ActivityCount.user_id,
+            ActivityCount.table,
+        ],
+        set_={"count": ActivityCount.count + stmt.excluded["count"]},
+    )
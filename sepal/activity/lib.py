@@ -1,52 +1,328 @@
-from base64 import b64decode
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
 from enum import Enum
-from typing import List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
-import sqlalchemy as sa
-from sqlalchemy import event, select
+import sqlalchemy.dialects.postgresql as pg
+from sqlalchemy import event, select, tuple_
 from sqlalchemy.orm import RelationshipProperty, attributes, joinedload, object_mapper
+from sqlalchemy.orm.attributes import instance_state
 from sqlalchemy.orm.exc import UnmappedColumnError
 
 import sepal.db as db
+from sepal.accessions.models import Accession, AccessionItem
+from sepal.pagination import Page, decode_cursor, paginate, where_after
+from sepal.locations.models import Location
+from sepal.profile.models import Profile
+from sepal.taxa.models import Taxon
 from sepal.requestvars import request_global
+from sepal.settings import settings
 
-from .models import Activity
+from . import writer
+from .counts import increment_counts
+from .models import Activity, ActivityCount, ActivitySnapshot
 
 
 class ActivityPermission(str, Enum):
     Read = "activity:read"
 
 
-#
+class ActivityAction(str, Enum):
+    Created = "created"
+    Updated = "updated"
+    Deleted = "deleted"
+
+
+# Map the state of the object passed to create_activity() to the action
+ACTIONS = {
+    "new": ActivityAction.Created,
+    "dirty": ActivityAction.Updated,
+    "deleted": ActivityAction.Deleted,
+}
+
+# The noun and the identifying field used to label the resources of each table
+RESOURCE_LABELS = {
+    "accession": ("Accession", "code"),
+    "accession_item": ("Accession item", "code"),
+    "location": ("Location", "code"),
+    "organization": ("Organization", "name"),
+    "taxon": ("Taxon", "name"),
+}
+
+# The models of the resources whose current labels are shown in the feed
+RESOURCE_MODELS: Dict[str, Any] = {
+    "accession": Accession,
+    "accession_item": AccessionItem,
+    "location": Location,
+    "taxon": Taxon,
+}
+
+
+# The activity is paged newest first by (timestamp, id) since the timestamps
+# aren't unique
+ACTIVITY_SORT = (Activity.timestamp, Activity.id)
+
+
+def _to_utc(value: datetime) -> datetime:
+    """Convert an aware datetime to the naive UTC datetimes of the activity."""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def make_activity_query(
+    org_id: int,
+    user_id: Optional[str] = None,
+    table: Optional[str] = None,
+    action: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+):
+    """Return the query for the activity feed of an organization.
+
+    The feed can be filtered by the user that made the changes, the table of
+    the changed resources, the action and a [start, end) range of timestamps.
+    Each of the user, table and action filters has its own index that leads
+    with the org_id and ends with the sort order of the feed. The date range
+    uses the feed index and skips the partitions outside of the range.
+    """
+    q = select(Activity).where(Activity.org_id == org_id)
+    if user_id is not None:
+        q = q.where(Activity.user_id == user_id)
+    if table is not None:
+        q = q.where(Activity.table == table)
+    if action is not None:
+        q = q.where(Activity.action == action)
+    if start is not None:
+        q = q.where(Activity.timestamp >= _to_utc(start))
+    if end is not None:
+        q = q.where(Activity.timestamp < _to_utc(end))
+    return q
+
+
 async def get_activity(
-    org_id: str,
+    org_id: int,
     limit: int = 50,
     cursor: Optional[str] = None,
     include: Optional[List[str]] = None,
-) -> List[Activity]:
-    with db.Session() as session:
+    **filters,
+) -> Page:
+    """Return a page of the activity of an organization, newest first.
+
+    The filters are passed to make_activity_query(). Raises a ValueError if
+    the cursor is invalid.
+    """
+    async with db.Session() as session:
+        q = make_activity_query(org_id, **filters)
+
+        if include is not None:
+            for field in include:
+                q = q.options(joinedload(getattr(Activity, field)))
+
+        page = await paginate(session, q, ACTIVITY_SORT, cursor, limit, descending=True)
+        await load_resource_labels(session, page.items)
+        return page
+
+
+async def get_activity_since(org_id: int, cursor: str, limit: int) -> List[Activity]:
+    """Return the activity of an organization after cursor, oldest first.
+
+    The cursor is the cursor of an activity in the feed, e.g. the id of an
+    event in the activity stream. Raises a ValueError if the cursor is
+    invalid.
+    """
+    _, key = decode_cursor(cursor, ACTIVITY_SORT)
+    async with db.Session() as session:
+        q = select(Activity).where(Activity.org_id == org_id)
+        q = where_after(q, ACTIVITY_SORT, key).order_by(*ACTIVITY_SORT).limit(limit)
+        return (await session.execute(q)).scalars().all()
+
+
+async def get_activity_counts(
+    org_id: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    user_id: Optional[str] = None,
+    table: Optional[str] = None,
+) -> List[ActivityCount]:
+    """Return the number of activities of an organization per day, user and table.
+
+    The counts are returned for the days in the [start, end) range, newest
+    first.
+    """
+    async with db.Session() as session:
+        q = (
+            select(ActivityCount)
+            .where(ActivityCount.org_id == org_id)
+            .order_by(
+                ActivityCount.day.desc(), ActivityCount.user_id, ActivityCount.table
+            )
+        )
+        if start is not None:
+            q = q.where(ActivityCount.day >= start)
+        if end is not None:
+            q = q.where(ActivityCount.day < end)
+        if user_id is not None:
+            q = q.where(ActivityCount.user_id == user_id)
+        if table is not None:
+            q = q.where(ActivityCount.table == table)
+        return (await session.execute(q)).scalars().all()
+
+
+async def get_history(
+    org_id: int,
+    table: str,
+    table_id: int,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+) -> Optional[Page]:
+    """Return a page of the activity of a single record, newest first.
+
+    Returns None if the record doesn't have any activity and doesn't exist,
+    i.e. it never existed. Raises a ValueError if the cursor is invalid.
+    """
+    async with db.Session() as session:
+        q = select(Activity).where(
+            Activity.table == table,
+            Activity.table_id == table_id,
+            Activity.org_id == org_id,
+        )
+        page = await paginate(session, q, ACTIVITY_SORT, cursor, limit, descending=True)
+        if page.items or cursor is not None:
+            return page
+
+        # records created before their activity was tracked don't have any
+        model = RESOURCE_MODELS[table]
+        q = select(model.id).where(model.id == table_id, model.org_id == org_id)
+        if (await session.execute(q)).scalar() is None:
+            return None
+        return page
+
+
+async def get_record_as_of(
+    org_id: int, table: str, table_id: int, as_of: datetime
+) -> Optional[Dict[str, Any]]:
+    """Return the data of a record as it was at as_of.
+
+    The data is rebuilt by replaying the activity of the record since the
+    latest snapshot before as_of. A snapshot is saved for every
+    settings.activity_snapshot_interval activities that are replayed so at
+    most that many activities need to be replayed the next time.
+
+    Activity can still be added behind the activity that is less than
+    settings.sync_delay seconds old, see sepal.sync.lib.get_changes(), and a
+    snapshot would hide it from every later rebuild so only older activity
+    is snapshotted. The background writer can take longer than that to
+    commit, e.g. when it writes a spill file, so no snapshots are saved
+    while it's used.
+
+    Returns None if the record didn't exist at as_of.
+    """
+    as_of = _to_utc(as_of)
+
+    async with db.Session() as session:
+        snapshot = (
+            (
+                await session.execute(
+                    select(ActivitySnapshot)
+                    .where(
+                        ActivitySnapshot.table == table,
+                        ActivitySnapshot.table_id == table_id,
+                        ActivitySnapshot.org_id == org_id,
+                        ActivitySnapshot.timestamp <= as_of,
+                    )
+                    .order_by(
+                        ActivitySnapshot.timestamp.desc(),
+                        ActivitySnapshot.activity_id.desc(),
+                    )
+                    .limit(1)
+                )
+            )
+            .scalars()
+            .first()
+        )
+
         q = (
             select(Activity)
             .where(
-                sa.or_(
-                    Activity.data_before["org_id"].as_integer() == org_id,
-                    Activity.data_after["org_id"].as_integer() == org_id,
-                ),
+                Activity.table == table,
+                Activity.table_id == table_id,
+                Activity.org_id == org_id,
+                Activity.timestamp <= as_of,
             )
-            .order_by(Activity.timestamp.desc())
+            .order_by(Activity.timestamp, Activity.id)
         )
-        q = q.options(joinedload(Activity.profile))
+        data = None
+        if snapshot is not None:
+            data = snapshot.data
+            q = q.where(
+                Activity.timestamp >= snapshot.timestamp,
+                tuple_(Activity.timestamp, Activity.id)
+                > (snapshot.timestamp, snapshot.activity_id),
+            )
+        activities = (await session.execute(q)).scalars().all()
 
-        if cursor is not None:
-            decoded_cursor = b64decode(cursor).decode()
-            q = q.where(Activity.timestamp > decoded_cursor)
+        snapshots = []
+        interval = settings.activity_snapshot_interval
+        horizon = None
+        if len(activities) >= interval and not settings.activity_async_writes:
+            now = (await session.execute(select(db.utcnow()))).scalar()
+            horizon = now - timedelta(seconds=settings.sync_delay)
+        history = expand_activity(activities, data)
+        for count, (activity, _, after) in enumerate(history, start=1):
+            data = after
+            if (
+                count % interval == 0
+                and horizon is not None
+                and activity.timestamp < horizon
+            ):
+                snapshots.append(
+                    {
+                        "table": table,
+                        "table_id": table_id,
+                        "org_id": org_id,
+                        "activity_id": activity.id,
+                        "timestamp": activity.timestamp,
+                        "data": data,
+                    }
+                )
+
+        if snapshots:
+            # another request might have saved the same snapshots already
+            await session.execute(
+                pg.insert(ActivitySnapshot).values(snapshots).on_conflict_do_nothing()
+            )
+            await session.commit()
+
+        return data
 
-        if include is not None:
-            for field in include:
-                q = q.options(joinedload(getattr(Activity, field)))
 
-        q = q.limit(limit)
-        return session.execute(q).scalars().all()
+async def load_resource_labels(session, activities: List[Activity]):
+    """Set the current label of the resource of each activity.
+
+    The labels are loaded with one query per table for all the resources in
+    activities. The resource_label stored with an activity is the label at
+    the time of the change and is kept for resources that have been deleted.
+    """
+    table_ids = defaultdict(set)
+    for activity in activities:
+        if activity.table in RESOURCE_MODELS:
+            table_ids[activity.table].add(activity.table_id)
+
+    labels = {}
+    for table, ids in table_ids.items():
+        model = RESOURCE_MODELS[table]
+        noun, key = RESOURCE_LABELS[table]
+        rows = await session.execute(
+            select(model.id, getattr(model, key)).where(model.id.in_(ids))
+        )
+        for id_, value in rows:
+            labels[(table, id_)] = f"{noun} {value}"
+
+    for activity in activities:
+        activity.current_resource_label = labels.get(
+            (activity.table, activity.table_id), activity.resource_label
+        )
 
 
 def versioned_objects(iter_):
@@ -55,8 +331,25 @@ def versioned_objects(iter_):
             yield obj
 
 
-def create_activity(obj, session, state=None):
-    """Create a new activity.
+# The fields that are stored with every activity, even if they didn't change,
+# so that the record can be identified and described without its full data.
+IDENTITY_KEYS = ("id", "org_id", "code", "name")
+
+
+def create_activity(obj, state: str) -> Optional[Dict[str, Any]]:
+    """Return the values of the activity row for a change to obj.
+
+    New objects store their fields in data_after and deleted objects store
+    their fields in data_before. Updates only store the fields that changed
+    along with the IDENTITY_KEYS. Use expand_activity() to get the full data
+    before and after each change.
+
+    Updates only read the history of the attributes that are already loaded
+    so that creating the activity doesn't load expired attributes from the
+    database. New and deleted objects store every column so the attributes
+    that aren't loaded, e.g. of a deleted object that expired, are loaded.
+    New objects have their server defaults already since the models fetch
+    them when they're inserted.
 
     This function will only work in the context of a request since it requires
     that the current_user_id is set in the request_global()
@@ -67,12 +360,12 @@ def create_activity(obj, session, state=None):
         # happen if this funtion is called in the "before_flush" event for new
         # objects. When we call this in the "after_flush" the object will still
         # be in session.new but will now have an id.
-        return
+        return None
 
     mapper = object_mapper(obj)
+    loaded = instance_state(obj).dict
     before = {}
     after = {}
-    obj_changed = False
     for om in mapper.iterate_to_root():
         for col in om.local_table.c:
             # get the value of the
@@ -88,80 +381,190 @@ def create_activity(obj, session, state=None):
                 # base class is a feature of the declarative module.
                 continue
 
-            # expired object attributes and also deferred cols might not be in
-            # the dict. getting the attribute will force it to load no matter
-            # what
-            after[prop.key] = getattr(obj, prop.key)
-
-            added, unchanged, deleted_attrs = attributes.get_history(obj, prop.key)
-
-            if deleted_attrs:
-                obj_changed = True
-                before[prop.key] = deleted_attrs[0]
-            elif unchanged:
-                before[prop.key] = unchanged[0]
-            elif added:
-                # if the attribute had no value.
-                # TODO: how do we get the previous value....maybe we just get
-                # the default value for the field...what what if the field
-                before[prop.key] = None
-                obj_changed = True
-
-    if not obj_changed:
-        # not changed, but we have relationships.  OK
-        # check those too
-        for prop in mapper.iterate_properties:
-            if (
-                isinstance(prop, RelationshipProperty)
-                and attributes.get_history(
+            if state == "dirty":
+                added, _, deleted = attributes.get_history(
                     obj, prop.key, passive=attributes.PASSIVE_NO_INITIALIZE
-                ).has_changes()
-            ):
-                for p in prop.local_columns:
-                    if p.foreign_keys:
-                        obj_changed = True
-                        break
-                if obj_changed is True:
-                    break
-
-    activity = Activity()
-    activity.user_id = request_global().current_user_id
-    activity.data_before = before if state != "new" else None
-    activity.data_after = after if state != "deleted" else None
-    activity.table = mapper.local_table.name
-    activity.table_id = obj.id
-    session.add(activity)
-    return activity
+                )
+                if added or deleted:
+                    # if the attribute was expired before it was changed then
+                    # the old value is unknown and it's left out of
+                    # data_before so expand_activity() keeps the value from
+                    # the previous activity
+                    if deleted:
+                        before[prop.key] = deleted[0]
+                    after[prop.key] = added[0] if added else None
+            else:
+                before[prop.key] = after[prop.key] = getattr(obj, prop.key)
+
+    if state == "dirty" and not after and not _relationships_changed(obj, mapper):
+        return None
+
+    for key in IDENTITY_KEYS:
+        if key in mapper.column_attrs and key not in after:
+            value = loaded[key] if key in loaded else getattr(obj, key)
+            before[key] = after[key] = value
+
+    table = mapper.local_table.name
+    return {
+        "user_id": request_global().current_user_id,
+        "data_before": before if state != "new" else None,
+        "data_after": after if state != "deleted" else None,
+        "table": table,
+        "table_id": obj.id,
+        "org_id": after.get("org_id"),
+        "action": ACTIONS[state].value,
+        "resource_label": format_resource_label(table, obj.id, after),
+    }
+
+
+def format_resource_label(table: str, table_id: int, data: Dict[str, Any]) -> str:
+    if table not in RESOURCE_LABELS:
+        return "Unknown resource"
+    noun, key = RESOURCE_LABELS[table]
+    value = data.get(key)
+    return f"{noun} {value if value is not None else table_id}"
+
+
+def format_user_name(
+    given_name: Optional[str], family_name: Optional[str], email: Optional[str]
+) -> str:
+    if family_name and given_name:
+        return " ".join([family_name, given_name])
+    elif email is not None:
+        return email
+    else:
+        return "Unknown user"
+
+
+def get_actor_name(session) -> str:
+    """Return the display name of the current user.
+
+    The name is looked up once per request and stored in the request_global()
+    so that every activity of a request doesn't need a query.
+    """
+    user_id = request_global().current_user_id
+    cached = getattr(request_global(), "current_user_name", None)
+    if cached is not None and cached[0] == user_id:
+        return cached[1]
+
+    # use the connection directly since the session is being flushed
+    profile = (
+        session.connection()
+        .execute(
+            select(Profile.given_name, Profile.family_name, Profile.email).where(
+                Profile.user_id == user_id
+            )
+        )
+        .first()
+    )
+    name = format_user_name(*profile) if profile is not None else "Unknown user"
+    request_global().current_user_name = (user_id, name)
+    return name
+
+
+def _relationships_changed(obj, mapper) -> bool:
+    for prop in mapper.iterate_properties:
+        if (
+            isinstance(prop, RelationshipProperty)
+            and attributes.get_history(
+                obj, prop.key, passive=attributes.PASSIVE_NO_INITIALIZE
+            ).has_changes()
+            and any(col.foreign_keys for col in prop.local_columns)
+        ):
+            return True
+    return False
+
+
+def expand_activity(
+    activities: Iterable[Activity],
+    data: Optional[Dict[str, Any]] = None,
+) -> Iterator[Tuple[Activity, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]:
+    """Yield each activity with the full data of its record before and after.
+
+    The activities must all be for the same record and in the order they
+    happened, starting with the activity that created the record or with the
+    first activity after data, e.g. the data of a snapshot. The data is
+    rebuilt by applying the changed fields of each activity to the data after
+    the previous activity. The before data is None for the activity that
+    created the record and the after data is None for the activity that
+    deleted it.
+    """
+    for activity in activities:
+        before = None
+        if activity.data_before is not None:
+            before = {**(data or {}), **activity.data_before}
+        after = None
+        if activity.data_after is not None:
+            after = {**(before or {}), **activity.data_after}
+        yield activity, before, after
+        data = after
 
 
 def before_flush_listener(session, _flush_context, _instances=None):
+    # The history of dirty and deleted objects has to be read before the flush
+    # but the rows aren't written until after the flush so that they can be
+    # inserted together with the activity for the new objects. This replaces
+    # the rows of an earlier flush that failed before they were written.
+    rows = []
     for obj in versioned_objects(session.dirty):
-        create_activity(obj, session, state="dirty")
+        rows.append(create_activity(obj, state="dirty"))
     for obj in versioned_objects(session.deleted):
-        create_activity(obj, session, state="deleted")
+        rows.append(create_activity(obj, state="deleted"))
+    session.info["pending_activity"] = rows
 
 
 def after_flush_listener(session, _flush_context):
-    # In order to create an activity for the new objects we need the objects
-    # id which doesn't get assigned until after a flush which means we need
-    # to create our own session and merge the activity into it so we can
-    # commit it since the original session might not get flushed again.
-    new_session = db.session_factory()
+    # The new objects don't have an id until they've been flushed. Their
+    # activity is written with the rest of the activity for the flush in a
+    # single insert on the session's own connection so it's part of the same
+    # transaction and doesn't need another flush.
+    rows = session.info.pop("pending_activity", [])
     for obj in versioned_objects(session.new):
-        activity = create_activity(obj, session, state="new")
-        new_session.merge(activity)
+        rows.append(create_activity(obj, state="new"))
+    rows = [row for row in rows if row is not None]
+    if not rows:
+        return
+
+    actor_name = get_actor_name(session)
+    for row in rows:
+        row["actor_name"] = actor_name
+
+    if writer.activity_writer is not None:
+        # The rows are handed to the background writer once the transaction
+        # commits so the activity of changes that are rolled back is dropped.
+        # The rows get their timestamp from the transaction that writes them.
+        session.info.setdefault("unwritten_activity", []).extend(rows)
+    else:
+        conn = session.connection()
+        conn.execute(Activity.__table__.insert(), rows)
+        stmt = increment_counts(rows)
+        if stmt is not None:
+            conn.execute(stmt)
+
+
+def after_commit_listener(session):
+    rows = session.info.pop("unwritten_activity", None)
+    if rows and writer.activity_writer is not None:
+        writer.activity_writer.put(rows)
+
 
-    new_session.flush()
+def after_rollback_listener(session):
+    session.info.pop("unwritten_activity", None)
 
 
 def init_session_tracking(session):
-    event.listen(session, "before_flush", before_flush_listener)
-    event.listen(session, "after_flush", after_flush_listener)
+    listeners = [
+        ("before_flush", before_flush_listener),
+        ("after_flush", after_flush_listener),
+        ("after_commit", after_commit_listener),
+        ("after_rollback", after_rollback_listener),
+    ]
+    for name, listener in listeners:
+        event.listen(session, name, listener)
 
     def unregister():
-        if event.contains(session, "before_flush", before_flush_listener):
-            event.remove(session, "before_flush", before_flush_listener)
-        if event.contains(session, "after_flush", after_flush_listener):
-            event.remove(session, "after_flush", after_flush_listener)
+        for name, listener in listeners:
+            if event.contains(session, name, listener):
+                event.remove(session, name, listener)
 
     return unregister
@@ -1,11 +1,19 @@
+from typing import Any, Dict, Optional
+
 import sqlalchemy.dialects.postgresql as pg
-from sqlalchemy import Column, DateTime, Integer, String
+from sqlalchemy import DDL, Column, Date, DateTime, Index, Integer, String, event
 from sqlalchemy.orm import relationship
 
 import sepal.db as db
 
 
 class Activity(db.BaseModel, db.IdMixin):
+    # The table is partitioned by month on the timestamp. The monthly partitions
+    # are managed with sepal.activity.partitions. Postgres requires the
+    # partition key to be part of the primary key.
+    __table_args__: Dict[str, Any] = {"postgresql_partition_by": "RANGE (timestamp)"}
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
     # TODO: once we get account creation callbacks from firebase working and can
     # guarantee every user has a profile then we should make this a proper
     # foreign key
@@ -14,10 +22,149 @@ class Activity(db.BaseModel, db.IdMixin):
 
     data_before = Column(pg.JSONB)
     data_after = Column(pg.JSONB)
-    timestamp = Column(DateTime, server_default=db.utcnow(), nullable=False)
+    timestamp = Column(
+        DateTime, server_default=db.utcnow(), primary_key=True, nullable=False
+    )
     table = Column(String, nullable=False)
     table_id = Column(Integer, nullable=False)
+    # Copied from the org_id of the changed object so the activity of an
+    # organization can be queried without looking inside the JSONB data. This
+    # isn't a foreign key since the activity outlives deleted organizations.
+    org_id = Column(Integer)
+
+    # The summary of the activity is stored when it's created so that the
+    # activity feed doesn't need to join the profiles or format each row.
+    action = Column(String, nullable=False)
+    actor_name = Column(String, nullable=False)
+    resource_label = Column(String, nullable=False)
+
+    # The current label of the resource, set by load_resource_labels()
+    current_resource_label: Optional[str] = None
 
     profile = relationship(
         "Profile", primaryjoin="foreign(Activity.user_id) == remote(Profile.user_id)"
     )
+
+
+class ActivityCount(db.BaseModel):
+    """The number of activities of an organization per day, user and table.
+
+    The counts are incremented when the activity is written so the activity
+    statistics don't need to count the activity table.
+    """
+
+    org_id = Column(Integer, primary_key=True)
+    # the UTC date of the activity
+    day = Column(Date, primary_key=True)
+    user_id = Column(String, primary_key=True)
+    table = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False)
+
+
+class ActivitySnapshot(db.BaseModel, db.IdMixin):
+    """The full data of a record after one of its activities.
+
+    Snapshots are saved periodically while records are rebuilt from their
+    activity so the next rebuild can start from the snapshot instead of
+    replaying the whole history of the record.
+    """
+
+    table = Column(String, nullable=False)
+    table_id = Column(Integer, nullable=False)
+    org_id = Column(Integer)
+    activity_id = Column(Integer, nullable=False, unique=True)
+    timestamp = Column(DateTime, nullable=False)
+    # null if the record was deleted by the activity
+    data = Column(pg.JSONB(none_as_null=True))
+
+
+Index(
+    "ix_activity_snapshot_table_table_id_timestamp_activity_id",
+    ActivitySnapshot.table,
+    ActivitySnapshot.table_id,
+    ActivitySnapshot.timestamp.desc(),
+    ActivitySnapshot.activity_id.desc(),
+)
+
+
+# The index for the activity feed of an organization
+Index(
+    "ix_activity_org_id_timestamp_id",
+    Activity.org_id,
+    Activity.timestamp.desc(),
+    Activity.id.desc(),
+)
+
+# The indexes for the activity feed filtered by user, table or action
+Index(
+    "ix_activity_org_id_user_id_timestamp_id",
+    Activity.org_id,
+    Activity.user_id,
+    Activity.timestamp.desc(),
+    Activity.id.desc(),
+)
+Index(
+    "ix_activity_org_id_table_timestamp_id",
+    Activity.org_id,
+    Activity.table,
+    Activity.timestamp.desc(),
+    Activity.id.desc(),
+)
+Index(
+    "ix_activity_org_id_action_timestamp_id",
+    Activity.org_id,
+    Activity.action,
+    Activity.timestamp.desc(),
+    Activity.id.desc(),
+)
+
+# The index for the history of a single record
+Index(
+    "ix_activity_table_table_id_timestamp_id",
+    Activity.table,
+    Activity.table_id,
+    Activity.timestamp.desc(),
+    Activity.id.desc(),
+)
+
+# The default partition holds the rows that don't belong to a monthly partition,
+# e.g. when the partitions haven't been created ahead of time. When a monthly
+# partition is created its rows are moved out of the default partition.
+event.listen(
+    Activity.__table__,
+    "after_create",
+    DDL("CREATE TABLE activity_default PARTITION OF activity DEFAULT"),
+)
+
+# A notification is sent on the activity channel for every new activity of an
+# organization. The payload has the summary of the activity but not its data
+# since payloads are limited to 8000 bytes. See sepal.activity.stream
+ACTIVITY_CHANNEL = "activity"
+
+event.listen(
+    Activity.__table__,
+    "after_create",
+    DDL(
+        f"""
+        CREATE OR REPLACE FUNCTION notify_activity() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('{ACTIVITY_CHANNEL}', json_build_object(
+                'id', NEW.id,
+                'org_id', NEW.org_id,
+                'timestamp', to_char(NEW.timestamp, 'YYYY-MM-DD"T"HH24:MI:SS.US'),
+                'table', NEW."table",
+                'table_id', NEW.table_id,
+                'action', NEW.action,
+                'actor_name', NEW.actor_name,
+                'resource_label', NEW.resource_label
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE TRIGGER activity_notify AFTER INSERT ON activity
+        FOR EACH ROW WHEN (NEW.org_id IS NOT NULL)
+        EXECUTE FUNCTION notify_activity();
+        """
+    ),
+)
@@ -0,0 +1,245 @@
+"""Manage the monthly partitions of the activity table.
+
+The activity table is partitioned by month on the timestamp with one
+partition named activity_yYYYYmMM per month. The maintain command creates the
+partitions for the current month and settings.activity_partitions_ahead
+months ahead. If settings.activity_retention_months is set, it also archives
+and drops the partitions for months older than the retention period and
+archives and deletes the rows older than the retention period from the
+default partition. Archived rows are written to settings.activity_archive_path
+as gzipped newline-delimited JSON.
+
+Usage: ::
+
+    PYTHONPATH=. python -m sepal.activity.partitions maintain
+    PYTHONPATH=. python -m sepal.activity.partitions create 2021-06
+    PYTHONPATH=. python -m sepal.activity.partitions archive 2021-01
+
+The maintain command is safe to run repeatedly, e.g. daily from cron.
+"""
+import argparse
+import gzip
+import os
+import re
+from datetime import date, datetime
+from typing import List, Optional
+
+import orjson
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.sql.elements import TextClause
+
+import sepal.db as db
+from sepal.log import log
+from sepal.settings import settings
+
+PARTITION_NAME_RE = re.compile(r"^activity_y(\d{4})m(\d{2})$")
+
+
+def add_months(month: date, months: int) -> date:
+    """Return the first day of the month that is months after month."""
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"activity_y{month.year:04d}m{month.month:02d}"
+
+
+def get_partitions(conn: Connection) -> List[date]:
+    """Return the months of the monthly partitions of the activity table."""
+    names = conn.execute(
+        text(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+            JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+            WHERE parent.relname = 'activity'
+            """
+        )
+    ).scalars()
+    months = []
+    for name in names:
+        match = PARTITION_NAME_RE.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def create_partition(conn: Connection, month: date) -> bool:
+    """Create the partition for month if it doesn't exist.
+
+    The rows for the month that were written to the default partition are
+    moved to the new partition. Returns True if the partition was created.
+    """
+    month = month.replace(day=1)
+    # Rows written to the default partition while they're being moved would
+    # make attaching the partition fail so block the writes to the default
+    # partition, and other creates, until the transaction ends.
+    conn.execute(text("LOCK TABLE activity_default IN SHARE ROW EXCLUSIVE MODE"))
+    if month in get_partitions(conn):
+        return False
+
+    name = partition_name(month)
+    start, end = month.isoformat(), add_months(month, 1).isoformat()
+    # A partition can't be added while the default partition has rows that
+    # belong to it so create the table, move the rows and then attach it.
+    conn.execute(
+        text(
+            f"CREATE TABLE {name} (LIKE activity INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+    )
+    conn.execute(
+        text(
+            f"""
+            WITH moved AS (
+                DELETE FROM activity_default
+                WHERE timestamp >= :start AND timestamp < :end
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+            """
+        ),
+        {"start": start, "end": end},
+    )
+    conn.execute(
+        text(
+            f"ALTER TABLE activity ATTACH PARTITION {name} "
+            f"FOR VALUES FROM ('{start}') TO ('{end}')"
+        )
+    )
+    log.info(f"Created activity partition {name}")
+    return True
+
+
+def archive_partition(conn: Connection, month: date, archive_path: str) -> str:
+    """Export the partition for month to a file and drop it.
+
+    Returns the path of the file. The partition is only dropped once the file
+    has been completely written.
+    """
+    name = partition_name(month)
+    path = os.path.join(archive_path, f"{name}.ndjson.gz")
+    _export(conn, text(f"SELECT * FROM {name} ORDER BY timestamp, id"), path)
+
+    conn.execute(text(f"ALTER TABLE activity DETACH PARTITION {name}"))
+    conn.execute(text(f"DROP TABLE {name}"))
+    log.info(f"Archived activity partition {name} to {path}")
+    return path
+
+
+def archive_default(
+    conn: Connection, before: date, archive_path: str, now: datetime
+) -> Optional[str]:
+    """Export the rows older than before in the default partition and delete them.
+
+    The rows are written to a file named after now. Returns the path of the
+    file or None if there weren't any rows to archive.
+    """
+    # block writes to the default partition so the rows that are deleted are
+    # the rows that were exported
+    conn.execute(text("LOCK TABLE activity_default IN SHARE ROW EXCLUSIVE MODE"))
+    params = {"before": before.isoformat()}
+    count = conn.execute(
+        text("SELECT count(*) FROM activity_default WHERE timestamp < :before"),
+        params,
+    ).scalar()
+    if not count:
+        return None
+
+    path = os.path.join(archive_path, f"activity_default_{now:%Y%m%dT%H%M%S}.ndjson.gz")
+    query = text(
+        "SELECT * FROM activity_default WHERE timestamp < :before "
+        "ORDER BY timestamp, id"
+    )
+    _export(conn, query, path, params)
+
+    conn.execute(text("DELETE FROM activity_default WHERE timestamp < :before"), params)
+    log.info(f"Archived {count} rows of the default activity partition to {path}")
+    return path
+
+
+def _export(
+    conn: Connection, query: TextClause, path: str, params: Optional[dict] = None
+):
+    """Write the rows of query to path as gzipped newline-delimited JSON.
+
+    The rows are written to a temporary file that is renamed to path once
+    it's complete.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    result = conn.execution_options(stream_results=True).execute(query, params or {})
+    with gzip.open(tmp_path, "wb") as f:
+        for row in result.mappings():
+            f.write(orjson.dumps(dict(row)) + b"\n")
+    os.replace(tmp_path, path)
+
+
+def maintain(
+    engine: Engine,
+    today: date,
+    months_ahead: int,
+    retention_months: Optional[int],
+    archive_path: str,
+):
+    """Create the upcoming partitions and archive the expired activity.
+
+    Each partition is created or archived in its own transaction. The expired
+    rows in the default partition are archived in a transaction after the
+    expired partitions.
+    """
+    current = today.replace(day=1)
+    for months in range(months_ahead + 1):
+        with engine.begin() as conn:
+            create_partition(conn, add_months(current, months))
+
+    if retention_months is None:
+        return
+
+    # keep the current month and the retention_months before it
+    cutoff = add_months(current, -retention_months)
+    with engine.connect() as conn:
+        expired = [month for month in get_partitions(conn) if month < cutoff]
+    for month in expired:
+        with engine.begin() as conn:
+            archive_partition(conn, month, archive_path)
+
+    with engine.begin() as conn:
+        archive_default(conn, cutoff, archive_path, datetime.utcnow())
+
+
+def parse_month(value: str) -> date:
+    return date.fromisoformat(f"{value}-01")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("maintain", help="create and archive partitions")
+    create_parser = subparsers.add_parser("create", help="create a partition")
+    create_parser.add_argument("month", type=parse_month, help="YYYY-MM")
+    archive_parser = subparsers.add_parser("archive", help="archive a partition")
+    archive_parser.add_argument("month", type=parse_month, help="YYYY-MM")
+    args = parser.parse_args()
+
+    engine = db.engine
+    if args.command == "maintain":
+        maintain(
+            engine,
+            datetime.utcnow().date(),
+            settings.activity_partitions_ahead,
+            settings.activity_retention_months,
+            settings.activity_archive_path,
+        )
+    elif args.command == "create":
+        with engine.begin() as conn:
+            create_partition(conn, args.month)
+    elif args.command == "archive":
+        with engine.begin() as conn:
+            archive_partition(conn, args.month, settings.activity_archive_path)
+
+
+if __name__ == "__main__":
+    main()
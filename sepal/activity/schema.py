@@ -1,4 +1,5 @@
-from datetime import datetime
+from datetime import date, datetime
+from typing import Any, Dict, Optional
 
 from pydantic import BaseModel, root_validator
 
@@ -7,71 +8,58 @@ class ActivitySchemaBase(BaseModel):
     description: str
 
 
-def format_user_name(profile):
-    if (
-        profile.family_name is not None
-        and profile.family_name != ""
-        and profile.given_name is not None
-        and profile.given_name != ""
-    ):
-        return " ".join([profile.family_name, profile.given_name])
-    elif profile.email is not None:
-        return profile.email
-    else:
-        return "Unknown user"
-
-
-def format_timestamp(timestamp: datetime):
-    return timestamp.strftime("%b %d, %Y at %X")
-
-
-def format_resource(value):
-    # TODO: can we load the resource dynamically when we get the activity and
-    # just call str() on it to format it
-    table = value["table"]
-    table_id = value["table_id"]
+class ActivitySchema(ActivitySchemaBase):
+    action: str
+    actor_name: str
+    # The table and id of the changed resource so that the UI can link to it
+    resource_table: str
+    resource_id: str
+    resource_label: str
+    timestamp: datetime
 
-    if table == "taxon":
-        return f"Taxon({table_id})"
-    if table == "accession":
-        data = (
-            value["data_before"]
-            if value["data_before"] is not None
-            else value["data_after"]
+    @root_validator(pre=True)
+    def transform(cls, values):
+        # The summary fields are stored on the activity when it's created and
+        # are returned as they are, except for the resource label which is
+        # replaced with the current label of the resource if it's been
+        # loaded. The clients format the timestamp in the user's time zone.
+        resource_label = (
+            values.get("current_resource_label") or values["resource_label"]
         )
-        accession_code = data["code"] if data is not None else ""
-        return f"Accession {accession_code}"
-    else:
-        return "Unknown resource"
+        return {
+            "action": values["action"],
+            "actor_name": values["actor_name"],
+            "resource_table": values["table"],
+            "resource_id": values["table_id"],
+            "resource_label": resource_label,
+            "description": (
+                f"{resource_label} {values['action']} by {values['actor_name']}"
+            ),
+            "timestamp": values["timestamp"],
+        }
 
+    class Config:
+        orm_mode = True
 
-def description_factory(value):
-    profile = value["profile"]
-    user_name = format_user_name(profile) if profile is not None else "Unknown user"
-    resource = format_resource(value)
-    timestamp = format_timestamp(value["timestamp"])
-    if value["data_after"] is None:
-        return f"{resource} deleted by {user_name} on {timestamp}..."
-    else:
-        return f"{resource} updated by {user_name} on {timestamp}..."
 
+class ActivityHistorySchema(BaseModel):
+    id: str
+    action: str
+    actor_name: str
+    timestamp: datetime
+    # Only the fields that changed are included for updates
+    data_before: Optional[Dict[str, Any]]
+    data_after: Optional[Dict[str, Any]]
 
-class ActivitySchema(ActivitySchemaBase):
-    description = ""
-    timestamp = ""
+    class Config:
+        orm_mode = True
 
-    # TODO: Can we pass a link to the resource so that we can click on the item?
-    # What if we want to have more than one link? Is it safe to just return
-    # markup and display that?
-    #
-    # resource_link: str
 
-    @root_validator(pre=True)
-    def transform(cls, values):
-        return {
-            "description": description_factory(values),
-            "timestamp": values["timestamp"].isoformat(),
-        }
+class ActivityCountSchema(BaseModel):
+    day: date
+    user_id: str
+    table: str
+    count: int
 
     class Config:
         orm_mode = True
@@ -0,0 +1,176 @@
+import asyncio
+from collections import defaultdict
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional, Set
+
+import asyncpg
+import orjson
+from sqlalchemy.engine import make_url
+
+from sepal.log import log
+from sepal.pagination import encode_cursor, get_key
+from sepal.settings import settings
+
+from .lib import ACTIVITY_SORT
+from .models import ACTIVITY_CHANNEL, Activity
+from .schema import ActivitySchema
+
+
+class ActivityBroadcaster:
+    """Fan out the notifications of new activity to the subscribed streams.
+
+    Each worker holds a single LISTEN connection that is opened when the
+    first stream subscribes. Every notification is put on the queues of the
+    streams that are subscribed to the organization of the activity.
+
+    A stream whose queue is full or that loses the LISTEN connection gets a
+    None on its queue and should end so that the client reconnects and
+    resumes from the last activity it received.
+    """
+
+    def __init__(
+        self, dsn: str, channel: str = ACTIVITY_CHANNEL, queue_size: int = 100
+    ):
+        self.dsn = dsn
+        self.channel = channel
+        self.queue_size = queue_size
+        self._subscribers: Dict[
+            int, Set["asyncio.Queue[Optional[Activity]]"]
+        ] = defaultdict(set)
+        self._conn: Optional[asyncpg.Connection] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def subscribe(self, org_id: int) -> "asyncio.Queue[Optional[Activity]]":
+        """Return the queue that receives the new activity of an organization."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._conn is None or self._conn.is_closed():
+                self._conn = await asyncpg.connect(self.dsn)
+                self._conn.add_termination_listener(self._on_termination)
+                await self._conn.add_listener(self.channel, self._on_notification)
+
+        queue: "asyncio.Queue[Optional[Activity]]" = asyncio.Queue(self.queue_size)
+        self._subscribers[org_id].add(queue)
+        return queue
+
+    def unsubscribe(self, org_id: int, queue: "asyncio.Queue[Optional[Activity]]"):
+        queues = self._subscribers.get(org_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[org_id]
+
+    async def stop(self):
+        self._end_streams(list(self._subscribers))
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+        self._conn = None
+        self._lock = None
+
+    def _on_notification(self, _conn, _pid, _channel, payload: str):
+        data = orjson.loads(payload)
+        queues = self._subscribers.get(data["org_id"])
+        if not queues:
+            return
+
+        data["timestamp"] = datetime.fromisoformat(data["timestamp"])
+        activity = Activity(**data)
+        for queue in list(queues):
+            try:
+                queue.put_nowait(activity)
+            except asyncio.QueueFull:
+                log.warning(
+                    f"Activity stream of organization {data['org_id']} fell behind"
+                )
+                self._end_stream(data["org_id"], queue)
+
+    def _on_termination(self, _conn):
+        log.warning("Lost the activity LISTEN connection")
+        self._conn = None
+        self._end_streams(list(self._subscribers))
+
+    def _end_streams(self, org_ids: Iterable[int]):
+        for org_id in org_ids:
+            for queue in list(self._subscribers.get(org_id, [])):
+                self._end_stream(org_id, queue)
+
+    def _end_stream(self, org_id: int, queue: "asyncio.Queue[Optional[Activity]]"):
+        self.unsubscribe(org_id, queue)
+        # make room for the None if the queue is full
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+
+def format_event(event: str, data: bytes = b"", id_: Optional[str] = None) -> bytes:
+    """Return a server-sent event."""
+    lines = [f"event: {event}".encode()]
+    if id_ is not None:
+        lines.append(f"id: {id_}".encode())
+    lines.append(b"data: " + data)
+    return b"\n".join(lines) + b"\n\n"
+
+
+def format_activity_event(activity: Activity) -> bytes:
+    # the id is the cursor of the activity so the client can resume from it by
+    # passing it back as the Last-Event-ID
+    return format_event(
+        "activity",
+        ActivitySchema.from_orm(activity).json().encode(),
+        id_=encode_cursor(get_key(activity, ACTIVITY_SORT)),
+    )
+
+
+async def stream_activity(
+    queue: "asyncio.Queue[Optional[Activity]]",
+    missed: Iterable[Activity] = (),
+    reset: bool = False,
+    heartbeat: float = 15,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+) -> AsyncIterator[bytes]:
+    """Yield the server-sent events for the activity put on queue.
+
+    The missed activity is sent first. If reset is True the client missed
+    too much activity to be sent and is told to reload the feed instead. The
+    activity on the queue that was already sent as missed activity is
+    skipped.
+
+    The events end when is_disconnected returns True. Sending to a client
+    that has disconnected doesn't necessarily fail, e.g. behind
+    BaseHTTPMiddleware, so without it the heartbeats would keep the events
+    going forever.
+    """
+    if reset:
+        yield format_event("reset")
+
+    sent = set()
+    for missed_activity in missed:
+        sent.add(missed_activity.id)
+        yield format_activity_event(missed_activity)
+
+    while True:
+        if is_disconnected is not None and await is_disconnected():
+            return
+        try:
+            activity = await asyncio.wait_for(queue.get(), heartbeat)
+        except asyncio.TimeoutError:
+            if is_disconnected is not None and await is_disconnected():
+                return
+            yield b": heartbeat\n\n"
+            continue
+
+        if activity is None:
+            return
+        if activity.id not in sent:
+            yield format_activity_event(activity)
+
+
+def _make_dsn(database_url: str) -> str:
+    url = make_url(database_url).set(drivername="postgresql")
+    return url.render_as_string(hide_password=False)
+
+
+activity_broadcaster = ActivityBroadcaster(
+    _make_dsn(settings.database_url), queue_size=settings.activity_stream_queue_size
+)
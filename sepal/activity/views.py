@@ -1,15 +1,39 @@
-from typing import List, Optional
+from datetime import date, datetime
+from typing import List, Optional, Type
 
-from fastapi import APIRouter, Depends, HTTPException, Query, Response, status, Request
+from pydantic import BaseModel
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Query,
+    Response,
+    status,
+    Request,
+)
+from fastapi.responses import StreamingResponse
 
 from sepal.auth import get_current_user
 from sepal.organizations.lib import verify_org_id
+from sepal.pagination import PageParams, decode_cursor, set_link_header
 from sepal.permissions import check_permission
-from sepal.utils import make_cursor_link
+from sepal.settings import settings
 
-from .lib import ActivityPermission, get_activity
+from .lib import (
+    ACTIVITY_SORT,
+    ActivityAction,
+    ActivityPermission,
+    get_activity,
+    get_activity_counts,
+    get_activity_since,
+    get_history,
+    get_record_as_of,
+)
 
-from .schema import ActivitySchema
+from .schema import ActivityCountSchema, ActivityHistorySchema, ActivitySchema
+from .stream import activity_broadcaster, stream_activity
 
 router = APIRouter()
 
@@ -20,17 +44,156 @@ async def list(
     response: Response,
     current_user_id=Depends(get_current_user),
     org_id=Depends(verify_org_id),
-    cursor: Optional[str] = None,
-    limit: int = 50,
+    page_params: PageParams = Depends(),
     include: Optional[List["str"]] = Query(None),
+    user_id: Optional[str] = None,
+    table: Optional[str] = None,
+    action: Optional[ActivityAction] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
 ) -> List[ActivitySchema]:
     if org_id is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
-    activity = await get_activity(org_id, limit=limit, cursor=cursor, include=include)
+    try:
+        page = await get_activity(
+            org_id,
+            limit=page_params.limit,
+            cursor=page_params.cursor,
+            include=include,
+            user_id=user_id,
+            table=table,
+            action=action,
+            start=start,
+            end=end,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+    set_link_header(request, response, page, page_params.limit)
+    return [ActivitySchema.from_orm(a) for a in page.items]
+
+
+@router.get(
+    "/counts", dependencies=[Depends(check_permission(ActivityPermission.Read))]
+)
+async def list_counts(
+    org_id=Depends(verify_org_id),
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    user_id: Optional[str] = None,
+    table: Optional[str] = None,
+) -> List[ActivityCountSchema]:
+    """Return the number of activities per day, user and table."""
+    if org_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    counts = await get_activity_counts(
+        org_id, start=start, end=end, user_id=user_id, table=table
+    )
+    return [ActivityCountSchema.from_orm(count) for count in counts]
+
+
+@router.get(
+    "/stream", dependencies=[Depends(check_permission(ActivityPermission.Read))]
+)
+async def stream(
+    request: Request,
+    org_id=Depends(verify_org_id),
+    last_event_id: Optional[str] = Header(None),
+):
+    """Stream the new activity of the organization as server-sent events.
+
+    Clients that reconnect with the Last-Event-ID header are sent the activity
+    they missed first.
+    """
+    if org_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
-    if len(activity) == limit:
-        next_url = make_cursor_link(str(request.url), activity[-1].timestamp, limit)
-        response.headers["Link"] = f"<{next_url}>; rel=next"
+    if last_event_id is not None:
+        try:
+            decode_cursor(last_event_id, ACTIVITY_SORT)
+        except ValueError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)
+            )
 
-    return [ActivitySchema.from_orm(a) for a in activity]
+    # subscribe before loading the missed activity so that nothing is lost in
+    # between
+    queue = await activity_broadcaster.subscribe(org_id)
+    loaded = False
+    try:
+        missed: List = []
+        reset = False
+        if last_event_id is not None:
+            backlog = settings.activity_stream_backlog
+            missed = await get_activity_since(org_id, last_event_id, limit=backlog + 1)
+            if len(missed) > backlog:
+                missed, reset = [], True
+        loaded = True
+    finally:
+        # the events below are never streamed so they can't unsubscribe
+        if not loaded:
+            activity_broadcaster.unsubscribe(org_id, queue)
+
+    async def events():
+        try:
+            async for event in stream_activity(
+                queue,
+                missed,
+                reset,
+                settings.activity_stream_heartbeat,
+                request.is_disconnected,
+            ):
+                yield event
+        finally:
+            activity_broadcaster.unsubscribe(org_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def list_history(
+    request: Request,
+    response: Response,
+    org_id: int,
+    table: str,
+    table_id: int,
+    page_params: PageParams,
+) -> List[ActivityHistorySchema]:
+    """Return a page of the history of a record.
+
+    This is used by the history endpoints of each resource.
+    """
+    try:
+        page = await get_history(
+            org_id,
+            table,
+            table_id,
+            limit=page_params.limit,
+            cursor=page_params.cursor,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+    if page is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    set_link_header(request, response, page, page_params.limit)
+    return [ActivityHistorySchema.from_orm(activity) for activity in page.items]
+
+
+async def detail_as_of(
+    org_id: int, table: str, table_id: int, as_of: datetime, schema: Type[BaseModel]
+):
+    """Return a record as it was at as_of.
+
+    This is used by the history endpoints of each resource.
+    """
+    data = await get_record_as_of(org_id, table, table_id, as_of)
+    if data is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    return schema.parse_obj(data)
@@ -0,0 +1,241 @@
+import asyncio
+import fcntl
+import glob
+import os
+from typing import IO, Any, Dict, Iterable, List, Optional
+
+import orjson
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from sepal.log import log
+
+from .counts import increment_counts
+from .models import Activity
+
+Row = Dict[str, Any]
+
+
+class ActivityWriter:
+    """Write activity rows in the background.
+
+    Rows are put on a bounded queue and a background task drains the queue
+    and writes the rows in multi-row inserts of up to batch_size rows so the
+    requests that made the changes don't wait on the inserts. The rows don't
+    have a timestamp so they get the time of the transaction that inserts
+    them, the same as activity written in the request's transaction. That
+    keeps the activity timestamps within a transaction's length of the time
+    the rows are committed, which the sync endpoint and the activity
+    snapshots rely on.
+
+    Rows that can't be queued because the queue is full, that fail to be
+    written or that are still queued when the writer is stopped are appended
+    to the spill file of the process in spill_dir as newline delimited JSON.
+    The process holds a lock on its spill file while the writer is running.
+    When a writer starts it writes the spill files in spill_dir that aren't
+    locked, i.e. the spill files of processes that have stopped, to the
+    database.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        spill_dir: str,
+        maxsize: int = 10000,
+        batch_size: int = 500,
+        shutdown_timeout: float = 10,
+    ):
+        self.engine = engine
+        self.spill_dir = spill_dir
+        self.spill_path = os.path.join(spill_dir, f"activity-{os.getpid()}.spill")
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.shutdown_timeout = shutdown_timeout
+        self.written = 0
+        self.spilled = 0
+        self.dropped = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._writing: Optional[asyncio.Future] = None
+        self._spill_file: Optional[IO[bytes]] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def put(self, rows: Iterable[Row]):
+        """Queue rows to be written or spill them if the queue is full."""
+        overflow = []
+        for row in rows:
+            if self._queue is None:
+                overflow.append(row)
+                continue
+            try:
+                self._queue.put_nowait(row)
+            except asyncio.QueueFull:
+                overflow.append(row)
+
+        if overflow:
+            self.spill(overflow)
+
+    def spill(self, rows: List[Row]):
+        """Append rows to the spill file or drop them if it can't be written."""
+        try:
+            if self._spill_file is None:
+                self._spill_file = _open_locked(self.spill_path)
+            self._spill_file.write(b"".join(orjson.dumps(row) + b"\n" for row in rows))
+            self._spill_file.flush()
+        except OSError:
+            self.dropped += len(rows)
+            log.exception(f"Could not spill {len(rows)} activity rows")
+            return
+        self.spilled += len(rows)
+        log.warning(f"Spilled {len(rows)} activity rows to {self.spill_path}")
+
+    async def start(self):
+        os.makedirs(self.spill_dir, exist_ok=True)
+        # The queue is bound to the event loop of the app so it's created here
+        # instead of in __init__.
+        self._queue = asyncio.Queue(self.maxsize)
+        await self.replay()
+        self._task = asyncio.create_task(self._run(self._queue))
+
+    async def stop(self):
+        """Write the queued rows and stop the writer.
+
+        Whatever hasn't been written within shutdown_timeout seconds is
+        spilled.
+        """
+        queue, task = self._queue, self._task
+        if queue is None or task is None:
+            self._close_spill_file()
+            return
+
+        try:
+            await asyncio.wait_for(queue.join(), self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            pass
+
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        if self._writing is not None:
+            await self._writing
+
+        rows = []
+        while not queue.empty():
+            rows.append(queue.get_nowait())
+        if rows:
+            self.spill(rows)
+
+        self._queue = None
+        self._task = None
+        self._close_spill_file()
+
+    async def replay(self):
+        """Write the spill files of the stopped processes to the database.
+
+        Each spill file is written in a single transaction and removed once
+        it's committed so a spill file that fails to be written, or whose
+        writer dies halfway through, is written again in full the next time
+        a writer starts.
+        """
+        for path in sorted(glob.glob(os.path.join(self.spill_dir, "*.spill"))):
+            try:
+                f = _open_locked(path, "rb")
+            except FileNotFoundError:
+                # another writer has already written it
+                continue
+            except BlockingIOError:
+                # the spill file of a running process
+                continue
+
+            with f:
+                # another writer could have written and removed the file
+                # between opening and locking it
+                if os.fstat(f.fileno()).st_nlink == 0:
+                    continue
+
+                rows = [orjson.loads(line) for line in f if line.strip()]
+                try:
+                    async with self.engine.begin() as conn:
+                        for start in range(0, len(rows), self.batch_size):
+                            end = start + self.batch_size
+                            await _insert(conn, rows[start:end])
+                except (SQLAlchemyError, OSError):
+                    log.exception(f"Could not write the activity rows in {path}")
+                    continue
+                os.remove(path)
+                self.written += len(rows)
+
+    async def write(self, rows: List[Row]):
+        try:
+            async with self.engine.begin() as conn:
+                await _insert(conn, rows)
+        except (SQLAlchemyError, OSError):
+            log.exception(f"Could not write {len(rows)} activity rows")
+            self.spill(rows)
+        else:
+            self.written += len(rows)
+
+    def _close_spill_file(self):
+        if self._spill_file is None:
+            return
+        # Closing the file releases the lock so the rows are written by the
+        # next writer to start.
+        self._spill_file.close()
+        self._spill_file = None
+
+    async def _run(self, queue: asyncio.Queue):
+        while True:
+            rows = [await queue.get()]
+            while len(rows) < self.batch_size and not queue.empty():
+                rows.append(queue.get_nowait())
+
+            # Don't let stop() cancel the write halfway through since it
+            # can't tell whether the rows were committed.
+            self._writing = asyncio.ensure_future(self.write(rows))
+            await asyncio.shield(self._writing)
+            self._writing = None
+            for _ in rows:
+                queue.task_done()
+
+
+async def _insert(conn, rows: List[Row]):
+    await conn.execute(Activity.__table__.insert(), rows)
+    stmt = increment_counts(rows)
+    if stmt is not None:
+        await conn.execute(stmt)
+
+
+def _open_locked(path: str, mode: str = "ab") -> IO[bytes]:
+    """Open a spill file and lock it without blocking.
+
+    Raises BlockingIOError if another process holds the lock.
+    """
+    f = open(path, mode)
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        raise
+    return f
+
+
+# The writer used by the activity tracking if it has been started
+activity_writer: Optional[ActivityWriter] = None
+
+
+async def start_activity_writer(engine: AsyncEngine, spill_dir: str, **kwargs):
+    global activity_writer
+    activity_writer = ActivityWriter(engine, spill_dir, **kwargs)
+    await activity_writer.start()
+
+
+async def stop_activity_writer():
+    global activity_writer
+    if activity_writer is not None:
+        await activity_writer.stop()
+        activity_writer = None
@@ -8,13 +8,18 @@ from fastapi.middleware.cors import CORSMiddleware
 
 import sepal.requestvars as requestvars
 import sepal.db as db
+from .accessions.views import items_router as accession_items_router
 from .accessions.views import router as accessions_router
+from .activity.writer import start_activity_writer, stop_activity_writer
 from .activity.lib import init_session_tracking
+from .activity.stream import activity_broadcaster
 from .activity.views import router as activity_router
 from .invitations.views import router as invitations_router
 from .locations.views import router as locations_router
 from .organizations.views import router as orgs_router
 from .profile.views import router as profile_router
+from .search.views import router as search_router
+from .sync.views import router as sync_router
 from .taxa.views import router as taxa_router
 from .settings import settings
 
@@ -35,7 +40,7 @@ async def session_tracking(request: Request, call_next):
     change as well.
 
     """
-    unregister = init_session_tracking(db.Session)
+    unregister = init_session_tracking(db.Session().sync_session)
     response = await call_next(request)
     unregister()
     return response
@@ -44,10 +49,11 @@ async def session_tracking(request: Request, call_next):
 @app.middleware("http")
 async def init_scoped_session(request: Request, call_next):
     """Share the session across the scope of the request."""
-    db.Session()
-    response = await call_next(request)
-    db.Session.remove()
-    return response
+    db.init_session_scope()
+    try:
+        return await call_next(request)
+    finally:
+        await db.Session.remove()
 
 
 @app.middleware("http")
@@ -57,6 +63,23 @@ async def init_requestvars(request: Request, call_next):
     return await call_next(request)
 
 
+@app.on_event("startup")
+async def startup():
+    if settings.activity_async_writes:
+        await start_activity_writer(
+            db.async_engine,
+            settings.activity_spill_dir,
+            maxsize=settings.activity_queue_size,
+            batch_size=settings.activity_batch_size,
+        )
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_activity_writer()
+    await activity_broadcaster.stop()
+
+
 # TODO: consider creating a profile if a user logs in but doesn't have a
 # profile...the only thing that sucks if that every request when then have to
 # check for a profile
@@ -82,9 +105,12 @@ app.add_middleware(
 )
 
 app.include_router(accessions_router, prefix="/v1/orgs/{org_id}/accessions")
+app.include_router(accession_items_router, prefix="/v1/orgs/{org_id}/accession_items")
 app.include_router(activity_router, prefix="/v1/orgs/{org_id}/activity")
 app.include_router(locations_router, prefix="/v1/orgs/{org_id}/locations")
 app.include_router(orgs_router, prefix="/v1/orgs")
+app.include_router(search_router, prefix="/v1/orgs/{org_id}/search")
+app.include_router(sync_router, prefix="/v1/orgs/{org_id}/sync")
 app.include_router(taxa_router, prefix="/v1/orgs/{org_id}/taxa")
 app.include_router(profile_router, prefix="/v1/profile")
 app.include_router(invitations_router, prefix="/v1/invitations")
@@ -1,7 +1,30 @@
-from firebase_admin.auth import verify_id_token
+import asyncio
+import base64
+import hashlib
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+import orjson
 from fastapi import Depends, Header, HTTPException
+from google.auth import crypt
 
+from .cache import TTLCache
+from .log import log
 from .requestvars import request_global
+from .settings import settings
+
+# The x509 certificates of the keys Google uses to sign Firebase ID tokens
+CERTS_URL = (
+    "https://www.googleapis.com/robot/v1/metadata/x509/"
+    "securetoken@system.gserviceaccount.com"
+)
+ISSUER_PREFIX = "https://securetoken.google.com/"
+# Same as google.auth
+CLOCK_SKEW_SECS = 10
+
+CertsFetcher = Callable[[], Awaitable[Tuple[Dict[str, str], int]]]
 
 
 class AuthError(HTTPException):
@@ -12,6 +35,190 @@ class AuthError(HTTPException):
         )
 
 
+async def fetch_certs() -> Tuple[Dict[str, str], int]:
+    """Return Google's signing certificates and how many seconds to cache them."""
+    async with httpx.AsyncClient() as client:
+        resp = await client.get(CERTS_URL)
+    if resp.status_code != 200:
+        raise httpx.HTTPStatusError(
+            f"Unexpected status {resp.status_code} from {CERTS_URL}",
+            request=resp.request,
+            response=resp,
+        )
+
+    match = re.search(r"max-age=(\d+)", resp.headers.get("cache-control", ""))
+    max_age = int(match.group(1)) if match else 0
+    return resp.json(), max_age
+
+
+class SigningKeys:
+    """The public keys for verifying token signatures keyed by key id.
+
+    The keys are fetched again once the max-age of the last response has passed
+    or when a token is signed by an unknown key since Google rotates its keys.
+    Refreshes for unknown keys happen at most once every min_refresh_interval
+    seconds so that junk tokens can't be used to hammer the certs endpoint.
+
+    Only one refresh runs at a time. If the keys can't be fetched the cached
+    keys are used until they expire, after which verifying a token raises an
+    AuthError with a 503 status.
+    """
+
+    def __init__(
+        self,
+        fetch: CertsFetcher = fetch_certs,
+        min_refresh_interval: float = 60,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.fetch = fetch
+        self.min_refresh_interval = min_refresh_interval
+        self.timer = timer
+        self._verifiers: Dict[str, crypt.Verifier] = {}
+        self._expires = 0.0
+        self._refreshed: Optional[float] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def get(self, key_id: str) -> Optional[crypt.Verifier]:
+        if self._needs_refresh(key_id):
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                # the keys could have been refreshed while waiting for the lock
+                if self._needs_refresh(key_id):
+                    await self.refresh()
+
+        return self._verifiers.get(key_id)
+
+    async def refresh(self):
+        try:
+            certs, max_age = await self.fetch()
+            verifiers = {
+                key_id: crypt.RSAVerifier.from_string(cert)
+                for key_id, cert in certs.items()
+            }
+        except (httpx.HTTPError, ValueError):
+            # Count the failed attempt as a refresh so unknown keys don't
+            # retry it before min_refresh_interval has passed.
+            self._refreshed = self.timer()
+            if self._refreshed < self._expires:
+                log.exception(
+                    "Could not refresh the signing keys, using the cached keys"
+                )
+                return
+            log.exception("Could not fetch the signing keys")
+            raise AuthError(
+                code="signing_keys_unavailable",
+                description="Could not fetch the keys to verify the token",
+                status_code=503,
+            )
+
+        self._verifiers = verifiers
+        self._refreshed = self.timer()
+        self._expires = self._refreshed + max_age
+
+    def _needs_refresh(self, key_id: str) -> bool:
+        now = self.timer()
+        return now >= self._expires or (
+            key_id not in self._verifiers
+            and (
+                self._refreshed is None
+                or now - self._refreshed >= self.min_refresh_interval
+            )
+        )
+
+
+def _b64decode(segment: bytes) -> bytes:
+    return base64.urlsafe_b64decode(segment + b"=" * (-len(segment) % 4))
+
+
+class TokenVerifier:
+    """Verify Firebase ID tokens.
+
+    This makes the same checks as firebase_admin.auth.verify_id_token but the
+    signing keys are kept in memory and verified tokens are cached until they
+    expire, keyed by a hash of the token, so a token that has already been seen
+    costs a dict lookup instead of a signature verification.
+    """
+
+    def __init__(
+        self,
+        project_id: str,
+        keys: SigningKeys,
+        cache: TTLCache,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.project_id = project_id
+        self.keys = keys
+        self.cache = cache
+        self.clock = clock
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """Return the claims of a valid token or raise a ValueError."""
+        cache_key = hashlib.sha256(token.encode()).digest()
+        claims = self.cache.get(cache_key)
+        if claims is not None:
+            return claims
+
+        claims = await self._verify(token)
+        self.cache.set(cache_key, claims, ttl=claims["exp"] - self.clock())
+        return claims
+
+    async def _verify(self, token: str) -> Dict[str, Any]:
+        segments = token.encode().split(b".")
+        try:
+            header_segment, payload_segment, signature_segment = segments
+            header = orjson.loads(_b64decode(header_segment))
+            claims = orjson.loads(_b64decode(payload_segment))
+            signature = _b64decode(signature_segment)
+        except ValueError:
+            raise ValueError("Token is malformed")
+
+        if not isinstance(header, dict) or not isinstance(claims, dict):
+            raise ValueError("Token is malformed")
+
+        if header.get("alg") != "RS256":
+            raise ValueError('Token has incorrect algorithm, expected "RS256"')
+        if not header.get("kid"):
+            raise ValueError('Token has no "kid" header')
+
+        self._verify_claims(claims)
+
+        verifier = await self.keys.get(header["kid"])
+        if verifier is None:
+            raise ValueError("Token was signed by an unknown key")
+        if not verifier.verify(header_segment + b"." + payload_segment, signature):
+            raise ValueError("Token has an invalid signature")
+
+        claims["uid"] = claims["sub"]
+        return claims
+
+    def _verify_claims(self, claims: Dict[str, Any]):
+        now = self.clock()
+        if claims.get("aud") != self.project_id:
+            raise ValueError('Token has incorrect "aud" (audience) claim')
+        if claims.get("iss") != ISSUER_PREFIX + self.project_id:
+            raise ValueError('Token has incorrect "iss" (issuer) claim')
+
+        subject = claims.get("sub")
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise ValueError('Token has an invalid "sub" (subject) claim')
+
+        for key in ("iat", "exp"):
+            if not isinstance(claims.get(key), (int, float)):
+                raise ValueError(f'Token has no "{key}" claim')
+        if now < claims["iat"] - CLOCK_SKEW_SECS:
+            raise ValueError("Token used too early")
+        if now > claims["exp"] + CLOCK_SKEW_SECS:
+            raise ValueError("Token expired")
+
+
+token_verifier = TokenVerifier(
+    settings.firebase_project_id,
+    SigningKeys(),
+    TTLCache(maxsize=settings.token_cache_size),
+)
+
+
 def get_auth_header_token(auth: str = Header(None, alias="authorization")):
     """Return the access token from the authorization header."""
     if not auth:
@@ -38,8 +245,11 @@ def get_auth_header_token(auth: str = Header(None, alias="authorization")):
     return token
 
 
-def decode_token(token: str = Depends(get_auth_header_token)):
-    return verify_id_token(token)
+async def decode_token(token: str = Depends(get_auth_header_token)):
+    try:
+        return await token_verifier.verify(token)
+    except ValueError as exc:
+        raise AuthError(code="invalid_token", description=str(exc))
 
 
 def get_current_user(payload=Depends(decode_token)) -> str:
@@ -0,0 +1,80 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+_missing = object()
+
+
+class TTLCache:
+    """An in-process LRU cache whose entries expire after a time to live.
+
+    The cache holds at most maxsize entries and evicts the least recently used
+    entry when it's full. Pass ttl=None to keep entries until they're evicted.
+
+    Every call to invalidate() or clear() increments the cache's generation.
+    Callers that load a value asynchronously should read the generation before
+    loading and pass it to set() so that a value loaded before an invalidation
+    isn't written back to the cache after it.
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: Optional[float] = None,
+        timer: Callable[[], float] = time.monotonic,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def __len__(self):
+        """Return the number of entries, including expired entries not yet evicted."""
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.get(key, _missing)
+        if item is not _missing:
+            value, expires = item
+            if expires is None or expires > self.timer():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._data[key]
+
+        self.misses += 1
+        return default
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        generation: Optional[int] = None,
+    ):
+        """Add a value to the cache.
+
+        The ttl overrides the default time to live of the cache for this entry.
+        If generation is passed and the cache has been invalidated since then
+        the value is not added.
+        """
+        if generation is not None and generation != self.generation:
+            return
+
+        ttl = ttl if ttl is not None else self.ttl
+        expires = self.timer() + ttl if ttl is not None else None
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self.generation += 1
+        self._data.pop(key, None)
+
+    def clear(self):
+        self.generation += 1
+        self._data.clear()
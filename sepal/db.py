@@ -1,18 +1,35 @@
+import contextlib
+import contextvars
 import re
+from typing import Optional
 
 import orjson
 from sqlalchemy import Column, DateTime, ForeignKey, Integer, create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncSession,
+    async_scoped_session,
+    create_async_engine,
+)
 from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base, declared_attr
-from sqlalchemy.orm import Query, declarative_mixin, scoped_session, sessionmaker
+from sqlalchemy.orm import Query, declarative_mixin, sessionmaker
 from sqlalchemy.sql import expression
 
 from sepal.settings import settings
 
-engine = create_engine(
-    settings.database_url,
-    json_serializer=lambda obj: orjson.dumps(obj).decode("utf8"),
-    json_deserializer=lambda obj: orjson.loads(obj),
+engine_options = {
+    "json_serializer": lambda obj: orjson.dumps(obj).decode("utf8"),
+    "json_deserializer": lambda obj: orjson.loads(obj),
+}
+
+engine = create_engine(settings.database_url, **engine_options)
+
+# The async engine connects to the same database as the sync engine but through
+# asyncpg so that queries don't block the event loop.
+async_engine = create_async_engine(
+    make_url(settings.database_url).set(drivername="postgresql+asyncpg"),
+    **engine_options,
 )
 
 session_factory = sessionmaker(
@@ -24,7 +41,51 @@ session_factory = sessionmaker(
     future=True,
 )
 
-Session = scoped_session(session_factory)
+async_session_factory = sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    # Accessing an expired attribute would need to emit an implicit query which
+    # isn't possible outside of an await.
+    expire_on_commit=False,
+)
+
+# All the requests on a worker run in the same thread so Session is scoped to
+# the request context instead. Each request starts a new scope in the
+# init_scoped_session middleware so concurrent requests never share a session
+# or its identity map. There's no default scope that everything else would
+# share so using Session outside of a scope raises an error.
+_session_scope: "contextvars.ContextVar[Optional[object]]" = contextvars.ContextVar(
+    "session_scope", default=None
+)
+
+
+def init_session_scope():
+    _session_scope.set(object())
+
+
+def _get_session_scope() -> object:
+    scope = _session_scope.get()
+    if scope is None:
+        raise RuntimeError("Session used outside of a session scope")
+    return scope
+
+
+@contextlib.contextmanager
+def session_scope():
+    """Scope Session to a block of code that isn't run by a request.
+
+    The sessions must be closed in the block, e.g. with ``async with
+    Session() as session``, since they are only removed from the scope on exit.
+    """
+    token = _session_scope.set(object())
+    try:
+        yield
+    finally:
+        Session.registry.clear()
+        _session_scope.reset(token)
+
+
+Session = async_scoped_session(async_session_factory, scopefunc=_get_session_scope)
 
 
 class BaseMetaclass(DeclarativeMeta):
@@ -64,6 +125,9 @@ class TimestampMixin:
     """A mixin that adds ``created_at`` and ``updated_at`` timestamps columns."""
 
     __table_args__ = {"extend_existing": True}
+    # Fetch the timestamps when the row is written, e.g. for the activity of a
+    # new object, instead of when they're first read.
+    __mapper_args__ = {"eager_defaults": True}
 
     created_at = Column(DateTime, server_default=utcnow(), nullable=False)
     updated_at = Column(
@@ -1,4 +1,6 @@
-from sepal.db import Session
+from sqlalchemy import select
+
+import sepal.db as db
 from sepal.organizations.lib import assign_role
 from sepal.organizations.models import RoleType
 
@@ -6,8 +8,9 @@ from .models import Invitation
 
 
 async def accept_invitation(token: str, user_id: str):
-    with Session() as session:
-        invitation = session.query(Invitation).filter_by(token=token).first()
+    async with db.Session() as session:
+        q = select(Invitation).filter_by(token=token)
+        invitation = (await session.execute(q)).scalars().first()
         # TODO: make sure the invitation hasn't expired
         # TODO: make sure the invitation hasn't already been accepted
         await assign_role(invitation.organization_id, user_id, RoleType.Guest)
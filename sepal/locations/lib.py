@@ -1,11 +1,12 @@
-from base64 import b64decode
 from enum import Enum
-from typing import List, Optional
+from typing import Any, List, Optional, Tuple
 
 from sqlalchemy import select
 from sqlalchemy.orm import joinedload
 
 import sepal.db as db
+from sepal.pagination import Page, paginate
+from sepal.search.trigram import match, rank
 from .models import Location
 from .schema import LocationCreate, LocationSchema, LocationUpdate
 
@@ -19,10 +20,10 @@ class LocationsPermission(str, Enum):
 
 async def get_location_by_id(
     location_id: int,
-    org_id: Optional[str] = None,
+    org_id: Optional[int] = None,
     include: Optional[List[str]] = None,
 ) -> Location:
-    with db.Session() as session:
+    async with db.Session() as session:
         q = select(Location).where(
             Location.org_id == org_id, Location.id == location_id
         )
@@ -30,53 +31,57 @@ async def get_location_by_id(
             for field in include:
                 q = q.options(joinedload(getattr(Location, field)))
 
-        return session.execute(q).scalars().first()
+        return (await session.execute(q)).scalars().first()
 
 
 async def get_locations(
-    org_id: str,
+    org_id: int,
     query: Optional[str] = None,
     limit: int = 50,
     cursor: Optional[str] = None,
     include: Optional[List[str]] = None,
-) -> List[Location]:
-    with db.Session() as session:
-        q = select(Location).where(Location.org_id == org_id).order_by(Location.code)
-
+) -> Page:
+    """Return a page of the locations of an organization ordered by code.
+
+    The locations are searched by code if query is given and ordered by how
+    closely they match instead. Raises a ValueError if the cursor is invalid.
+    """
+    async with db.Session() as session:
+        q = select(Location).where(Location.org_id == org_id)
+
+        # codes aren't unique so the id breaks the ties
+        sort: Tuple[Any, ...] = (Location.code, Location.id)
+        descending = False
         if query is not None:
-            q = q.where(Location.code.ilike(f"%{query}%"))
-
-        if cursor is not None:
-            decoded_cursor = b64decode(cursor).decode()
-            q = q.where(Location.code > decoded_cursor)
+            # the closest matches come first
+            q = q.where(match(Location.code, query))
+            sort, descending = (rank(Location.code, query), Location.id), True
 
         if include is not None:
             for field in include:
                 q = q.options(joinedload(getattr(Location, field)))
 
-        q = q.limit(limit)
-
-        return session.execute(q).scalars().all()
+        return await paginate(session, q, sort, cursor, limit, descending=descending)
 
 
-async def create_location(org_id: str, values: LocationCreate) -> LocationSchema:
-    with db.Session() as session:
+async def create_location(org_id: int, values: LocationCreate) -> LocationSchema:
+    async with db.Session() as session:
         location = Location(org_id=org_id, **values.dict())
         session.add(location)
-        session.commit()
-        session.refresh(location)
+        await session.commit()
+        await session.refresh(location)
         return location
 
 
-async def update_location(location_id: str, values: LocationUpdate) -> LocationSchema:
-    with db.Session() as session:
-        location = session.get(Location, location_id)
+async def update_location(location_id: int, values: LocationUpdate) -> LocationSchema:
+    async with db.Session() as session:
+        location = await session.get(Location, location_id)
 
         # use setattr on the instance instead of using the faster query.update()
         # so that the before_flush event gets fired
         for key, value in values.dict().items():
             setattr(location, key, value)
 
-        session.commit()
-        session.refresh()
+        await session.commit()
+        await session.refresh(location)
         return location
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy import Column, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import backref, relationship
 
 from sepal.db import Model
+from sepal.search.trigram import trigram_index
 
 
 class Location(Model):
@@ -16,3 +17,10 @@ class Location(Model):
     organization = relationship(
         "Organization", backref=backref("locations", cascade="all, delete-orphan")
     )
+
+
+# The index for listing the locations of an organization by code
+Index("ix_location_org_id_code_id", Location.org_id, Location.code, Location.id)
+
+# The index for searching the locations by code
+trigram_index("ix_location_org_id_code_trgm", Location.org_id, Location.code)
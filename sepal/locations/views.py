@@ -1,11 +1,16 @@
+from datetime import datetime
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 
+from sepal.activity.lib import ActivityPermission
+from sepal.activity.schema import ActivityHistorySchema
+from sepal.activity.views import detail_as_of as activity_detail_as_of, list_history
 from sepal.auth import get_current_user
 from sepal.organizations.lib import verify_org_id
 from sepal.permissions import check_permission
-from sepal.utils import create_schema, make_cursor_link
+from sepal.pagination import PageParams, set_link_header
+from sepal.utils import create_schema
 
 from .lib import LocationsPermission, create_location, get_location_by_id, get_locations
 from .models import Location
@@ -21,24 +26,29 @@ async def list(
     current_user_id=Depends(get_current_user),
     org_id=Depends(verify_org_id),
     q: Optional[str] = None,
-    cursor: Optional[str] = None,
-    limit: int = 50,
+    page_params: PageParams = Depends(),
     # TODO: what relations can we include here
     include: Optional[List[str]] = Query(None),
 ) -> List[LocationSchema]:
     if org_id is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
-    locations = await get_locations(
-        org_id, q, limit=limit, cursor=cursor, include=include
-    )
-    if len(locations) == limit:
-        next_url = make_cursor_link(str(request.url), locations[-1].code, limit)
-        response.headers["Link"] = f"<{next_url}>; rel=next"
+    try:
+        page = await get_locations(
+            org_id,
+            q,
+            limit=page_params.limit,
+            cursor=page_params.cursor,
+            include=include,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+    set_link_header(request, response, page, page_params.limit)
 
     # build the schema based on the request parameters
     Schema = create_schema(LocationSchema, Location, include=include)
-    return [Schema.from_orm(location) for location in locations]
+    return [Schema.from_orm(location) for location in page.items]
 
 
 @router.post(
@@ -77,3 +87,47 @@ async def detail(
 
     Schema = create_schema(LocationSchema, Location, include=include)
     return Schema.from_orm(location)
+
+
+@router.get(
+    "/{location_id}/history",
+    dependencies=[
+        Depends(check_permission(LocationsPermission.Read)),
+        Depends(check_permission(ActivityPermission.Read)),
+    ],
+)
+async def history(
+    request: Request,
+    response: Response,
+    location_id: int,
+    current_user_id=Depends(get_current_user),
+    org_id=Depends(verify_org_id),
+    page_params: PageParams = Depends(),
+) -> List[ActivityHistorySchema]:
+    if org_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    return await list_history(
+        request, response, org_id, Location.__tablename__, location_id, page_params
+    )
+
+
+@router.get(
+    "/{location_id}/history/{as_of}",
+    dependencies=[
+        Depends(check_permission(LocationsPermission.Read)),
+        Depends(check_permission(ActivityPermission.Read)),
+    ],
+)
+async def detail_as_of(
+    location_id: int,
+    as_of: datetime,
+    current_user_id=Depends(get_current_user),
+    org_id=Depends(verify_org_id),
+) -> LocationSchema:
+    if org_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    return await activity_detail_as_of(
+        org_id, Location.__tablename__, location_id, as_of, LocationSchema
+    )
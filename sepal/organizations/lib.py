@@ -1,6 +1,6 @@
 import secrets
 from enum import Enum
-from typing import List, Optional, Tuple
+from typing import List, NamedTuple, Optional, Tuple
 
 import httpx
 from fastapi import Depends, Path
@@ -8,6 +8,7 @@ from sqlalchemy import delete, select
 
 import sepal.db as db
 from sepal.auth import get_current_user
+from sepal.cache import TTLCache
 from sepal.profile.lib import get_profile
 from sepal.profile.models import Profile
 from sepal.invitations.models import Invitation
@@ -19,6 +20,12 @@ from .models import Organization, OrganizationUser, RoleType
 from .schema import OrganizationCreate, OrganizationUpdate
 
 
+# The role of a user in an organization keyed by (org_id, user_id). A None role
+# means the user isn't a member.
+role_cache = TTLCache(maxsize=settings.role_cache_size, ttl=settings.role_cache_ttl)
+_missing = object()
+
+
 class OrganizationsPermission(str, Enum):
     Create = "organizations:create"
     Delete = "organizations:delete"
@@ -28,27 +35,44 @@ class OrganizationsPermission(str, Enum):
     Update = "organizations:update"
 
 
-async def verify_org_id(
+class OrgContext(NamedTuple):
+    """The current user's membership in the organization of a request."""
+
+    org_id: int
+    user_id: str
+    # None if the user isn't a member of the organization
+    role: Optional[RoleType]
+
+
+async def get_org_context(
     current_user_id=Depends(get_current_user),
-    org_id: str = Path(...),
-) -> Optional[str]:
-    """Return True/False if the current user is a member of an organization."""
-    if await is_member(org_id, current_user_id):
-        if current_user_id == request_global().current_user_id:
-            request_global().current_org_id = org_id
-        return org_id
-    return None
+    org_id: int = Path(...),
+) -> OrgContext:
+    """Return the current user's membership in the organization.
 
+    FastAPI caches dependencies for the duration of a request so the
+    membership is only queried once even though verify_org_id,
+    check_permission and the views all depend on it.
+    """
+    role = await get_user_role(org_id, current_user_id)
+    return OrgContext(org_id=org_id, user_id=current_user_id, role=role)
 
-async def is_member(org_id: str, user_id: str, role: Optional[RoleType] = None) -> bool:
-    with db.Session() as session:
-        q = select(OrganizationUser).filter_by(organization_id=org_id, user_id=user_id)
-        if role:
-            q = q.where(role=role)
 
-        q = select(q.exists())
+async def verify_org_id(ctx: OrgContext = Depends(get_org_context)) -> Optional[int]:
+    """Return the org_id if the current user is a member of the organization."""
+    if ctx.role is None:
+        return None
 
-        return session.execute(q).scalar()
+    if ctx.user_id == request_global().current_user_id:
+        request_global().current_org_id = ctx.org_id
+    return ctx.org_id
+
+
+async def is_member(org_id: int, user_id: str, role: Optional[RoleType] = None) -> bool:
+    user_role = await get_user_role(org_id, user_id)
+    if role is not None:
+        return user_role == role
+    return user_role is not None
 
 
 async def get_organization_by_id(
@@ -59,94 +83,106 @@ async def get_organization_by_id(
     If a user_id is provided it will only return the organization if the user
     is a member of the organization.
     """
-    with db.Session() as session:
+    async with db.Session() as session:
         q = select(Organization).filter_by(id=org_id)
         if user_id is not None:
             q = q.join(OrganizationUser).where(OrganizationUser.user_id == user_id)
 
-        return session.execute(q).scalars().first()
+        return (await session.execute(q)).scalars().first()
 
 
 async def get_user_organizations(user_id: str) -> List[Organization]:
     """Get all of the organizations for a user."""
-    with db.Session() as session:
+    async with db.Session() as session:
         q = (
             select(Organization)
             .join(OrganizationUser)
             .where(OrganizationUser.user_id == user_id)
         )
-        return session.execute(q).scalars().all()
+        return (await session.execute(q)).scalars().all()
 
 
 async def get_user_role(org_id: int, user_id: str) -> Optional[RoleType]:
-    with db.Session() as session:
+    key = (org_id, user_id)
+    role = role_cache.get(key, _missing)
+    if role is not _missing:
+        return role
+
+    generation = role_cache.generation
+    async with db.Session() as session:
         q = select(OrganizationUser.role).filter_by(
             organization_id=org_id, user_id=user_id
         )
-        role = session.execute(q).scalar()
-        return role if role else None
+        role = (await session.execute(q)).scalar()
+        role = role if role else None
+
+    role_cache.set(key, role, generation=generation)
+    return role
 
 
 async def assign_role(org_id: int, user_id: str, role: RoleType):
     """Assign a user to a role in an organization."""
-    with db.Session() as session:
-        q = (
+    async with db.Session() as session:
+        q = select(
             select(OrganizationUser)
             .filter_by(organization_id=org_id, user_id=user_id, role=role)
             .exists()
         )
-        if session.query(q).scalar():
+        if (await session.execute(q)).scalar():
             return
 
         org_user = OrganizationUser(organization_id=org_id, user_id=user_id, role=role)
         session.add(org_user)
-        session.commit()
+        await session.commit()
+        role_cache.invalidate((org_id, user_id))
 
 
 async def remove_role(org_id: int, user_id: str, role: RoleType):
     """Remove a user from a role in an organization."""
-    with db.Session() as session:
+    async with db.Session() as session:
         q = delete(OrganizationUser).filter_by(organization_id=org_id, user_id=user_id)
-        session.execute(q)
-        session.commit()
+        await session.execute(q)
+        await session.commit()
+        role_cache.invalidate((org_id, user_id))
 
 
 async def create_organization(user_id: str, data: OrganizationCreate) -> Organization:
-    with db.Session() as session:
+    async with db.Session() as session:
         org = Organization(**data.dict())
         org_user = OrganizationUser(
             organization=org, user_id=user_id, role=RoleType.Owner
         )
         session.add_all([org, org_user])
-        session.commit()
-        session.refresh(org)
+        await session.commit()
+        role_cache.invalidate((org.id, user_id))
+        await session.refresh(org)
         return org
 
 
 async def update_organization(
-    org_id: str, data: OrganizationUpdate
+    org_id: int, data: OrganizationUpdate
 ) -> Optional[Organization]:
-    with db.Session() as session:
+    async with db.Session() as session:
         q = select(Organization).filter_by(id=org_id)
-        org = session.execute(q).scalar().first()
+        org = (await session.execute(q)).scalars().first()
         if not org:
             return None
 
         for key, value in data.dict().items():
             setattr(org, key, value)
 
-        session.commit()
-        session.refresh(org)
+        await session.commit()
+        await session.refresh(org)
         return org
 
 
 async def get_users(org_id: int) -> List[Tuple[Profile, RoleType]]:
-    with db.Session() as session:
+    async with db.Session() as session:
         q = select(Profile, OrganizationUser.role).where(
             OrganizationUser.user_id == Profile.user_id,
             OrganizationUser.organization_id == org_id,
         )
-        return session.execute(q).all()
+        return (await session.execute(q)).all()
 
 
 async def invite_user(org_id: int, invited_by_user_id: str, email: str):
@@ -161,9 +197,9 @@ async def invite_user(org_id: int, invited_by_user_id: str, email: str):
         token=token,
     )
 
-    with db.Session() as session:
+    async with db.Session() as session:
         session.add(invitation)
-        session.commit()
+        await session.commit()
 
     profile = await get_profile(invited_by_user_id)
     org = await get_organization_by_id(org_id)
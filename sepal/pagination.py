@@ -0,0 +1,208 @@
+"""Keyset pagination for the list endpoints.
+
+A page is read by seeking to the sort key of the last row of the previous
+page instead of skipping rows with OFFSET so every page costs the same no
+matter how deep it is, as long as there is an index that matches the filter
+and the sort columns. The sort columns must end with a unique column, e.g.
+the id, so that rows with the same sort key aren't skipped or repeated.
+
+The cursors are opaque to the clients. They hold the direction and the sort
+key of a row and are signed with settings.secret_key so that clients can't
+craft their own sort keys.
+"""
+import hashlib
+import hmac
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import date, datetime
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import orjson
+from fastapi import Query, Request, Response
+from sqlalchemy import and_, tuple_
+
+from sepal.settings import settings
+
+NEXT = "n"
+PREV = "p"
+
+# Bump the version if the format of the cursor changes so that cursors handed
+# out by an older version are rejected instead of being misread.
+CURSOR_VERSION = 2
+
+
+class PageParams:
+    """The query parameters of a list endpoint.
+
+    Usage: ::
+
+        async def list(page: PageParams = Depends()):
+    """
+
+    def __init__(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = Query(50, gt=0, le=settings.max_page_size),
+    ):
+        self.cursor = cursor
+        self.limit = limit
+
+
+class Page(NamedTuple):
+    items: List[Any]
+    # the cursors of the next and previous pages if there are any
+    next_cursor: Optional[str]
+    prev_cursor: Optional[str]
+
+
+def _b64encode(data: bytes) -> str:
+    return urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: bytes) -> bytes:
+    key = settings.secret_key.encode()
+    return hmac.new(key, payload, hashlib.sha256).digest()[:16]
+
+
+def encode_signed(payload: bytes) -> str:
+    """Return payload and its signature as an url safe string."""
+    return f"{_b64encode(payload)}.{_b64encode(_sign(payload))}"
+
+
+def decode_signed(value: str) -> bytes:
+    """Return the payload of a string returned by encode_signed.
+
+    Raises a ValueError if the string is malformed or its signature is invalid.
+    """
+    payload, signature = (_b64decode(part) for part in value.split("."))
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise ValueError("Invalid signature")
+    return payload
+
+
+def encode_cursor(key: Sequence[Any], direction: str = NEXT) -> str:
+    """Return the cursor to the rows after key in direction."""
+    return encode_signed(orjson.dumps([CURSOR_VERSION, direction, *key]))
+
+
+def decode_cursor(cursor: str, sort: Sequence[Any]) -> Tuple[str, Tuple[Any, ...]]:
+    """Return the direction and the sort key in a cursor.
+
+    Raises a ValueError if the cursor is invalid or its key doesn't match the
+    sort columns.
+    """
+    try:
+        version, direction, *values = orjson.loads(decode_signed(cursor))
+        if version != CURSOR_VERSION or direction not in (NEXT, PREV):
+            raise ValueError
+        if len(values) != len(sort):
+            raise ValueError
+        key = tuple(_load_value(column, value) for column, value in zip(sort, values))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    return direction, key
+
+
+def _load_value(column, value):
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    elif python_type is date:
+        return date.fromisoformat(value)
+    elif not isinstance(value, python_type):
+        raise ValueError
+    return value
+
+
+def get_key(row, sort: Sequence[Any]) -> Tuple[Any, ...]:
+    """Return the sort key of a row."""
+    return tuple(getattr(row, column.key) for column in sort)
+
+
+def where_after(q, sort: Sequence[Any], key: Sequence[Any], descending: bool = False):
+    """Filter a query to the rows that come after key in the sort order."""
+    if len(sort) == 1:
+        return q.where(sort[0] < key[0] if descending else sort[0] > key[0])
+
+    # The first column is also compared on its own so that Postgres can use
+    # it to prune partitions, which it can't do with the row comparison.
+    if descending:
+        return q.where(and_(sort[0] <= key[0], tuple_(*sort) < tuple(key)))
+    return q.where(and_(sort[0] >= key[0], tuple_(*sort) > tuple(key)))
+
+
+async def paginate(
+    session,
+    q,
+    sort: Sequence[Any],
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    descending: bool = False,
+) -> Page:
+    """Return the page of a select() at cursor.
+
+    The query must select a single entity. The rows are ordered by the sort
+    columns, all ascending or all descending. Raises a ValueError if the
+    cursor is invalid.
+    """
+    direction, key = (NEXT, None) if cursor is None else decode_cursor(cursor, sort)
+    # the previous page is read backwards from the first row of this page
+    backwards = direction == PREV
+    reverse = descending != backwards
+    if key is not None:
+        q = where_after(q, sort, key, descending=reverse)
+    q = q.order_by(*[column.desc() if reverse else column for column in sort])
+
+    # The sort columns are read with the rows so the sort key can also be an
+    # expression, e.g. the rank of a search result.
+    q = q.add_columns(*sort).limit(limit + 1)
+    rows = (await session.execute(q)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+    if not rows:
+        return Page([], None, None)
+
+    # There's always a page on the side of the cursor that the page was read
+    # from. On the other side there's another page if an extra row was read.
+    first, last = tuple(rows[0][1:]), tuple(rows[-1][1:])
+    has_next = has_more if not backwards else True
+    has_prev = has_more if backwards else key is not None
+    return Page(
+        [row[0] for row in rows],
+        encode_cursor(last, NEXT) if has_next else None,
+        encode_cursor(first, PREV) if has_prev else None,
+    )
+
+
+def make_page_url(request_url: str, cursor: str, limit: int) -> str:
+    """Return the url of the page at cursor.
+
+    The other query parameters of the request, e.g. the filters, are kept.
+    """
+    url = urlsplit(str(request_url))
+    params = [
+        (key, value)
+        for key, value in parse_qsl(url.query, keep_blank_values=True)
+        if key not in ("limit", "cursor")
+    ]
+    params += [("limit", str(limit)), ("cursor", cursor)]
+    return urlunsplit(url._replace(query=urlencode(params)))
+
+
+def set_link_header(request: Request, response: Response, page: Page, limit: int):
+    """Set the Link header to the next and previous pages."""
+    links = []
+    if page.next_cursor is not None:
+        next_url = make_page_url(str(request.url), page.next_cursor, limit)
+        links.append(f"<{next_url}>; rel=next")
+    if page.prev_cursor is not None:
+        prev_url = make_page_url(str(request.url), page.prev_cursor, limit)
+        links.append(f"<{prev_url}>; rel=prev")
+    if links:
+        response.headers["Link"] = ", ".join(links)
@@ -1,17 +1,17 @@
 from enum import Enum
 from itertools import chain
-from typing import Dict, List, Union
+from typing import Dict, FrozenSet, List, Optional, Union
 
 from fastapi import Depends, HTTPException
 
 from sepal.accessions.lib import AccessionsPermission
 from sepal.activity.lib import ActivityPermission
-from sepal.auth import get_current_user
 from sepal.locations.lib import LocationsPermission
 from sepal.organizations.lib import (
     OrganizationsPermission,
+    OrgContext,
+    get_org_context,
     get_user_role,
-    verify_org_id,
 )
 from sepal.organizations.models import RoleType
 from sepal.taxa.lib import TaxaPermission
@@ -78,9 +78,23 @@ RolePermissions[RoleType.Owner] = RolePermissions[RoleType.Admin] + [
 ]
 
 
+def get_role_permissions(role: Optional[RoleType]) -> FrozenSet[PermissionType]:
+    """Return the permissions granted by a role."""
+    if role is None:
+        return frozenset()
+    return frozenset(RolePermissions.get(role, []))
+
+
+async def get_org_permissions(
+    ctx: OrgContext = Depends(get_org_context),
+) -> FrozenSet[PermissionType]:
+    """Return the current user's permissions in the organization of the request."""
+    return get_role_permissions(ctx.role)
+
+
 def check_permission(permission: PermissionType):
-    async def _inner(user_id=Depends(get_current_user), org_id=Depends(verify_org_id)):
-        if not await has_permission(org_id, user_id, permission):
+    async def _inner(permissions=Depends(get_org_permissions)):
+        if permission not in permissions:
             raise HTTPException(status_code=403, detail="Insufficient permissions")
 
     return _inner
@@ -89,6 +103,4 @@ def check_permission(permission: PermissionType):
 async def has_permission(org_id: int, user_id: str, permission: PermissionType):
     """Return True if the user has a permission in an organization."""
     role = await get_user_role(org_id, user_id)
-    if role is None:
-        return False
-    return permission in RolePermissions.get(role, [])
+    return permission in get_role_permissions(role)
@@ -0,0 +1,68 @@
+from typing import Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import String, literal, select, union_all
+
+import sepal.db as db
+from sepal.accessions.models import Accession, AccessionItem
+from sepal.locations.models import Location
+from sepal.taxa.models import Taxon
+
+from .trigram import match, rank
+
+# The searched column of each type of record keyed by table. Each of the
+# columns has a trigram index.
+SEARCH_COLUMNS = {
+    "taxon": Taxon.name,
+    "location": Location.code,
+    "accession": Accession.code,
+    "accession_item": AccessionItem.code,
+}
+
+
+class SearchHit(NamedTuple):
+    type: str
+    id: int
+    label: str
+    rank: float
+
+
+async def search(
+    org_id: int,
+    query: str,
+    limit: int = 20,
+    types: Optional[Iterable[str]] = None,
+) -> List[SearchHit]:
+    """Return the records of an organization that best match query.
+
+    The records of every type, or only of types, are searched in a single
+    statement. Each type is searched and ranked with its trigram index and
+    only its best limit matches are merged with the matches of the other
+    types.
+    """
+    branches = []
+    for type_, column in SEARCH_COLUMNS.items():
+        if types is not None and type_ not in types:
+            continue
+
+        model = column.class_
+        search_rank = rank(column, query)
+        branches.append(
+            select(
+                literal(type_, String).label("type"),
+                model.id.label("id"),
+                column.label("label"),
+                search_rank,
+            )
+            .where(model.org_id == org_id, match(column, query))
+            .order_by(search_rank.desc(), model.id)
+            .limit(limit)
+        )
+
+    hits = union_all(*branches).subquery()
+    q = (
+        select(hits)
+        .order_by(hits.c.search_rank.desc(), hits.c.type, hits.c.id)
+        .limit(limit)
+    )
+    async with db.Session() as session:
+        return [SearchHit(*row) for row in await session.execute(q)]
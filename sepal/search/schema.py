@@ -0,0 +1,15 @@
+from typing import Literal
+
+from pydantic import BaseModel
+
+
+class SearchHitSchema(BaseModel):
+    type: Literal["taxon", "location", "accession", "accession_item"]
+    id: str
+    # the name of a taxon or the code of the other records
+    label: str
+    # the similarity of the label to the query, from 0 to 1
+    rank: float
+
+    class Config:
+        orm_mode = True
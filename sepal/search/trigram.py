@@ -0,0 +1,43 @@
+"""Substring search on the text columns of the list endpoints.
+
+The searched columns have GIN indexes with the trigram operator class of the
+pg_trgm extension so that an ILIKE '%query%' match reads the index instead of
+every row of the organization. The indexes start with the org_id, using the
+GIN operator class for integers of the btree_gin extension, so that a search
+only reads the matches in the organization instead of the matches in every
+organization. The matches are ranked by their trigram similarity to the query
+so that the closest matches come first.
+"""
+from sqlalchemy import DDL, Float, Index, event, func
+
+import sepal.db as db
+
+# pg_trgm and btree_gin are contrib modules that ship with PostgreSQL. The
+# migrations create them for existing databases.
+for extension in ("pg_trgm", "btree_gin"):
+    event.listen(
+        db.metadata,
+        "before_create",
+        DDL(f"CREATE EXTENSION IF NOT EXISTS {extension}"),
+    )
+
+
+def trigram_index(name: str, org_id, column) -> Index:
+    """Return a trigram index for searching column within an organization."""
+    return Index(
+        name,
+        org_id,
+        column,
+        postgresql_using="gin",
+        postgresql_ops={column.key: "gin_trgm_ops"},
+    )
+
+
+def match(column, query: str):
+    """Return the filter for the rows where column contains query."""
+    return column.ilike(f"%{query}%")
+
+
+def rank(column, query: str):
+    """Return the similarity of column to query, from 0 to 1."""
+    return func.similarity(column, query, type_=Float).label("search_rank")
@@ -0,0 +1,40 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from sepal.accessions.lib import AccessionsPermission
+from sepal.locations.lib import LocationsPermission
+from sepal.organizations.lib import verify_org_id
+from sepal.permissions import check_permission
+from sepal.settings import settings
+from sepal.taxa.lib import TaxaPermission
+
+from .lib import search as search_records
+from .schema import SearchHitSchema
+
+router = APIRouter()
+
+
+@router.get(
+    "",
+    dependencies=[
+        Depends(check_permission(TaxaPermission.Read)),
+        Depends(check_permission(LocationsPermission.Read)),
+        Depends(check_permission(AccessionsPermission.Read)),
+    ],
+)
+async def search(
+    org_id=Depends(verify_org_id),
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, gt=0, le=settings.max_page_size),
+    type: Optional[List[str]] = Query(
+        None, regex="^(taxon|location|accession|accession_item)$"
+    ),
+) -> List[SearchHitSchema]:
+    """Return the taxa, locations, accessions and items that best match q.
+
+    The hits of every type are ranked together, best match first. Pass type
+    to only search some of the types.
+    """
+    hits = await search_records(org_id, q, limit=limit, types=type)
+    return [SearchHitSchema.from_orm(hit) for hit in hits]
@@ -5,12 +5,60 @@ from pydantic import BaseSettings, PostgresDsn
 class Settings(BaseSettings):
     app_base_url: str
     database_url: PostgresDsn
+    # Used to sign the pagination cursors
+    secret_key: str
+    # The maximum number of rows in a page of a list endpoint
+    max_page_size: int = 100
 
     firebase_project_id: str
     google_application_credentials_json: Optional[str] = None
+    # The maximum number of verified ID tokens to keep in memory
+    token_cache_size: int = 10000
 
     mailgun_api_key: str
     mailgun_api_url: str
 
+    # Roles are cached in each process so a role change made in another
+    # process can take up to role_cache_ttl seconds to be seen.
+    role_cache_size: int = 10000
+    role_cache_ttl: int = 60
+
+    # Write the activity in the background after the request's transaction
+    # commits instead of in the transaction. Activity that doesn't fit in the
+    # queue or can't be written is appended to a spill file for each process
+    # in activity_spill_dir and written the next time a worker starts. The
+    # workers of every app that uses the directory write each others' spill
+    # files so the directory should be local to the app.
+    activity_async_writes: bool = False
+    activity_queue_size: int = 10000
+    activity_batch_size: int = 500
+    activity_spill_dir: str = "activity-spill"
+
+    # The activity table is partitioned by month. See sepal.activity.partitions
+    # for the command that creates the partitions activity_partitions_ahead
+    # months ahead and archives the partitions older than
+    # activity_retention_months to activity_archive_path. Activity is kept
+    # forever if activity_retention_months isn't set.
+    activity_partitions_ahead: int = 3
+    activity_retention_months: Optional[int] = None
+    activity_archive_path: str = "activity-archive"
+    # Records are rebuilt as of a point in time by replaying their activity. A
+    # snapshot is saved every activity_snapshot_interval activities so that at
+    # most that many activities are replayed.
+    activity_snapshot_interval: int = 50
+    # Each client of the live activity stream buffers up to
+    # activity_stream_queue_size activities before it's disconnected and has
+    # to resume. A comment is sent every activity_stream_heartbeat seconds to
+    # keep idle connections open. Clients that resume from further back than
+    # activity_stream_backlog activities are told to reload the feed instead.
+    activity_stream_queue_size: int = 100
+    activity_stream_heartbeat: float = 15
+    activity_stream_backlog: int = 500
+    # The sync endpoint only returns activity that is at least sync_delay
+    # seconds old so that transactions that were still open when a client
+    # synced can't add activity behind the client's sync token. Only activity
+    # that is that old is included in the activity snapshots.
+    sync_delay: float = 10
+
 
 settings = Settings()
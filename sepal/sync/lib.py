@@ -0,0 +1,185 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import orjson
+from sqlalchemy import select, tuple_
+
+import sepal.db as db
+from sepal.accessions.models import Accession, AccessionItem
+from sepal.activity.models import Activity
+from sepal.locations.models import Location
+from sepal.pagination import decode_signed, encode_signed
+from sepal.settings import settings
+from sepal.taxa.models import Taxon
+
+# The models that are synced keyed by table. The tables are copied in this
+# order so that clients receive the parent of a record before the record.
+SYNC_MODELS: Dict[str, Any] = {
+    "taxon": Taxon,
+    "location": Location,
+    "accession": Accession,
+    "accession_item": AccessionItem,
+}
+
+# Bump the version if the format of the token changes so that tokens handed
+# out by an older version are rejected instead of being misread.
+SYNC_TOKEN_VERSION = 2
+
+
+class SyncToken(NamedTuple):
+    """The position of a client in the changes of an organization.
+
+    The timestamp and id are the key of the last activity the client has
+    seen. While the records are being copied to a new client the table and
+    table_id are the last record that was copied.
+    """
+
+    timestamp: datetime
+    id: int
+    table: Optional[str] = None
+    table_id: Optional[int] = None
+
+
+class SyncPage(NamedTuple):
+    # the changed records keyed by table
+    upserts: Dict[str, List[Any]]
+    # the ids of the deleted records keyed by table
+    deletes: Dict[str, List[int]]
+    token: SyncToken
+    # True if the client should request the next page right away
+    has_more: bool
+
+
+def make_sync_token(token: SyncToken) -> str:
+    """Return the encoded sync token.
+
+    The token is signed with settings.secret_key like the pagination cursors
+    so that clients can't craft their own positions.
+    """
+    values: List[Any] = [SYNC_TOKEN_VERSION, token.timestamp, token.id]
+    if token.table is not None:
+        values += [token.table, token.table_id]
+    return encode_signed(orjson.dumps(values))
+
+
+def parse_sync_token(value: str) -> SyncToken:
+    """Return the position in an encoded sync token.
+
+    Raises a ValueError if the token is invalid.
+    """
+    try:
+        version, timestamp, id_, *copy = orjson.loads(decode_signed(value))
+        if version != SYNC_TOKEN_VERSION or len(copy) not in (0, 2):
+            raise ValueError
+        if not isinstance(id_, int):
+            raise ValueError
+        token = SyncToken(datetime.fromisoformat(timestamp), id_)
+        if copy:
+            table, table_id = copy
+            if table not in SYNC_MODELS or not isinstance(table_id, int):
+                raise ValueError
+            token = token._replace(table=table, table_id=table_id)
+        return token
+    except (ValueError, TypeError):
+        raise ValueError("Invalid sync token")
+
+
+async def get_changes(
+    org_id: int, token: Optional[str] = None, limit: int = 500
+) -> SyncPage:
+    """Return a page of the changes to the records of an organization.
+
+    Without a token all the records of the organization are copied first.
+    After that the changes are read from the activity since the token.
+
+    Activity is only returned once it's settings.sync_delay seconds old. The
+    timestamp of an activity is when its transaction started so a transaction
+    that commits late can add activity behind the position of a client that
+    has already synced past it. The delay gives those transactions time to
+    commit. That includes the transactions of the background activity writer,
+    which stamps the rows when it writes them, but not a large spill file
+    that the writer replays in a single transaction when a worker starts. If
+    that takes longer than sync_delay the clients that synced in the meantime
+    miss the spilled activity until they sync from scratch.
+
+    Raises a ValueError if the token is invalid.
+    """
+    async with db.Session() as session:
+        if token is None:
+            now = (await session.execute(select(db.utcnow()))).scalar()
+            horizon = now - timedelta(seconds=settings.sync_delay)
+            # the activity that is newer than the horizon is replayed after
+            # the copy since the copy might not include it
+            position = SyncToken(horizon, 0, next(iter(SYNC_MODELS)), 0)
+        else:
+            position = parse_sync_token(token)
+
+        if position.table is not None:
+            return await _copy_records(session, org_id, position, limit)
+        return await _replay_activity(session, org_id, position, limit)
+
+
+async def _copy_records(session, org_id: int, position: SyncToken, limit: int):
+    tables = list(SYNC_MODELS)
+    start = tables.index(position.table or tables[0])
+    upserts = {}
+    for table in tables[start:]:
+        model = SYNC_MODELS[table]
+        after_id = position.table_id if table == position.table else 0
+        q = (
+            select(model)
+            .where(model.org_id == org_id, model.id > after_id)
+            .order_by(model.id)
+            .limit(limit)
+        )
+        records = (await session.execute(q)).scalars().all()
+        if records:
+            upserts[table] = records
+        limit -= len(records)
+        if limit == 0:
+            token = position._replace(table=table, table_id=records[-1].id)
+            return SyncPage(upserts, {}, token, has_more=True)
+
+    # the copy is complete so the next page starts replaying the activity
+    token = SyncToken(position.timestamp, position.id)
+    return SyncPage(upserts, {}, token, has_more=True)
+
+
+async def _replay_activity(session, org_id: int, position: SyncToken, limit: int):
+    q = (
+        select(Activity.table, Activity.table_id, Activity.timestamp, Activity.id)
+        .where(
+            Activity.org_id == org_id,
+            Activity.table.in_(SYNC_MODELS),
+            Activity.timestamp >= position.timestamp,
+            tuple_(Activity.timestamp, Activity.id) > (position.timestamp, position.id),
+            Activity.timestamp < db.utcnow() - timedelta(seconds=settings.sync_delay),
+        )
+        .order_by(Activity.timestamp, Activity.id)
+        .limit(limit)
+    )
+    activity = (await session.execute(q)).all()
+    if not activity:
+        return SyncPage({}, {}, position, has_more=False)
+
+    # A record that changed more than once in the page is only sent once with
+    # its current values. Records that don't exist anymore are sent as deletes.
+    changed: Dict[str, Dict[int, None]] = defaultdict(dict)
+    for row in activity:
+        changed[row.table][row.table_id] = None
+
+    upserts, deletes = {}, {}
+    for table, ids in changed.items():
+        model = SYNC_MODELS[table]
+        q = select(model).where(model.org_id == org_id, model.id.in_(ids))
+        records = (await session.execute(q)).scalars().all()
+        found = {record.id for record in records}
+        if records:
+            upserts[table] = records
+        if len(found) < len(ids):
+            deletes[table] = [id_ for id_ in ids if id_ not in found]
+
+    last = activity[-1]
+    token = SyncToken(last.timestamp, last.id)
+    return SyncPage(upserts, deletes, token, has_more=len(activity) == limit)
@@ -0,0 +1,29 @@
+from typing import List
+
+from pydantic import BaseModel
+
+from sepal.accessions.schema import AccessionItemSchema, AccessionSchema
+from sepal.locations.schema import LocationSchema
+from sepal.taxa.schema import TaxonSchema
+
+
+class SyncUpsertsSchema(BaseModel):
+    taxon: List[TaxonSchema] = []
+    location: List[LocationSchema] = []
+    accession: List[AccessionSchema] = []
+    accession_item: List[AccessionItemSchema] = []
+
+
+class SyncDeletesSchema(BaseModel):
+    taxon: List[str] = []
+    location: List[str] = []
+    accession: List[str] = []
+    accession_item: List[str] = []
+
+
+class SyncSchema(BaseModel):
+    upserts: SyncUpsertsSchema
+    deletes: SyncDeletesSchema
+    # pass the token to get the next page of changes
+    token: str
+    has_more: bool
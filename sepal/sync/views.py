@@ -0,0 +1,52 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+
+from sepal.accessions.lib import AccessionsPermission
+from sepal.locations.lib import LocationsPermission
+from sepal.organizations.lib import verify_org_id
+from sepal.permissions import check_permission
+from sepal.taxa.lib import TaxaPermission
+
+from .lib import get_changes, make_sync_token
+from .schema import SyncDeletesSchema, SyncSchema, SyncUpsertsSchema
+
+router = APIRouter()
+
+
+@router.get(
+    "",
+    response_model=SyncSchema,
+    # leave out the tables without changes
+    response_model_exclude_unset=True,
+    dependencies=[
+        Depends(check_permission(TaxaPermission.Read)),
+        Depends(check_permission(LocationsPermission.Read)),
+        Depends(check_permission(AccessionsPermission.Read)),
+    ],
+)
+async def sync(
+    org_id=Depends(verify_org_id),
+    token: Optional[str] = None,
+    limit: int = Query(500, gt=0, le=1000),
+) -> SyncSchema:
+    """Return a page of the changes to the records of an organization.
+
+    Clients without a token get all the records first. Clients should keep
+    requesting pages with the returned token while has_more is true and then
+    store the token to request the changes since then.
+    """
+    if org_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    try:
+        page = await get_changes(org_id, token, limit=limit)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+    return SyncSchema(
+        upserts=SyncUpsertsSchema.parse_obj(page.upserts),
+        deletes=SyncDeletesSchema.parse_obj(page.deletes),
+        token=make_sync_token(page.token),
+        has_more=page.has_more,
+    )
@@ -1,11 +1,12 @@
-from base64 import b64decode
 from enum import Enum
-from typing import List, Optional
+from typing import Any, List, Optional, Tuple
 
 from sqlalchemy import select
 from sqlalchemy.orm import joinedload
 
 import sepal.db as db
+from sepal.pagination import Page, paginate
+from sepal.search.trigram import match, rank
 
 from .models import Taxon
 from .schema import TaxonCreate, TaxonUpdate
@@ -20,10 +21,10 @@ class TaxaPermission(str, Enum):
 
 async def get_taxon_by_id(
     taxon_id: int,
-    org_id: Optional[str] = None,
+    org_id: Optional[int] = None,
     include: Optional[List[str]] = None,
 ) -> Taxon:
-    with db.Session() as session:
+    async with db.Session() as session:
         q = select(Taxon).where(Taxon.id == taxon_id)
         if org_id:
             q = q.where(Taxon.org_id == org_id)
@@ -31,57 +32,57 @@ async def get_taxon_by_id(
             for field in include:
                 q = q.options(joinedload(getattr(Taxon, field)))
 
-        return session.execute(q).scalars().first()
+        return (await session.execute(q)).scalars().first()
 
 
 async def get_taxa(
-    org_id: str,
+    org_id: int,
     query: Optional[str] = None,
     limit: int = 50,
     cursor: Optional[str] = None,
     include: Optional[List[str]] = None,
-) -> List[Taxon]:
-
-    with db.Session() as session:
-        # TODO: if name isn't unique then we can't use it as the cursor so
-        # ordering by the name also won't work, maybe if have a primary sort by name
-        # and a secondary sort by id
-        q = select(Taxon).where(Taxon.org_id == org_id).order_by(Taxon.name)
-
+) -> Page:
+    """Return a page of the taxa of an organization ordered by name.
+
+    The taxa are searched by name if query is given and ordered by how
+    closely they match instead. Raises a ValueError if the cursor is invalid.
+    """
+    async with db.Session() as session:
+        q = select(Taxon).where(Taxon.org_id == org_id)
+
+        # names aren't unique so the id breaks the ties
+        sort: Tuple[Any, ...] = (Taxon.name, Taxon.id)
+        descending = False
         if query is not None:
-            q = q.where(Taxon.name.ilike(f"%{query}%"))
-
-        if cursor is not None:
-            decoded_cursor = b64decode(cursor).decode()
-            q = q.where(Taxon.id > decoded_cursor)
+            # the closest matches come first
+            q = q.where(match(Taxon.name, query))
+            sort, descending = (rank(Taxon.name, query), Taxon.id), True
 
         if include is not None:
             for field in include:
                 q = q.options(joinedload(getattr(Taxon, field)))
 
-        q = q.limit(limit)
-
-        return session.execute(q).scalars().all()
+        return await paginate(session, q, sort, cursor, limit, descending=descending)
 
 
-async def create_taxon(org_id: str, values: TaxonCreate) -> Taxon:
-    with db.Session() as session:
+async def create_taxon(org_id: int, values: TaxonCreate) -> Taxon:
+    async with db.Session() as session:
         taxon = Taxon(org_id=org_id, **values.dict())
         session.add(taxon)
-        session.commit()
-        session.refresh(taxon)
+        await session.commit()
+        await session.refresh(taxon)
         return taxon
 
 
 async def update_taxon(taxon_id: int, values: TaxonUpdate) -> Taxon:
-    with db.Session() as session:
-        taxon = session.get(Taxon, taxon_id)
+    async with db.Session() as session:
+        taxon = await session.get(Taxon, taxon_id)
 
         # use setattr on the instance instead of using the faster query.update()
         # so that the before_flush event gets fired
         for key, value in values.dict().items():
             setattr(taxon, key, value)
 
-        session.commit()
-        session.refresh()
+        await session.commit()
+        await session.refresh(taxon)
         return taxon
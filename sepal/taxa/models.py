@@ -1,9 +1,10 @@
 import enum
 
-from sqlalchemy import Column, Enum, ForeignKey, Integer, String
+from sqlalchemy import Column, Enum, ForeignKey, Index, Integer, String
 from sqlalchemy.orm import backref, relationship
 
 from sepal.db import Model
+from sepal.search.trigram import trigram_index
 from sepal.organizations.models import Organization
 
 
@@ -45,3 +46,9 @@ class Taxon(Model):
 
 # declare outside the class definition since we need to reference Taxon.id
 Taxon.parent = relationship(Taxon, uselist=False, remote_side=Taxon.id)
+
+# The index for listing the taxa of an organization by name
+Index("ix_taxon_org_id_name_id", Taxon.org_id, Taxon.name, Taxon.id)
+
+# The index for searching the taxa by name
+trigram_index("ix_taxon_org_id_name_trgm", Taxon.org_id, Taxon.name)
@@ -8,7 +8,6 @@ from .models import Rank
 class TaxonSchemaBase(BaseModel):
     name: str
     rank: Rank
-    parent_id: Optional[str]
 
     @validator("rank", pre=True)
     def rank_name(cls, v):
@@ -27,14 +26,15 @@ class TaxonSchemaBase(BaseModel):
 
 class TaxonSchema(TaxonSchemaBase):
     id: str
+    parent_id: Optional[str]
 
     class Config:
         orm_mode = True
 
 
 class TaxonCreate(TaxonSchemaBase):
-    pass
+    parent_id: Optional[int]
 
 
 class TaxonUpdate(TaxonSchemaBase):
-    pass
+    parent_id: Optional[int]
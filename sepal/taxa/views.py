@@ -1,11 +1,16 @@
+from datetime import datetime
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Response, status, Request
 
+from sepal.activity.lib import ActivityPermission
+from sepal.activity.schema import ActivityHistorySchema
+from sepal.activity.views import detail_as_of as activity_detail_as_of, list_history
 from sepal.auth import get_current_user
 from sepal.organizations.lib import verify_org_id
 from sepal.permissions import check_permission
-from sepal.utils import create_schema, make_cursor_link
+from sepal.pagination import PageParams, set_link_header
+from sepal.utils import create_schema
 
 
 from .lib import TaxaPermission, create_taxon, get_taxa, get_taxon_by_id, update_taxon
@@ -22,21 +27,28 @@ async def list(
     current_user_id=Depends(get_current_user),
     org_id=Depends(verify_org_id),
     q: Optional[str] = None,
-    cursor: Optional[str] = None,
-    limit: int = 50,
+    page_params: PageParams = Depends(),
     include: Optional[List[str]] = Query(None, regex="^(parent)$"),
 ) -> List[TaxonSchema]:
     if org_id is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
-    taxa = await get_taxa(org_id, q, limit=limit, cursor=cursor, include=include)
-    if len(taxa) == limit:
-        next_url = make_cursor_link(str(request.url), str(taxa[-1].id), limit)
-        response.headers["Link"] = f"<{next_url}>; rel=next"
+    try:
+        page = await get_taxa(
+            org_id,
+            q,
+            limit=page_params.limit,
+            cursor=page_params.cursor,
+            include=include,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+
+    set_link_header(request, response, page, page_params.limit)
 
     # build the schema based on the request parameters
     Schema = create_schema(TaxonSchema, Taxon, include=include)
-    return [Schema.from_orm(taxon) for taxon in taxa]
+    return [Schema.from_orm(taxon) for taxon in page.items]
 
 
 @router.post(
@@ -90,3 +102,47 @@ async def update(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
 
     return await update_taxon(taxon_id, taxon)
+
+
+@router.get(
+    "/{taxon_id}/history",
+    dependencies=[
+        Depends(check_permission(TaxaPermission.Read)),
+        Depends(check_permission(ActivityPermission.Read)),
+    ],
+)
+async def history(
+    request: Request,
+    response: Response,
+    taxon_id: int,
+    current_user_id=Depends(get_current_user),
+    org_id=Depends(verify_org_id),
+    page_params: PageParams = Depends(),
+) -> List[ActivityHistorySchema]:
+    if org_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    return await list_history(
+        request, response, org_id, Taxon.__tablename__, taxon_id, page_params
+    )
+
+
+@router.get(
+    "/{taxon_id}/history/{as_of}",
+    dependencies=[
+        Depends(check_permission(TaxaPermission.Read)),
+        Depends(check_permission(ActivityPermission.Read)),
+    ],
+)
+async def detail_as_of(
+    taxon_id: int,
+    as_of: datetime,
+    current_user_id=Depends(get_current_user),
+    org_id=Depends(verify_org_id),
+) -> TaxonSchema:
+    if org_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    return await activity_detail_as_of(
+        org_id, Taxon.__tablename__, taxon_id, as_of, TaxonSchema
+    )
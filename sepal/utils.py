@@ -1,7 +1,5 @@
-from base64 import b64encode
-from functools import reduce
-from urllib.parse import urljoin
-from typing import List, Optional
+from functools import lru_cache, reduce
+from typing import List, Optional, Tuple
 
 from pydantic import Field, create_model
 
@@ -37,11 +35,20 @@ def get_relationship_schema(mapper, relationship):
 
 
 def create_schema(base_schema, mapper, include: Optional[List]):
-    """Dynamically create a schema for a SQLAlchemy mapper."""
+    """Dynamically create a schema for a SQLAlchemy mapper.
+
+    Creating a pydantic model is expensive so the schemas are cached and the
+    same class is returned for the same set of included fields.
+    """
     # TODO: can we omit the mapper arg if we can look up the schema in mapper_schema
-    if include is None:
-        include = []
+    if not include:
+        return base_schema
+
+    return _create_schema(base_schema, mapper, tuple(sorted(set(include))))
+
 
+@lru_cache(maxsize=256)
+def _create_schema(base_schema, mapper, include: Tuple[str, ...]):
     return create_model(
         "Schema",
         **{  # type: ignore
@@ -57,8 +64,3 @@ def create_schema(base_schema, mapper, include: Optional[List]):
         },
         __base__=base_schema,
     )
-
-
-def make_cursor_link(request_url: str, cursor: str, limit: int):
-    encoded_cursor = b64encode(cursor.encode()).decode()
-    return urljoin(str(request_url), f"?limit={limit}&cursor={encoded_cursor}")
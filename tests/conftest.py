@@ -1,3 +1,6 @@
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
 import sepal.db as db
 
 import sepal.models  # noqa: F401
@@ -6,6 +9,12 @@ from .factories import Session
 
 
 def pytest_configure():
+    # Each async test runs in its own event loop and asyncpg connections can't
+    # be shared between loops so don't pool the connections in the tests.
+    db.async_engine = create_async_engine(
+        db.async_engine.url, poolclass=NullPool, **db.engine_options
+    )
+    db.async_session_factory.configure(bind=db.async_engine)
     db.metadata.create_all(bind=db.engine)
 
 
@@ -4,6 +4,7 @@ from random import choice
 import pytest
 from fastapi.testclient import TestClient
 
+import sepal.db as db
 from sepal.requestvars import request_global
 from sepal.app import app
 from sepal.organizations.models import OrganizationUser, RoleType
@@ -20,6 +21,13 @@ from .factories import (
 )
 
 
+@pytest.fixture(autouse=True)
+def session_scope():
+    # the lib functions that the tests call directly aren't run by a request
+    with db.session_scope():
+        yield
+
+
 @pytest.fixture
 def make_token():
     def _inner(length=6):
@@ -3,7 +3,7 @@ from urllib.parse import parse_qs, urlparse
 
 import pytest
 
-from .factories import AccessionFactory
+from .factories import AccessionFactory, AccessionItemFactory, LocationFactory
 from .fixtures import *  # noqa: F401,F403
 
 
@@ -85,7 +85,8 @@ def test_accessions_list_pagination(
         f"/v1/orgs/{org.id}/accessions?limit={limit}", headers=auth_header
     )
     assert resp.status_code == 200, resp.content
-    if num_accessions < limit:
+    if num_accessions <= limit:
+        # there's no next page when every accession fits on the first one
         assert "link" not in resp.headers
         return
 
@@ -95,16 +96,15 @@ def test_accessions_list_pagination(
     validate_links_header(resp.links, limit)
 
     next_url = resp.links["next"]["url"]
-    page_ctr = 1
+    codes = [accession["code"] for accession in resp.json()]
     while next_url is not None:
         resp = client.get(next_url, headers=auth_header)
         validate_links_header(resp.links, limit)
+        codes.extend(accession["code"] for accession in resp.json())
         next_url = resp.links.get("next", {}).get("url", None)
-        page_ctr += 1
 
-    # assert the number of pages times the page length plus the left over is the
-    # correct number of items
-    assert (page_ctr - 1) * limit + len(accessions) % limit == len(accessions)
+    # every accession is on exactly one page
+    assert sorted(codes) == sorted(accession.code for accession in accessions)
 
 
 # def test_accessions_list(client, auth_header, org, accession):
@@ -131,6 +131,69 @@ def test_accession_items_list(
     assert items_json[0]["location_id"] == str(accession_item.location_id)
 
 
+def test_accession_items_list_pagination(client, auth_header, org, accession, location):
+    items = [
+        AccessionItemFactory(
+            org_id=org.id, accession_id=accession.id, location_id=location.id
+        )
+        for _ in range(5)
+    ]
+
+    url = f"/v1/orgs/{org.id}/accessions/{accession.id}/items?limit=2"
+    codes = []
+    while url:
+        resp = client.get(url, headers=auth_header)
+        assert resp.status_code == 200, resp.content
+        assert len(resp.json()) <= 2
+        codes.extend(item["code"] for item in resp.json())
+        url = resp.links.get("next", {}).get("url")
+
+    assert codes == sorted(item.code for item in items)
+
+
+def test_org_accession_items_list(
+    client, auth_header, org, taxon, accession, location, accession_item
+):
+    other_accession = AccessionFactory(org_id=org.id, taxon_id=taxon.id)
+    other_location = LocationFactory(org_id=org.id)
+    other_item = AccessionItemFactory(
+        org_id=org.id,
+        accession_id=other_accession.id,
+        location_id=other_location.id,
+        item_type="seed" if accession_item.item_type != "seed" else "plant",
+    )
+
+    def list_items(**params):
+        resp = client.get(
+            f"/v1/orgs/{org.id}/accession_items", params=params, headers=auth_header
+        )
+        assert resp.status_code == 200, resp.content
+        return {item["id"] for item in resp.json()}
+
+    assert list_items() == {str(accession_item.id), str(other_item.id)}
+    assert list_items(accession_id=other_accession.id) == {str(other_item.id)}
+    assert list_items(location_id=location.id) == {str(accession_item.id)}
+    assert list_items(item_type=other_item.item_type) == {str(other_item.id)}
+    assert list_items(q=accession_item.code) == {str(accession_item.id)}
+
+    resp = client.get(
+        f"/v1/orgs/{org.id}/accession_items",
+        params={"include": "accession", "accession_id": accession.id},
+        headers=auth_header,
+    )
+    assert resp.status_code == 200, resp.content
+    assert resp.json()[0]["accession"]["code"] == accession.code
+
+
+def test_org_accession_items_list_invalid_item_type(client, auth_header, org):
+    resp = client.get(
+        f"/v1/orgs/{org.id}/accession_items",
+        params={"item_type": "tree"},
+        headers=auth_header,
+    )
+    assert resp.status_code == 422, resp.content
+
+
 # def test_accession_items_create(
 #     client, auth_header, make_token, org, accession, location
 # ):
@@ -1,9 +1,20 @@
+from datetime import datetime, timedelta
+
 import pytest
 import sqlalchemy as sa
+from sqlalchemy import event
 
-from sepal.activity.lib import init_session_tracking
-from sepal.activity.models import Activity
+import sepal.db as db
+from sepal.activity.lib import (
+    expand_activity,
+    get_record_as_of,
+    init_session_tracking,
+    make_activity_query,
+)
+from sepal.activity.models import Activity, ActivityCount, ActivitySnapshot
 from sepal.requestvars import request_global
+from sepal.settings import settings
+from sepal.taxa.models import Rank, Taxon
 
 from .fixtures import *  # noqa: F401,F403
 
@@ -28,6 +39,7 @@ def test_activity_create(session, taxon):
     assert len(activities) == 1
     assert activities[0].data_before is None
     assert activities[0].data_after["id"] == taxon.id
+    assert activities[0].org_id == taxon.org_id
 
 
 def test_activity_update(session, taxon, make_token):
@@ -64,3 +76,334 @@ def test_activity_delete(session, taxon):
         .all()
     )
     assert len(activities) == 1, activities
+    # the org_id is kept for deleted objects even though data_after is null
+    assert activities[0].org_id == taxon.org_id
+
+
+def test_activity_create_delete_all_columns(session, org, make_token):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    columns = {prop.key for prop in sa.inspect(Taxon).column_attrs}
+    taxon = Taxon(org_id=org.id, name=make_token(), rank=Rank.Species)
+    session.add(taxon)
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        session.flush()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+    session.commit()
+
+    # the server defaults are returned by the insert instead of being loaded
+    assert not [s for s in statements if s.startswith("SELECT")]
+    created = session.query(Activity).filter_by(table="taxon", table_id=taxon.id).one()
+    assert set(created.data_after) == columns
+    assert created.data_after["parent_id"] is None
+    assert created.data_after["created_at"] is not None
+
+    # the attributes of the taxon expired when it was committed
+    session.delete(taxon)
+    session.commit()
+    deleted = (
+        session.query(Activity)
+        .filter_by(table="taxon", table_id=taxon.id, action="deleted")
+        .one()
+    )
+    assert deleted.data_before == created.data_after
+
+
+def test_activity_single_insert(session, org, make_token):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        if statement.startswith("INSERT INTO activity ("):
+            statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        taxa = [
+            Taxon(org_id=org.id, name=make_token(), rank=Rank.Species) for _ in range(3)
+        ]
+        session.add_all(taxa)
+        session.commit()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+    # the activity for all the new taxa is written in one statement
+    assert len(statements) == 1
+    activities = (
+        session.query(Activity)
+        .filter(Activity.table == "taxon", Activity.table_id.in_([t.id for t in taxa]))
+        .all()
+    )
+    assert len(activities) == 3
+
+
+def test_activity_counts(session, org, taxon, current_user_id, make_token):
+    def get_count():
+        count = session.get(
+            ActivityCount, (org.id, datetime.utcnow().date(), current_user_id, "taxon")
+        )
+        return count.count if count is not None else 0
+
+    count = get_count()
+    taxon.name = make_token()
+    session.commit()
+    taxon.name = make_token()
+    session.add(Taxon(org_id=org.id, name=make_token(), rank=Rank.Species))
+    session.commit()
+    assert get_count() == count + 3
+
+    # the counts of changes that are rolled back are rolled back too
+    taxon.name = make_token()
+    session.flush()
+    session.rollback()
+    assert get_count() == count + 3
+
+
+def test_activity_update_changed_fields(session, taxon):
+    rank = taxon.rank
+    taxon.rank = Rank.Genus if rank != Rank.Genus else Rank.Family
+    session.commit()
+    activity = (
+        session.query(Activity)
+        .filter_by(table="taxon", table_id=taxon.id)
+        .order_by(Activity.id.desc())
+        .first()
+    )
+    # only the changed fields and the identifying fields are stored
+    assert set(activity.data_after) == {"id", "org_id", "name", "rank"}
+    assert activity.data_before["rank"] == rank.value
+    assert activity.data_after["rank"] == taxon.rank.value
+
+
+def test_activity_update_unchanged(session, taxon):
+    taxon.name = taxon.name
+    session.commit()
+    count = session.query(Activity).filter_by(table="taxon", table_id=taxon.id).count()
+    assert count == 1
+
+
+def test_expand_activity(session, taxon, make_token):
+    name = taxon.name
+    taxon.name = make_token()
+    session.commit()
+    taxon.rank = Rank.Kingdom
+    session.commit()
+    session.delete(taxon)
+    session.commit()
+
+    activities = (
+        session.query(Activity)
+        .filter_by(table="taxon", table_id=taxon.id)
+        .order_by(Activity.timestamp, Activity.id)
+        .all()
+    )
+    history = [(before, after) for _, before, after in expand_activity(activities)]
+    assert len(history) == 4
+
+    created, renamed, reranked, deleted = history
+    assert created[0] is None
+    assert created[1]["name"] == name
+    assert renamed[0] == created[1]
+    assert renamed[1] == {**created[1], "name": taxon.name}
+    assert reranked[0] == renamed[1]
+    assert reranked[1] == {**renamed[1], "rank": Rank.Kingdom.value}
+    assert deleted[0]["rank"] == Rank.Kingdom.value
+    assert deleted[1] is None
+
+
+def test_activity_summary(session, profile, taxon, make_token):
+    taxon.name = make_token()
+    session.commit()
+    activity = (
+        session.query(Activity)
+        .filter_by(table="taxon", table_id=taxon.id)
+        .order_by(Activity.id.desc())
+        .first()
+    )
+    assert activity.action == "updated"
+    assert activity.actor_name == profile.email
+    assert activity.resource_label == f"Taxon {taxon.name}"
+
+
+@pytest.mark.asyncio
+async def test_get_record_as_of(session, taxon, make_token, monkeypatch):
+    monkeypatch.setattr(settings, "activity_snapshot_interval", 2)
+    monkeypatch.setattr(settings, "sync_delay", 0)
+    names = [taxon.name]
+    for _ in range(4):
+        taxon.name = make_token()
+        session.commit()
+        names.append(taxon.name)
+    session.delete(taxon)
+    session.commit()
+
+    activities = (
+        session.query(Activity)
+        .filter_by(table="taxon", table_id=taxon.id)
+        .order_by(Activity.timestamp, Activity.id)
+        .all()
+    )
+    assert len(activities) == 6
+    for activity, name in zip(activities, names):
+        data = await get_record_as_of(
+            taxon.org_id, "taxon", taxon.id, activity.timestamp
+        )
+        assert data["name"] == name
+
+    # the records that didn't exist yet or were deleted
+    before = activities[0].timestamp - timedelta(seconds=1)
+    assert await get_record_as_of(taxon.org_id, "taxon", taxon.id, before) is None
+    after = activities[-1].timestamp
+    assert await get_record_as_of(taxon.org_id, "taxon", taxon.id, after) is None
+
+    # a snapshot was saved for every two activities that were replayed
+    snapshots = (
+        session.query(ActivitySnapshot)
+        .filter_by(table="taxon", table_id=taxon.id)
+        .order_by(ActivitySnapshot.timestamp)
+        .all()
+    )
+    assert [s.activity_id for s in snapshots] == [
+        activities[1].id,
+        activities[3].id,
+        activities[5].id,
+    ]
+    assert snapshots[1].data["name"] == names[3]
+    assert snapshots[2].data is None
+
+
+@pytest.mark.asyncio
+async def test_get_record_as_of_late_activity(
+    session, taxon, make_token, current_user_id, monkeypatch
+):
+    monkeypatch.setattr(settings, "activity_snapshot_interval", 2)
+    monkeypatch.setattr(settings, "sync_delay", 60)
+    for _ in range(4):
+        taxon.name = make_token()
+        session.commit()
+    activities = (
+        session.query(Activity)
+        .filter_by(table="taxon", table_id=taxon.id)
+        .order_by(Activity.timestamp, Activity.id)
+        .all()
+    )
+    as_of = activities[-1].timestamp
+
+    # the activity is too new to be snapshotted
+    data = await get_record_as_of(taxon.org_id, "taxon", taxon.id, as_of)
+    assert data is not None
+    assert data["name"] == taxon.name
+    assert (
+        not session.query(ActivitySnapshot)
+        .filter_by(table="taxon", table_id=taxon.id)
+        .count()
+    )
+
+    # activity that commits late is added behind the activity that was
+    # replayed and it's still replayed the next time
+    session.add(
+        Activity(
+            user_id=current_user_id,
+            data_before={"id": taxon.id, "rank": taxon.rank.value},
+            data_after={"id": taxon.id, "rank": Rank.Genus.value},
+            table="taxon",
+            table_id=taxon.id,
+            org_id=taxon.org_id,
+            timestamp=activities[1].timestamp - timedelta(microseconds=1),
+            action="updated",
+            actor_name="Unknown user",
+            resource_label=f"Taxon {taxon.name}",
+        )
+    )
+    session.commit()
+    data = await get_record_as_of(taxon.org_id, "taxon", taxon.id, as_of)
+    assert data is not None
+    assert data["name"] == taxon.name
+    assert data["rank"] == Rank.Genus.value
+
+    # nothing is snapshotted while the background writer is used
+    monkeypatch.setattr(settings, "sync_delay", 0)
+    monkeypatch.setattr(settings, "activity_async_writes", True)
+    await get_record_as_of(taxon.org_id, "taxon", taxon.id, as_of)
+    assert (
+        not session.query(ActivitySnapshot)
+        .filter_by(table="taxon", table_id=taxon.id)
+        .count()
+    )
+
+    monkeypatch.setattr(settings, "activity_async_writes", False)
+    await get_record_as_of(taxon.org_id, "taxon", taxon.id, as_of)
+    assert (
+        session.query(ActivitySnapshot)
+        .filter_by(table="taxon", table_id=taxon.id)
+        .count()
+        == 3
+    )
+
+
+def explain(session, q) -> str:
+    """Return the plan of a query when only plain index scans are allowed.
+
+    The test tables are so small that a sequential or bitmap scan would always
+    win so they are disabled to check that there is an index that covers the
+    query.
+    """
+    compiled = q.compile(dialect=session.bind.dialect)
+    conn = session.connection()
+    conn.execute(sa.text("SET LOCAL enable_seqscan = off"))
+    conn.execute(sa.text("SET LOCAL enable_bitmapscan = off"))
+    plan = conn.exec_driver_sql(f"EXPLAIN {compiled}", compiled.params).scalars()
+    plan = "\n".join(plan)
+    session.rollback()
+    return plan
+
+
+def partition_index_names(session, index_name):
+    """Return the names of the indexes of the partitions for a partitioned index."""
+    return (
+        session.execute(
+            sa.text(
+                """
+                SELECT child.relname
+                FROM pg_inherits
+                JOIN pg_class parent ON pg_inherits.inhparent = parent.oid
+                JOIN pg_class child ON pg_inherits.inhrelid = child.oid
+                WHERE parent.relname = :index_name
+                """
+            ),
+            {"index_name": index_name},
+        )
+        .scalars()
+        .all()
+    )
+
+
+@pytest.mark.parametrize(
+    "filters, index_name",
+    [
+        ({}, "ix_activity_org_id_timestamp_id"),
+        ({"user_id": "user"}, "ix_activity_org_id_user_id_timestamp_id"),
+        ({"table": "taxon"}, "ix_activity_org_id_table_timestamp_id"),
+        ({"action": "updated"}, "ix_activity_org_id_action_timestamp_id"),
+        (
+            {"start": datetime(2021, 1, 1), "end": datetime(2021, 2, 1)},
+            "ix_activity_org_id_timestamp_id",
+        ),
+    ],
+)
+def test_activity_query_uses_index(session, org, filters, index_name):
+    q = (
+        make_activity_query(org.id, **filters)
+        .order_by(Activity.timestamp.desc(), Activity.id.desc())
+        .limit(50)
+    )
+    plan = explain(session, q)
+    index_names = partition_index_names(session, index_name)
+    assert index_names
+    assert any(f"Index Scan using {name} " in plan for name in index_names), plan
+    # the index is in the order of the feed
+    assert "Sort" not in plan, plan
@@ -0,0 +1,135 @@
+import gzip
+from datetime import date, datetime
+
+import orjson
+import pytest
+from sqlalchemy import text
+
+import sepal.db as db
+from sepal.activity.models import Activity
+from sepal.activity.partitions import (
+    add_months,
+    archive_partition,
+    create_partition,
+    get_partitions,
+    maintain,
+    partition_name,
+)
+
+from .fixtures import *  # noqa: F401,F403
+
+# far enough in the past not to collide with the activity of other tests
+MONTH = date(1990, 1, 1)
+
+
+@pytest.fixture
+def insert_activity(make_token):
+    def _inner(timestamp):
+        with db.engine.begin() as conn:
+            conn.execute(
+                Activity.__table__.insert(),
+                {
+                    "user_id": make_token(),
+                    "table": "taxon",
+                    "table_id": 1,
+                    "timestamp": timestamp,
+                    "action": "created",
+                    "actor_name": "Unknown user",
+                    "resource_label": "Taxon 1",
+                },
+            )
+
+    return _inner
+
+
+@pytest.fixture
+def cleanup_partitions():
+    yield
+    with db.engine.begin() as conn:
+        for month in get_partitions(conn):
+            if month >= MONTH:
+                conn.execute(text(f"DROP TABLE {partition_name(month)}"))
+
+
+def partition_count(conn, month):
+    return conn.execute(text(f"SELECT count(*) FROM {partition_name(month)}")).scalar()
+
+
+def test_add_months():
+    assert add_months(date(2021, 1, 15), 1) == date(2021, 2, 1)
+    assert add_months(date(2021, 12, 1), 1) == date(2022, 1, 1)
+    assert add_months(date(2021, 1, 1), -1) == date(2020, 12, 1)
+    assert add_months(date(2021, 3, 1), -14) == date(2020, 1, 1)
+
+
+def test_create_partition(insert_activity, cleanup_partitions):
+    # the activity is written to the default partition until the monthly
+    # partition exists and then it's moved to the monthly partition
+    insert_activity(datetime(1990, 1, 15))
+    with db.engine.begin() as conn:
+        assert create_partition(conn, MONTH)
+        assert not create_partition(conn, MONTH)
+        assert MONTH in get_partitions(conn)
+        assert partition_count(conn, MONTH) == 1
+        # writes to the default partition are blocked while the rows are moved
+        modes = conn.execute(
+            text(
+                "SELECT mode FROM pg_locks "
+                "WHERE relation = 'activity_default'::regclass "
+                "AND pid = pg_backend_pid()"
+            )
+        ).scalars()
+        assert "ShareRowExclusiveLock" in list(modes)
+
+
+def test_archive_partition(tmp_path, insert_activity, cleanup_partitions):
+    with db.engine.begin() as conn:
+        create_partition(conn, MONTH)
+    insert_activity(datetime(1990, 1, 15))
+    insert_activity(datetime(1990, 1, 16))
+
+    with db.engine.begin() as conn:
+        path = archive_partition(conn, MONTH, str(tmp_path))
+        assert MONTH not in get_partitions(conn)
+
+    with gzip.open(path) as f:
+        rows = [orjson.loads(line) for line in f]
+    assert [row["timestamp"] for row in rows] == [
+        "1990-01-15T00:00:00",
+        "1990-01-16T00:00:00",
+    ]
+
+
+def test_maintain(tmp_path, insert_activity, cleanup_partitions):
+    maintain(db.engine, MONTH, 2, None, str(tmp_path))
+    with db.engine.begin() as conn:
+        assert get_partitions(conn)[-3:] == [
+            MONTH,
+            add_months(MONTH, 1),
+            add_months(MONTH, 2),
+        ]
+
+    # the partitions and the rows in the default partition from before the
+    # retention period are archived
+    insert_activity(datetime(1989, 12, 15))
+    today = add_months(MONTH, 3)
+    maintain(db.engine, today, 0, 1, str(tmp_path))
+    with db.engine.begin() as conn:
+        assert [m for m in get_partitions(conn) if m >= MONTH] == [
+            add_months(MONTH, 2),
+            today,
+        ]
+        assert not conn.execute(
+            text("SELECT count(*) FROM activity_default WHERE timestamp < :before"),
+            {"before": MONTH},
+        ).scalar()
+
+    default_path, *partition_paths = sorted(tmp_path.iterdir())
+    assert [p.name for p in partition_paths] == [
+        f"{partition_name(MONTH)}.ndjson.gz",
+        f"{partition_name(add_months(MONTH, 1))}.ndjson.gz",
+    ]
+    assert default_path.name.startswith("activity_default_")
+    with gzip.open(default_path) as f:
+        rows = [orjson.loads(line) for line in f]
+    assert [row["timestamp"] for row in rows] == ["1989-12-15T00:00:00"]
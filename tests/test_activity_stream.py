@@ -0,0 +1,214 @@
+import asyncio
+from datetime import datetime
+from typing import Optional
+
+import pytest
+
+import sepal.activity.views as views
+from sepal.activity.lib import ACTIVITY_SORT, get_activity_since, init_session_tracking
+from sepal.activity.models import Activity
+from sepal.activity.stream import ActivityBroadcaster, _make_dsn, stream_activity
+from sepal.app import app
+from sepal.pagination import encode_cursor, get_key
+from sepal.requestvars import request_global
+from sepal.settings import settings
+
+from .fixtures import *  # noqa: F401,F403
+
+
+@pytest.fixture(autouse=True)
+def request_global_user(current_user_id):
+    request_global().current_user_id = current_user_id
+
+
+@pytest.fixture(autouse=True)
+def track_session(session):
+    unregister = init_session_tracking(session)
+    yield
+    unregister()
+
+
+@pytest.fixture
+async def broadcaster():
+    broadcaster = ActivityBroadcaster(_make_dsn(settings.database_url), queue_size=1)
+    yield broadcaster
+    await broadcaster.stop()
+
+
+def make_cursor(activity):
+    return encode_cursor(get_key(activity, ACTIVITY_SORT))
+
+
+@pytest.mark.asyncio
+async def test_broadcaster(broadcaster, session, org, taxon, make_token):
+    queue = await broadcaster.subscribe(org.id)
+    other_queue = await broadcaster.subscribe(org.id + 1)
+
+    taxon.name = make_token()
+    session.commit()
+
+    activity = await asyncio.wait_for(queue.get(), 5)
+    assert activity.table == "taxon"
+    assert activity.table_id == taxon.id
+    assert activity.action == "updated"
+    assert activity.resource_label == f"Taxon {taxon.name}"
+    stored = session.query(Activity).filter_by(id=activity.id).one()
+    assert activity.timestamp == stored.timestamp
+    assert other_queue.empty()
+
+    # the streams are ended when the broadcaster stops
+    await broadcaster.stop()
+    assert queue.get_nowait() is None
+    assert other_queue.get_nowait() is None
+
+
+@pytest.mark.asyncio
+async def test_broadcaster_full_queue(broadcaster, session, org, taxon, make_token):
+    queue = await broadcaster.subscribe(org.id)
+    for _ in range(2):
+        taxon.name = make_token()
+        session.commit()
+
+    # wait for both notifications before reading the queue since reading the
+    # first one would make room for the second
+    async def unsubscribed():
+        while org.id in broadcaster._subscribers:
+            await asyncio.sleep(0.01)
+
+    await asyncio.wait_for(unsubscribed(), 5)
+
+    # the stream that fell behind is ended so the client resumes
+    assert queue.get_nowait() is None
+    assert queue.empty()
+
+
+@pytest.mark.asyncio
+async def test_stream_activity(session, org, taxon, make_token):
+    for _ in range(3):
+        taxon.name = make_token()
+        session.commit()
+
+    activity = (
+        session.query(Activity)
+        .filter_by(org_id=org.id)
+        .order_by(Activity.timestamp, Activity.id)
+        .all()
+    )
+    missed = await get_activity_since(org.id, make_cursor(activity[0]), limit=10)
+    assert [a.id for a in missed] == [a.id for a in activity[1:]]
+
+    queue: "asyncio.Queue[Optional[Activity]]" = asyncio.Queue()
+    # the last missed activity is also on the queue
+    queue.put_nowait(activity[-1])
+    queue.put_nowait(None)
+    events = [event async for event in stream_activity(queue, missed, heartbeat=1)]
+    assert len(events) == len(missed)
+    assert events[-1].startswith(
+        b"event: activity\nid: " + make_cursor(activity[-1]).encode()
+    )
+
+
+@pytest.mark.asyncio
+async def test_stream_activity_heartbeat_and_reset():
+    queue: "asyncio.Queue[Optional[Activity]]" = asyncio.Queue()
+    stream = stream_activity(queue, reset=True, heartbeat=0.01)
+    assert (await stream.__anext__()).startswith(b"event: reset\n")
+    assert await stream.__anext__() == b": heartbeat\n\n"
+    queue.put_nowait(None)
+    with pytest.raises(StopAsyncIteration):
+        await stream.__anext__()
+
+
+@pytest.mark.asyncio
+async def test_stream_activity_disconnect():
+    queue: "asyncio.Queue[Optional[Activity]]" = asyncio.Queue()
+    disconnected = False
+
+    async def is_disconnected():
+        return disconnected
+
+    stream = stream_activity(queue, heartbeat=0.01, is_disconnected=is_disconnected)
+    assert await stream.__anext__() == b": heartbeat\n\n"
+    # the events end at the next heartbeat after the client disconnects
+    disconnected = True
+    with pytest.raises(StopAsyncIteration):
+        await stream.__anext__()
+
+
+def test_stream_invalid_last_event_id(client, auth_header, org):
+    resp = client.get(
+        f"/v1/orgs/{org.id}/activity/stream",
+        headers={**auth_header, "Last-Event-ID": "not-a-cursor"},
+    )
+    assert resp.status_code == 400, resp.content
+
+
+def test_stream_unsubscribe_on_error(client, auth_header, org, monkeypatch):
+    broadcaster = ActivityBroadcaster(_make_dsn(settings.database_url))
+
+    async def subscribe(org_id):
+        # don't start listening since the broadcaster can't be stopped on the
+        # event loop of the client
+        queue: "asyncio.Queue[Optional[Activity]]" = asyncio.Queue()
+        broadcaster._subscribers[org_id].add(queue)
+        return queue
+
+    async def get_activity_since(*args, **kwargs):
+        raise RuntimeError("Could not load the missed activity")
+
+    monkeypatch.setattr(broadcaster, "subscribe", subscribe)
+    monkeypatch.setattr(views, "activity_broadcaster", broadcaster)
+    monkeypatch.setattr(views, "get_activity_since", get_activity_since)
+    last_event_id = encode_cursor((datetime.utcnow(), 1))
+    with pytest.raises(RuntimeError):
+        client.get(
+            f"/v1/orgs/{org.id}/activity/stream",
+            headers={**auth_header, "Last-Event-ID": last_event_id},
+        )
+    assert not broadcaster._subscribers[org.id]
+
+
+@pytest.mark.asyncio
+async def test_stream_unsubscribe_on_disconnect(auth_header, org, monkeypatch):
+    broadcaster = ActivityBroadcaster(_make_dsn(settings.database_url))
+
+    async def subscribe(org_id):
+        queue: "asyncio.Queue[Optional[Activity]]" = asyncio.Queue()
+        broadcaster._subscribers[org_id].add(queue)
+        return queue
+
+    monkeypatch.setattr(broadcaster, "subscribe", subscribe)
+    monkeypatch.setattr(views, "activity_broadcaster", broadcaster)
+    monkeypatch.setattr(settings, "activity_stream_heartbeat", 0.01)
+
+    # The client disconnects once the first heartbeat has been sent. Only
+    # checking for it notices the disconnect, the listeners that are already
+    # waiting for it never hear about it, like behind BaseHTTPMiddleware.
+    streaming = asyncio.Event()
+
+    async def receive():
+        if streaming.is_set():
+            return {"type": "http.disconnect"}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.body" and message["body"]:
+            streaming.set()
+
+    path = f"/v1/orgs/{org.id}/activity/stream"
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(k.encode(), v.encode()) for k, v in auth_header.items()],
+        "client": ("testclient", 50000),
+        "server": ("testserver", 80),
+    }
+    await asyncio.wait_for(app(scope, receive, send), 5)
+    assert streaming.is_set()
+    assert not broadcaster._subscribers[org.id]
@@ -1,6 +1,12 @@
+from base64 import b64encode
+from datetime import datetime
+
 import pytest
+from sqlalchemy import event
 
-from sepal.activity.lib import init_session_tracking
+import sepal.db as db
+from sepal.activity.lib import get_activity, init_session_tracking
+from sepal.activity.models import Activity
 from sepal.requestvars import request_global
 
 from .fixtures import *  # noqa: F401,F403
@@ -43,8 +49,8 @@ async def test_activity_dummy(
     from sepal.activity.lib import get_activity
     from sepal.activity.schema import ActivitySchema
 
-    activity = await get_activity(org.id)
-    ActivitySchema.from_orm(activity[0])
+    page = await get_activity(org.id)
+    ActivitySchema.from_orm(page.items[0])
 
 
 def test_activity_list(
@@ -67,5 +73,164 @@ def test_activity_list(
     assert resp.status_code == 200, resp.content
     activity_json = resp.json()
     assert len(activity_json) > 0
+    assert activity_json[0]["action"] == "updated"
+    assert activity_json[0]["resource_label"] == f"Taxon {taxon.name}"
+    assert activity_json[0]["description"].startswith(f"Taxon {taxon.name} updated by ")
     # assert activity_json[0]["id"] == location.id
     # assert activity_json[0]["name"] == location.name
+
+
+def test_activity_list_pagination(client, auth_header, org, taxon, session, make_token):
+    # the activity is created in one transaction so the timestamps are all
+    # the same and only the ids break the ties
+    for _ in range(4):
+        taxon.name = make_token()
+        session.flush()
+    session.commit()
+    count = session.query(Activity).filter_by(org_id=org.id).count()
+    assert count >= 5
+
+    url = f"/v1/orgs/{org.id}/activity?limit=2"
+    timestamps = []
+    while url:
+        resp = client.get(url, headers=auth_header)
+        assert resp.status_code == 200, resp.content
+        timestamps.extend(a["timestamp"] for a in resp.json())
+        url = resp.links.get("next", {}).get("url")
+
+    assert len(timestamps) == count
+    assert timestamps == sorted(timestamps, reverse=True)
+
+
+def test_activity_list_filters(
+    client, auth_header, org, current_user_id, taxon, location, session, make_token
+):
+    taxon.name = make_token()
+    session.commit()
+    session.delete(location)
+    session.commit()
+
+    def get_activity(**params):
+        resp = client.get(
+            f"/v1/orgs/{org.id}/activity", params=params, headers=auth_header
+        )
+        assert resp.status_code == 200, resp.content
+        return [(a["resource_table"], a["action"]) for a in resp.json()]
+
+    assert get_activity(table="taxon") == [("taxon", "updated"), ("taxon", "created")]
+    assert get_activity(action="deleted") == [("location", "deleted")]
+    assert get_activity(table="taxon", action="created") == [("taxon", "created")]
+    assert len(get_activity(user_id=current_user_id)) == 4
+    assert get_activity(user_id=make_token()) == []
+
+    latest = session.query(Activity).filter_by(org_id=org.id, action="deleted").one()
+    assert get_activity(start=latest.timestamp.isoformat()) == [("location", "deleted")]
+    assert ("location", "deleted") not in get_activity(end=latest.timestamp.isoformat())
+
+    resp = client.get(
+        f"/v1/orgs/{org.id}/activity",
+        params={"action": "not-an-action"},
+        headers=auth_header,
+    )
+    assert resp.status_code == 422, resp.content
+
+
+def test_activity_list_filters_pagination(
+    client, auth_header, org, taxon, session, make_token
+):
+    for _ in range(3):
+        taxon.name = make_token()
+        session.commit()
+
+    url = f"/v1/orgs/{org.id}/activity?table=taxon&action=updated&limit=2"
+    actions = []
+    while url:
+        resp = client.get(url, headers=auth_header)
+        assert resp.status_code == 200, resp.content
+        actions.extend(a["action"] for a in resp.json())
+        url = resp.links.get("next", {}).get("url")
+
+    # the filters are kept in the links to the next pages
+    assert actions == ["updated"] * 3
+
+
+def test_activity_counts(
+    client, auth_header, org, current_user_id, taxon, location, session, make_token
+):
+    for _ in range(2):
+        taxon.name = make_token()
+        session.commit()
+
+    today = datetime.utcnow().date()
+    resp = client.get(
+        f"/v1/orgs/{org.id}/activity/counts",
+        params={"start": today.isoformat()},
+        headers=auth_header,
+    )
+    assert resp.status_code == 200, resp.content
+    counts = {(c["day"], c["user_id"], c["table"]): c["count"] for c in resp.json()}
+    assert counts == {
+        (today.isoformat(), current_user_id, "taxon"): 3,
+        (today.isoformat(), current_user_id, "location"): 1,
+    }
+
+    resp = client.get(
+        f"/v1/orgs/{org.id}/activity/counts",
+        params={"table": "location", "user_id": current_user_id},
+        headers=auth_header,
+    )
+    assert resp.status_code == 200, resp.content
+    assert [c["table"] for c in resp.json()] == ["location"]
+
+    resp = client.get(
+        f"/v1/orgs/{org.id}/activity/counts",
+        params={"end": today.isoformat()},
+        headers=auth_header,
+    )
+    assert resp.status_code == 200, resp.content
+    assert resp.json() == []
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not-base64!",
+        b64encode(b"2021-01-01T00:00:00").decode(),
+        b64encode(b"0,2021-01-01T00:00:00,1").decode(),
+    ],
+)
+def test_activity_list_invalid_cursor(client, auth_header, org, cursor):
+    resp = client.get(
+        f"/v1/orgs/{org.id}/activity", params={"cursor": cursor}, headers=auth_header
+    )
+    assert resp.status_code == 400, resp.content
+
+
+@pytest.mark.asyncio
+async def test_activity_resource_labels(
+    org, taxon, accession, location, session, make_token
+):
+    # the taxon is renamed after its first activity was stored
+    taxon.name = make_token()
+    session.commit()
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db.async_engine.sync_engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        activity = (await get_activity(org.id)).items
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    # one query for the activity and one for each table
+    assert len(statements) == 4
+    labels = {(a.table, a.current_resource_label) for a in activity}
+    assert labels == {
+        ("taxon", f"Taxon {taxon.name}"),
+        ("accession", f"Accession {accession.code}"),
+        ("location", f"Location {location.code}"),
+    }
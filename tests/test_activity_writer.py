@@ -0,0 +1,178 @@
+import os
+from datetime import datetime
+
+import pytest
+
+import sepal.db as db
+from sepal.activity import writer
+from sepal.activity.lib import init_session_tracking
+from sepal.activity.models import Activity, ActivityCount
+from sepal.activity.writer import ActivityWriter
+from sepal.requestvars import request_global
+
+from .fixtures import *  # noqa: F401,F403
+
+
+@pytest.fixture
+def spill_dir(tmp_path):
+    return str(tmp_path)
+
+
+@pytest.fixture
+def make_rows(make_token, current_user_id):
+    def _inner(n):
+        table = make_token()
+        return [
+            {
+                "user_id": current_user_id,
+                "data_before": None,
+                "data_after": {"id": i},
+                "table": table,
+                "table_id": i,
+                "org_id": None,
+                "action": "created",
+                "actor_name": "Unknown user",
+                "resource_label": "Unknown resource",
+            }
+            for i in range(n)
+        ]
+
+    return _inner
+
+
+def count_activity(session, table):
+    return session.query(Activity).filter_by(table=table).count()
+
+
+@pytest.mark.asyncio
+async def test_writer(session, spill_dir, make_rows):
+    activity_writer = ActivityWriter(db.async_engine, spill_dir, batch_size=2)
+    await activity_writer.start()
+    rows = make_rows(5)
+    activity_writer.put(rows)
+    await activity_writer.stop()
+
+    assert activity_writer.written == 5
+    assert activity_writer.spilled == 0
+    assert count_activity(session, rows[0]["table"]) == 5
+
+
+@pytest.mark.asyncio
+async def test_writer_counts(session, spill_dir, make_rows, org, current_user_id):
+    activity_writer = ActivityWriter(db.async_engine, spill_dir)
+    await activity_writer.start()
+    rows = make_rows(3)
+    for row in rows:
+        row["org_id"] = org.id
+    activity_writer.put(rows)
+    await activity_writer.stop()
+
+    count = session.get(
+        ActivityCount,
+        (org.id, datetime.utcnow().date(), current_user_id, rows[0]["table"]),
+    )
+    assert count.count == 3
+
+
+@pytest.mark.asyncio
+async def test_writer_spill(session, spill_dir, make_rows):
+    activity_writer = ActivityWriter(db.async_engine, spill_dir, maxsize=1)
+    await activity_writer.start()
+    rows = make_rows(3)
+    # the writer doesn't get a chance to drain the queue before the second row
+    activity_writer.put(rows)
+    await activity_writer.stop()
+    assert activity_writer.written == 1
+    assert activity_writer.spilled == 2
+
+    assert os.listdir(spill_dir) == [f"activity-{os.getpid()}.spill"]
+
+    # the spilled rows are written when the next writer starts and they get
+    # the time they're written
+    replayed_at = datetime.utcnow()
+    activity_writer = ActivityWriter(db.async_engine, spill_dir)
+    await activity_writer.start()
+    await activity_writer.stop()
+    assert activity_writer.written == 2
+    assert os.listdir(spill_dir) == []
+    activities = session.query(Activity).filter_by(table=rows[0]["table"]).all()
+    assert len(activities) == 3
+    assert sum(activity.timestamp >= replayed_at for activity in activities) == 2
+
+
+@pytest.mark.asyncio
+async def test_writer_replay_skips_running_writers(session, spill_dir, make_rows):
+    rows = make_rows(2)
+    running = ActivityWriter(db.async_engine, spill_dir)
+    running.spill_path = os.path.join(spill_dir, "activity-1.spill")
+    running.spill(rows[:1])
+    stopped = ActivityWriter(db.async_engine, spill_dir)
+    stopped.spill_path = os.path.join(spill_dir, "activity-2.spill")
+    stopped.spill(rows[1:])
+    await stopped.stop()
+
+    # only the spill file of the writer that was stopped is written
+    activity_writer = ActivityWriter(db.async_engine, spill_dir)
+    await activity_writer.start()
+    await activity_writer.stop()
+    assert activity_writer.written == 1
+    assert os.listdir(spill_dir) == ["activity-1.spill"]
+
+    await running.stop()
+    activity_writer = ActivityWriter(db.async_engine, spill_dir)
+    await activity_writer.start()
+    await activity_writer.stop()
+    assert activity_writer.written == 1
+    assert count_activity(session, rows[0]["table"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_writer_replay_failed(session, spill_dir, make_rows):
+    activity_writer = ActivityWriter(db.async_engine, spill_dir)
+    rows = make_rows(3)
+    rows[2]["action"] = None
+    activity_writer.spill(rows)
+    await activity_writer.stop()
+
+    # none of the rows are written if one of them can't be and the spill
+    # file is kept so it can be written later
+    activity_writer = ActivityWriter(db.async_engine, spill_dir)
+    await activity_writer.start()
+    await activity_writer.stop()
+    assert activity_writer.written == 0
+    assert os.listdir(spill_dir) == [f"activity-{os.getpid()}.spill"]
+    assert count_activity(session, rows[0]["table"]) == 0
+
+
+def test_writer_spill_failed(tmp_path, make_rows):
+    activity_writer = ActivityWriter(db.async_engine, str(tmp_path / "missing"))
+    activity_writer.spill(make_rows(2))
+    assert activity_writer.spilled == 0
+    assert activity_writer.dropped == 2
+
+
+@pytest.mark.asyncio
+async def test_tracking_with_writer(
+    session, spill_dir, taxon, make_token, current_user_id
+):
+    request_global().current_user_id = current_user_id
+    unregister = init_session_tracking(session)
+    await writer.start_activity_writer(db.async_engine, spill_dir)
+    try:
+        taxon.name = make_token()
+        session.commit()
+        # the activity of changes that are rolled back isn't written
+        taxon.name = make_token()
+        session.flush()
+        session.rollback()
+        activity_writer = writer.activity_writer
+    finally:
+        await writer.stop_activity_writer()
+        unregister()
+
+    assert activity_writer is not None
+    assert activity_writer.written == 1
+    activities = (
+        session.query(Activity).filter_by(table="taxon", table_id=taxon.id).all()
+    )
+    assert len(activities) == 1
@@ -0,0 +1,173 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+import rsa
+from google.auth import crypt, jwt
+
+from sepal.auth import (
+    CERTS_URL,
+    ISSUER_PREFIX,
+    AuthError,
+    SigningKeys,
+    TokenVerifier,
+)
+from sepal.cache import TTLCache
+
+from .fixtures import *  # noqa: F401,F403
+
+PROJECT_ID = "test-project"
+KEY_ID = "test-key"
+
+
+@pytest.fixture(scope="module")
+def key_pair():
+    # A locally generated key pair stands in for Google's signing keys
+    public_key, private_key = rsa.newkeys(1024)
+    return public_key.save_pkcs1().decode(), private_key.save_pkcs1().decode()
+
+
+@pytest.fixture
+def fetches():
+    return []
+
+
+@pytest.fixture
+def verifier(key_pair, fetches):
+    public_key, _ = key_pair
+
+    async def fetch():
+        fetches.append(time.monotonic())
+        return {KEY_ID: public_key}, 3600
+
+    return TokenVerifier(PROJECT_ID, SigningKeys(fetch), TTLCache(maxsize=10))
+
+
+@pytest.fixture
+def make_id_token(key_pair, make_token):
+    _, private_key = key_pair
+
+    def _inner(key_id=KEY_ID, **claims):
+        now = int(time.time())
+        payload = {
+            "aud": PROJECT_ID,
+            "iss": ISSUER_PREFIX + PROJECT_ID,
+            "sub": make_token(),
+            "iat": now,
+            "exp": now + 3600,
+            **claims,
+        }
+        signer = crypt.RSASigner.from_string(private_key, key_id=key_id)
+        return jwt.encode(signer, payload).decode()
+
+    return _inner
+
+
+@pytest.mark.asyncio
+async def test_verify_token(verifier, make_id_token, fetches):
+    token = make_id_token(sub="user1")
+    claims = await verifier.verify(token)
+    assert claims["sub"] == "user1"
+    assert claims["uid"] == "user1"
+
+    # the second verification comes from the cache
+    assert await verifier.verify(token) == claims
+    assert verifier.cache.hits == 1
+    assert len(fetches) == 1
+
+    # the keys are reused for other tokens
+    await verifier.verify(make_id_token())
+    assert len(fetches) == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "claims",
+    [
+        {"aud": "other-project"},
+        {"iss": ISSUER_PREFIX + "other-project"},
+        {"sub": ""},
+        {"exp": int(time.time()) - 3600},
+        {"iat": int(time.time()) + 3600},
+    ],
+)
+async def test_verify_token_invalid_claims(verifier, make_id_token, claims):
+    with pytest.raises(ValueError):
+        await verifier.verify(make_id_token(**claims))
+
+
+@pytest.mark.asyncio
+async def test_verify_token_invalid_signature(verifier, make_id_token):
+    # sign the claims of one token with the signature of another
+    header, payload, _ = make_id_token().split(".")
+    _, _, signature = make_id_token().split(".")
+    with pytest.raises(ValueError, match="signature"):
+        await verifier.verify(".".join([header, payload, signature]))
+
+
+@pytest.mark.asyncio
+async def test_verify_token_unknown_key(verifier, make_id_token, fetches):
+    await verifier.verify(make_id_token())
+    # the keys were just fetched so they aren't fetched again for an unknown key
+    with pytest.raises(ValueError, match="unknown key"):
+        await verifier.verify(make_id_token(key_id="other-key"))
+    assert len(fetches) == 1
+
+
+@pytest.mark.asyncio
+async def test_verify_token_malformed(verifier):
+    with pytest.raises(ValueError, match="malformed"):
+        await verifier.verify("not-a-token")
+
+
+@pytest.mark.asyncio
+async def test_signing_keys_refresh_once(key_pair, fetches):
+    public_key, _ = key_pair
+
+    async def fetch():
+        fetches.append(time.monotonic())
+        await asyncio.sleep(0.01)
+        return {KEY_ID: public_key}, 3600
+
+    keys = SigningKeys(fetch)
+    # concurrent requests wait for the same refresh
+    verifiers = await asyncio.gather(*[keys.get(KEY_ID) for _ in range(5)])
+    assert all(v is not None for v in verifiers)
+    assert len(fetches) == 1
+
+
+@pytest.mark.asyncio
+async def test_signing_keys_fetch_error(key_pair):
+    public_key, _ = key_pair
+    now = 0.0
+    fail = False
+
+    async def fetch():
+        if fail:
+            request = httpx.Request("GET", CERTS_URL)
+            raise httpx.ConnectError("Connection refused", request=request)
+        return {KEY_ID: public_key}, 3600
+
+    keys = SigningKeys(fetch, timer=lambda: now)
+    assert await keys.get(KEY_ID) is not None
+
+    # the cached keys are used until they expire
+    fail = True
+    now = 1800
+    assert await keys.get("other-key") is None
+    assert await keys.get(KEY_ID) is not None
+
+    now = 3600
+    with pytest.raises(AuthError) as exc_info:
+        await keys.get(KEY_ID)
+    assert exc_info.value.status_code == 503
+
+    fail = False
+    assert await keys.get(KEY_ID) is not None
+
+
+def test_invalid_token_unauthorized(client, auth_header):
+    resp = client.get("/v1/profile", headers=auth_header)
+    assert resp.status_code == 401, resp.content
+    assert resp.json()["detail"]["code"] == "invalid_token"
@@ -0,0 +1,28 @@
+import asyncio
+import contextvars
+
+import pytest
+
+import sepal.db as db
+
+
+@pytest.mark.asyncio
+async def test_session_scoped_to_context():
+    async def get_sessions():
+        db.init_session_scope()
+        first = db.Session()
+        await asyncio.sleep(0)
+        second = db.Session()
+        await db.Session.remove()
+        assert not db.Session.registry.has()
+        return first, second
+
+    (a1, a2), (b1, b2) = await asyncio.gather(get_sessions(), get_sessions())
+    assert a1 is a2
+    assert b1 is b2
+    assert a1 is not b1
+
+
+def test_session_outside_of_scope():
+    with pytest.raises(RuntimeError, match="outside of a session scope"):
+        contextvars.Context().run(db.Session)
@@ -1,4 +1,12 @@
-from sepal.organizations.lib import create_organization
+from sepal.organizations.lib import (
+    assign_role,
+    create_organization,
+    get_user_role,
+    is_member,
+    remove_role,
+    role_cache,
+)
+from sepal.organizations.models import RoleType
 from sepal.organizations.schema import OrganizationCreate
 from sepal.permissions import AllPermissions, has_permission
 
@@ -17,3 +25,19 @@ async def test_create_organization(current_user_id, make_token):
     # check that the user has full permissions on the organization
     for item in AllPermissions:
         assert await has_permission(org.id, current_user_id, item)
+
+
+@pytest.mark.asyncio
+async def test_user_role_cache_invalidation(org, current_user_id):
+    assert await get_user_role(org.id, current_user_id) == RoleType.Owner
+    hits = role_cache.hits
+    assert await get_user_role(org.id, current_user_id) == RoleType.Owner
+    assert role_cache.hits == hits + 1
+
+    await remove_role(org.id, current_user_id, RoleType.Owner)
+    assert await get_user_role(org.id, current_user_id) is None
+    assert not await is_member(org.id, current_user_id)
+
+    await assign_role(org.id, current_user_id, RoleType.Member)
+    assert await get_user_role(org.id, current_user_id) == RoleType.Member
+    assert await is_member(org.id, current_user_id, RoleType.Member)
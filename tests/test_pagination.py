@@ -0,0 +1,115 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select
+
+import sepal.db as db
+from sepal.activity.models import Activity
+from sepal.pagination import PREV, decode_cursor, encode_cursor, paginate
+from sepal.settings import settings
+from sepal.taxa.models import Rank, Taxon
+
+from .fixtures import *  # noqa: F401,F403
+
+TAXON_SORT = (Taxon.name, Taxon.id)
+
+
+@pytest.fixture
+def taxa(org, session):
+    # the names repeat so the pages have to be split between taxa with the
+    # same name
+    taxa = [
+        Taxon(org_id=org.id, name=name, rank=Rank.Species)
+        for name in ["b", "a", "b", "c", "b", "a", "d"]
+    ]
+    session.add_all(taxa)
+    session.commit()
+    return sorted(taxa, key=lambda taxon: (taxon.name, taxon.id))
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(("a", 1))
+    assert decode_cursor(cursor, TAXON_SORT) == ("n", ("a", 1))
+
+    timestamp = datetime(2021, 1, 2, 3, 4, 5, 6)
+    sort = (Activity.timestamp, Activity.id)
+    cursor = encode_cursor((timestamp, 1), PREV)
+    assert decode_cursor(cursor, sort) == (PREV, (timestamp, 1))
+
+
+def test_cursor_tampered():
+    payload, signature = encode_cursor(("a", 1)).split(".")
+    other_payload, _ = encode_cursor(("b", 1)).split(".")
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(f"{other_payload}.{signature}", TAXON_SORT)
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(payload, TAXON_SORT)
+
+
+def test_cursor_other_secret_key(monkeypatch):
+    cursor = encode_cursor(("a", 1))
+    monkeypatch.setattr(settings, "secret_key", "other-secret-key")
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(cursor, TAXON_SORT)
+
+
+@pytest.mark.parametrize("key", [("a",), ("a", 1, 2), ("a", "1"), (1, 1)])
+def test_cursor_wrong_key(key):
+    # the cursor is signed but its key doesn't match the sort columns
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_cursor(encode_cursor(key), TAXON_SORT)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("descending", [False, True])
+async def test_paginate(org, taxa, descending):
+    expected = [taxon.id for taxon in (reversed(taxa) if descending else taxa)]
+    q = select(Taxon).where(Taxon.org_id == org.id)
+
+    async with db.Session() as session:
+        pages = []
+        cursor = None
+        while True:
+            page = await paginate(
+                session, q, TAXON_SORT, cursor, limit=3, descending=descending
+            )
+            pages.append([taxon.id for taxon in page.items])
+            if page.next_cursor is None:
+                break
+            cursor = page.next_cursor
+        assert [len(ids) for ids in pages] == [3, 3, 1]
+        assert sum(pages, []) == expected
+        assert (await paginate(session, q, TAXON_SORT)).prev_cursor is None
+
+        # walk back to the first page from the last page
+        back = []
+        while page.prev_cursor is not None:
+            page = await paginate(
+                session, q, TAXON_SORT, page.prev_cursor, 3, descending=descending
+            )
+            back.append([taxon.id for taxon in page.items])
+            assert page.next_cursor is not None
+        assert back == pages[-2::-1]
+
+
+def test_list_link_header(client, auth_header, org, taxa):
+    resp = client.get(f"/v1/orgs/{org.id}/taxa?limit=2", headers=auth_header)
+    assert resp.status_code == 200, resp.content
+    assert "prev" not in resp.links
+
+    resp = client.get(resp.links["next"]["url"], headers=auth_header)
+    assert resp.status_code == 200, resp.content
+    assert [taxon["id"] for taxon in resp.json()] == [str(t.id) for t in taxa[2:4]]
+
+    resp = client.get(resp.links["prev"]["url"], headers=auth_header)
+    assert resp.status_code == 200, resp.content
+    assert [taxon["id"] for taxon in resp.json()] == [str(t.id) for t in taxa[:2]]
+    assert "prev" not in resp.links
+
+
+@pytest.mark.parametrize("limit", [0, settings.max_page_size + 1])
+def test_list_invalid_limit(client, auth_header, org, limit):
+    resp = client.get(
+        f"/v1/orgs/{org.id}/taxa", params={"limit": limit}, headers=auth_header
+    )
+    assert resp.status_code == 422, resp.content
@@ -1,5 +1,7 @@
 import pytest
+from sqlalchemy import event
 
+import sepal.db as db
 from sepal.permissions import has_permission
 from sepal.organizations.lib import remove_role
 from sepal.organizations.models import RoleType
@@ -16,3 +18,20 @@ async def test_has_permission(org, current_user_id, random_permission):
 async def test_has_permission_fails(org, current_user_id, random_permission):
     await remove_role(org.id, current_user_id, RoleType.Owner)
     assert await has_permission(org.id, current_user_id, random_permission) is False
+
+
+def test_check_permission_queries_membership_once(client, auth_header, org):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db.async_engine.sync_engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        resp = client.get(f"/v1/orgs/{org.id}/taxa", headers=auth_header)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    assert resp.status_code == 200, resp.content
+    assert len([s for s in statements if "FROM organization_user" in s]) == 1
@@ -0,0 +1,65 @@
+import pytest
+import sqlalchemy as sa
+
+from sepal.accessions.models import Accession, AccessionItem
+from sepal.locations.models import Location
+from sepal.search.trigram import match, rank
+from sepal.taxa.models import Rank, Taxon
+
+from .fixtures import *  # noqa: F401,F403
+
+
+@pytest.mark.parametrize(
+    "column", [Taxon.name, Location.code, Accession.code, AccessionItem.code]
+)
+def test_search_uses_trigram_index(session, column):
+    q = sa.select(column.class_).where(match(column, "abc"))
+    compiled = q.compile(dialect=session.bind.dialect)
+    conn = session.connection()
+    # the test tables are so small that a sequential scan would always win
+    conn.execute(sa.text("SET LOCAL enable_seqscan = off"))
+    plan = conn.exec_driver_sql(f"EXPLAIN {compiled}", compiled.params).scalars()
+    plan = "\n".join(plan)
+    session.rollback()
+    name = f"ix_{column.table.name}_org_id_{column.key}_trgm"
+    assert f"Bitmap Index Scan on {name}" in plan
+
+
+def test_search_rank(session):
+    similarity = session.execute(
+        sa.select(rank(sa.literal("Quercus alba"), "quercus"))
+    ).scalar()
+    assert 0 < similarity < 1
+    assert session.execute(sa.select(rank(sa.literal("Quercus"), "quercus"))).scalar()
+
+
+def test_taxa_search(client, auth_header, org, session):
+    names = ["Quercus alba", "Quercus", "Acer rubrum", "Quercus robur subsp. robur"]
+    session.add_all([Taxon(org_id=org.id, name=n, rank=Rank.Species) for n in names])
+    session.commit()
+
+    url = f"/v1/orgs/{org.id}/taxa?q=quercus&limit=2"
+    found = []
+    while url:
+        resp = client.get(url, headers=auth_header)
+        assert resp.status_code == 200, resp.content
+        found.extend(taxon["name"] for taxon in resp.json())
+        url = resp.links.get("next", {}).get("url")
+
+    # the closest matches come first
+    assert found == ["Quercus", "Quercus alba", "Quercus robur subsp. robur"]
+
+
+def test_search_cursor_from_list(client, auth_header, org, taxon, session):
+    session.add(Taxon(org_id=org.id, name=f"{taxon.name}2", rank=Rank.Species))
+    session.commit()
+    resp = client.get(f"/v1/orgs/{org.id}/taxa?limit=1", headers=auth_header)
+    cursor = resp.links["next"]["url"].split("cursor=")[1]
+
+    # the cursor of the list isn't a cursor to the search results
+    resp = client.get(
+        f"/v1/orgs/{org.id}/taxa",
+        params={"q": taxon.name, "cursor": cursor},
+        headers=auth_header,
+    )
+    assert resp.status_code == 400, resp.content
@@ -0,0 +1,103 @@
+import pytest
+from sqlalchemy import event
+
+import sepal.db as db
+from sepal.settings import settings
+
+from .factories import AccessionFactory, AccessionItemFactory, LocationFactory
+from .fixtures import *  # noqa: F401,F403
+
+
+@pytest.fixture
+def records(org, taxon, make_token, session):
+    # every type of record has a label that contains the token, the item
+    # codes are at most 12 characters
+    token = make_token(4).lower()
+    taxon.name = f"{token} alba"
+    session.commit()
+    location = LocationFactory(org_id=org.id, code=f"{token}-1")
+    accession = AccessionFactory(org_id=org.id, taxon_id=taxon.id, code=token)
+    item = AccessionItemFactory(
+        org_id=org.id,
+        accession_id=accession.id,
+        location_id=location.id,
+        code=f"{token}.12",
+    )
+    return token, taxon, location, accession, item
+
+
+def test_search(client, auth_header, org, records):
+    token, taxon, location, accession, item = records
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db.async_engine.sync_engine
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        resp = client.get(
+            f"/v1/orgs/{org.id}/search", params={"q": token}, headers=auth_header
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert resp.status_code == 200, resp.content
+
+    # every type is searched in a single statement
+    assert len([s for s in statements if "similarity" in s]) == 1
+
+    hits = resp.json()
+    assert {(hit["type"], hit["id"], hit["label"]) for hit in hits} == {
+        ("taxon", str(taxon.id), taxon.name),
+        ("location", str(location.id), location.code),
+        ("accession", str(accession.id), accession.code),
+        ("accession_item", str(item.id), item.code),
+    }
+    # the best matches come first and the exact match is the best
+    ranks = [hit["rank"] for hit in hits]
+    assert ranks == sorted(ranks, reverse=True)
+    assert hits[0]["type"] == "accession"
+    assert hits[0]["rank"] == 1
+
+
+def test_search_types_and_limit(client, auth_header, org, records):
+    token, taxon, location, accession, item = records
+
+    resp = client.get(
+        f"/v1/orgs/{org.id}/search",
+        params={"q": token, "type": ["taxon", "location"]},
+        headers=auth_header,
+    )
+    assert resp.status_code == 200, resp.content
+    assert {hit["type"] for hit in resp.json()} == {"taxon", "location"}
+
+    resp = client.get(
+        f"/v1/orgs/{org.id}/search",
+        params={"q": token, "limit": 2},
+        headers=auth_header,
+    )
+    assert resp.status_code == 200, resp.content
+    assert len(resp.json()) == 2
+
+
+def test_search_no_matches(client, auth_header, org, records, make_token):
+    resp = client.get(
+        f"/v1/orgs/{org.id}/search", params={"q": make_token()}, headers=auth_header
+    )
+    assert resp.status_code == 200, resp.content
+    assert resp.json() == []
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {},
+        {"q": ""},
+        {"q": "a", "type": "plant"},
+        {"q": "a", "limit": settings.max_page_size + 1},
+    ],
+)
+def test_search_invalid_params(client, auth_header, org, params):
+    resp = client.get(f"/v1/orgs/{org.id}/search", params=params, headers=auth_header)
+    assert resp.status_code == 422, resp.content
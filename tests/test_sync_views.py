@@ -0,0 +1,139 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+import orjson
+import pytest
+
+from sepal.activity.lib import init_session_tracking
+from sepal.pagination import encode_signed
+from sepal.requestvars import request_global
+from sepal.settings import settings
+from sepal.sync.lib import SyncToken, make_sync_token
+
+from .fixtures import *  # noqa: F401,F403
+
+
+@pytest.fixture(autouse=True)
+def request_global_user(current_user_id):
+    request_global().current_user_id = current_user_id
+
+
+@pytest.fixture(autouse=True)
+def track_session(session):
+    unregister = init_session_tracking(session)
+    yield
+    unregister()
+
+
+@pytest.fixture(autouse=True)
+def no_sync_delay(monkeypatch):
+    monkeypatch.setattr(settings, "sync_delay", 0)
+
+
+def sync(client, auth_header, org, token=None, limit=2):
+    """Return the changes since token and the token of the last page."""
+    upserts, deletes = {}, {}
+    while True:
+        params = {"limit": limit}
+        if token is not None:
+            params["token"] = token
+        resp = client.get(f"/v1/orgs/{org.id}/sync", params=params, headers=auth_header)
+        assert resp.status_code == 200, resp.content
+        page = resp.json()
+        for table, records in page["upserts"].items():
+            upserts.setdefault(table, {}).update((r["id"], r) for r in records)
+        for table, ids in page["deletes"].items():
+            deletes.setdefault(table, set()).update(ids)
+        token = page["token"]
+        if not page["has_more"]:
+            return upserts, deletes, token
+
+
+def test_sync(client, auth_header, org, taxon, location, accession, accession_item):
+    upserts, deletes, _ = sync(client, auth_header, org)
+    assert {table: list(records) for table, records in upserts.items()} == {
+        "taxon": [str(taxon.id)],
+        "location": [str(location.id)],
+        "accession": [str(accession.id)],
+        "accession_item": [str(accession_item.id)],
+    }
+    assert upserts["accession_item"][str(accession_item.id)]["code"] == (
+        accession_item.code
+    )
+    assert deletes == {}
+
+
+def test_sync_changes(
+    client,
+    auth_header,
+    org,
+    taxon,
+    location,
+    accession,
+    accession_item,
+    session,
+    make_token,
+):
+    _, _, token = sync(client, auth_header, org)
+
+    # nothing changed
+    upserts, deletes, token = sync(client, auth_header, org, token)
+    assert upserts == {} and deletes == {}
+
+    for _ in range(3):
+        taxon.name = make_token()
+        session.commit()
+    session.delete(accession_item)
+    session.commit()
+
+    upserts, deletes, token = sync(client, auth_header, org, token)
+    assert list(upserts) == ["taxon"]
+    assert upserts["taxon"][str(taxon.id)]["name"] == taxon.name
+    assert deletes == {"accession_item": {str(accession_item.id)}}
+
+    upserts, deletes, _ = sync(client, auth_header, org, token)
+    assert upserts == {} and deletes == {}
+
+
+def test_sync_delay(client, auth_header, org, taxon, session, make_token, monkeypatch):
+    _, _, token = sync(client, auth_header, org)
+    # The timestamp of the activity is when its transaction started. End the
+    # transaction that loaded the org for the sync so the change is made after
+    # the sync.
+    session.commit()
+    taxon.name = make_token()
+    session.commit()
+
+    # the change is only returned once it's older than the delay
+    monkeypatch.setattr(settings, "sync_delay", 60)
+    upserts, _, _ = sync(client, auth_header, org, token)
+    assert upserts == {}
+    monkeypatch.setattr(settings, "sync_delay", 0)
+    upserts, _, _ = sync(client, auth_header, org, token)
+    assert list(upserts) == ["taxon"]
+
+
+def tampered(token):
+    # replace the payload of a valid token but keep its signature
+    payload, signature = token.split(".")
+    values = orjson.loads(urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    values[2] = 1
+    return f"{urlsafe_b64encode(orjson.dumps(values)).decode()}.{signature}"
+
+
+@pytest.mark.parametrize(
+    "token",
+    [
+        "not-base64!",
+        urlsafe_b64encode(b"1,2021-01-01T00:00:00,1").decode(),
+        encode_signed(b'[1,"2021-01-01T00:00:00",1]'),
+        encode_signed(b'[2,"2021-01-01T00:00:00","1"]'),
+        encode_signed(b'[2,"2021-01-01T00:00:00",1,"organization",1]'),
+        tampered(make_sync_token(SyncToken(datetime(2021, 1, 1), 100))),
+    ],
+)
+def test_sync_invalid_token(client, auth_header, org, token):
+    resp = client.get(
+        f"/v1/orgs/{org.id}/sync", params={"token": token}, headers=auth_header
+    )
+    assert resp.status_code == 400, resp.content
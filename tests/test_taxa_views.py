@@ -1,5 +1,11 @@
+from base64 import b64encode
 from random import randint
 
+import pytest
+
+from sepal.taxa.models import Rank, Taxon
+
+from .factories import OrganizationFactory, TaxonFactory
 from .fixtures import *  # noqa: F401,F403
 
 
@@ -11,6 +17,44 @@ def test_taxa_list(client, auth_header, org, taxon):
     assert taxa_json[0]["name"] == taxon.name
 
 
+def test_taxa_list_pagination(client, auth_header, org, session):
+    # the names repeat so the pages have to be split between taxa with the
+    # same name
+    taxa = [
+        Taxon(org_id=org.id, name=name, rank=Rank.Species)
+        for name in ["b", "a", "b", "c", "b", "a"]
+    ]
+    session.add_all(taxa)
+    session.commit()
+
+    url = f"/v1/orgs/{org.id}/taxa?limit=2"
+    ids = []
+    while url:
+        resp = client.get(url, headers=auth_header)
+        assert resp.status_code == 200, resp.content
+        ids.extend(taxon["id"] for taxon in resp.json())
+        url = resp.links.get("next", {}).get("url")
+
+    expected = sorted(taxa, key=lambda taxon: (taxon.name, taxon.id))
+    assert ids == [str(taxon.id) for taxon in expected]
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not-base64!",
+        b64encode(b"1").decode(),
+        b64encode(b'["a"]').decode(),
+        b64encode(b'["a", "1"]').decode(),
+    ],
+)
+def test_taxa_list_invalid_cursor(client, auth_header, org, cursor):
+    resp = client.get(
+        f"/v1/orgs/{org.id}/taxa", params={"cursor": cursor}, headers=auth_header
+    )
+    assert resp.status_code == 400, resp.content
+
+
 def test_taxa_create(client, auth_header, make_token, org):
     data = {"name": make_token(), "rank": "family"}
     resp = client.post(f"/v1/orgs/{org.id}/taxa", headers=auth_header, json=data)
@@ -34,3 +78,68 @@ def test_taxon_detail_missing(client, current_user_id, auth_header, org, taxon):
     other_taxon_id = randint(1, 100)
     resp = client.get(f"/v1/orgs/{org.id}/taxa/{other_taxon_id}", headers=auth_header)
     assert resp.status_code == 404
+
+
+def test_taxon_history(client, auth_header, make_token, org):
+    url = f"/v1/orgs/{org.id}/taxa"
+    data = {"name": make_token(), "rank": "family"}
+    resp = client.post(url, headers=auth_header, json=data)
+    assert resp.status_code == 201, resp.content
+    taxon_id = resp.json()["id"]
+    names = [make_token() for _ in range(2)]
+    for name in names:
+        resp = client.patch(
+            f"{url}/{taxon_id}",
+            headers=auth_header,
+            json={"name": name, "rank": "family"},
+        )
+        assert resp.status_code == 200, resp.content
+
+    history = []
+    next_url = f"{url}/{taxon_id}/history?limit=2"
+    while next_url:
+        resp = client.get(next_url, headers=auth_header)
+        assert resp.status_code == 200, resp.content
+        history.extend(resp.json())
+        next_url = resp.links.get("next", {}).get("url")
+
+    assert [h["action"] for h in history] == ["updated", "updated", "created"]
+    assert history[0]["data_before"]["name"] == names[0]
+    assert history[0]["data_after"]["name"] == names[1]
+    assert history[2]["data_before"] is None
+    assert history[2]["data_after"]["name"] == data["name"]
+
+
+def test_taxon_history_not_found(client, auth_header, org, taxon):
+    other_taxon = TaxonFactory(org_id=OrganizationFactory().id)
+    # the history of records in other organizations isn't returned
+    resp = client.get(
+        f"/v1/orgs/{org.id}/taxa/{other_taxon.id}/history", headers=auth_header
+    )
+    assert resp.status_code == 404, resp.content
+
+    # the taxon was created without tracking its activity
+    resp = client.get(f"/v1/orgs/{org.id}/taxa/{taxon.id}/history", headers=auth_header)
+    assert resp.status_code == 200, resp.content
+    assert resp.json() == []
+
+
+def test_taxon_detail_as_of(client, auth_header, make_token, org):
+    url = f"/v1/orgs/{org.id}/taxa"
+    data = {"name": make_token(), "rank": "family"}
+    taxon_id = client.post(url, headers=auth_header, json=data).json()["id"]
+    update = {"name": make_token(), "rank": "genus"}
+    client.patch(f"{url}/{taxon_id}", headers=auth_header, json=update)
+
+    history = client.get(f"{url}/{taxon_id}/history", headers=auth_header).json()
+    for activity, expected in zip(history, [update, data]):
+        resp = client.get(
+            f"{url}/{taxon_id}/history/{activity['timestamp']}", headers=auth_header
+        )
+        assert resp.status_code == 200, resp.content
+        assert resp.json() == {"id": taxon_id, "parent_id": None, **expected}
+
+    resp = client.get(
+        f"{url}/{taxon_id}/history/2000-01-01T00:00:00", headers=auth_header
+    )
+    assert resp.status_code == 404
@@ -0,0 +1,15 @@
+from sepal.taxa.models import Taxon
+from sepal.taxa.schema import TaxonSchema
+from sepal.utils import create_schema
+
+
+def test_create_schema():
+    Schema = create_schema(TaxonSchema, Taxon, include=["parent"])
+    assert issubclass(Schema, TaxonSchema)
+    assert "parent" in Schema.__fields__
+    assert create_schema(TaxonSchema, Taxon, include=["parent", "parent"]) is Schema
+
+
+def test_create_schema_no_include():
+    assert create_schema(TaxonSchema, Taxon, include=None) is TaxonSchema
+    assert create_schema(TaxonSchema, Taxon, include=[]) is TaxonSchema